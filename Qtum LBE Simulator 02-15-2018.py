@@ -185,13 +185,21 @@ standardDeviationWithinStep = 0.7    # based on mainnet timing
 #
 #    "Testnet" - distribution of 31 wallets with a true network weight of 3,864,113.
 #         Also override numWallets and set to 31.
+#
+#    "Snapshot" - a real staking snapshot from snapshotFile, CSV of address,weight
+#         or binary, see qlbes/snapshots.py. Wallets under snapshotMinWeight are
+#         dropped, snapshotTopN keeps only the largest. The parsed snapshot is
+#         cached so later starts and per-run resets take milliseconds.
 #  
 
-walletWeightDistribution = "Mainnet"  # "Uniform", "Random", "Mainnet", or "Testnet"
+walletWeightDistribution = "Mainnet"  # "Uniform", "Random", "Mainnet", "Testnet", or "Snapshot"
 numUniformDistbnWallets = 1500
 numRandomDistbnWallets = 1500
 numMainnetWallets = 1500
 numTestnetWallets = 31
+snapshotFile = "staking_snapshot.csv"
+snapshotMinWeight = 0
+snapshotTopN = None                   # None for all wallets
 
 # 5. Second bite of the apple: if secondSHA256Check == True make a second check for
 #    a SHA256 hash solution after secondCheckStep steps. In this case (on the blockchain)
@@ -255,6 +263,14 @@ walletGrowthNumWallets = 5000      # number of wallets to grow in each increment
 walletGrowthNumIncrements = 10     # number of times to grow wallets
 walletGrowthWeight = 500           # weight of each new wallet
 
+# 11. Set scenarioFile to the name of a scenario file to script population churn,
+#    a timeline of whales joining and leaving, wallets that stop staking, gradual
+#    ramps and random churn, see qlbes/scenarios.py for the file format. A scenario
+#    replaces settings 6 and 10. Events are applied at the top of the block loop,
+#    at a cost in proportion to the wallets they touch.
+
+scenarioFile = None                # for example "whales.json"
+
 numBlocks = 2000          # unless set by spacing difficulty file
                           # 675 blocks a day, 4725 a week, 20250 month, 246375 a year
 startingBlock = 0         # unless set in spacing difficulty file
@@ -309,8 +325,23 @@ EASIEST_DIFFICULTY = 26959000000000000000000000000000000000000000000000000000000
 # printing and logging switches - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 enableLogging = True         # control logging of settings and final results
-printBlockByBlock = False    # print out each new block, doubles the simulation duration
+printBlockByBlock = False    # print out each new block, buffered, see printEveryNthBlock to sample
+printEveryNthBlock = 1       # when printing block by block, print every Nth block (1 = all blocks)
+printSpacingThreshold = 0    # if > 0, print only blocks with spacing >= this many seconds, e.g. 640
 logBlockByBlock = False      # log each new block, turn this off if just interested in end summary
+enableRunStatistics = False  # spacing P50/P90/P99/P99.9 and network weight bias for each run,
+                             # kept in fixed memory, printed and logged with the run summary
+
+# instrumentation switches - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+enableInstrumentation = False  # per-phase timers and counters, prints a breakdown table at the
+                               # end of each run and appends a JSON record to the file below
+instrumentationFileName = "QLBES_Phases.jsonl"
+
+enableTelemetry = False        # periodic progress and throughput reports during long runs
+telemetryFormat = "jsonl"      # "jsonl" (one JSON line per report) or "prometheus" (textfile)
+telemetryFileName = "QLBES_Telemetry.jsonl"   # use a .prom name for the prometheus format
+telemetryIntervalSeconds = 10.0               # seconds between reports
 
 import hashlib                          # for SHA-256 hash algorithm
 import secrets				# for cryptographically strong random numbers
@@ -322,6 +353,26 @@ from time import localtime, strftime, sleep
 from datetime import datetime
 import winsound                         # change on linux machines
 
+if enableRunStatistics == True:
+    from qlbes.statistics import RunStatistics
+
+if printBlockByBlock == True:
+    from qlbes.renderer import BlockRenderer
+    blockRenderer = BlockRenderer(printEveryNthBlock, printSpacingThreshold)
+
+if enableInstrumentation == True:
+    from qlbes.instrumentation import PhaseTimers   # only imported when instrumenting
+    phaseTimers = PhaseTimers()
+    clock = phaseTimers.clock
+    phaseSeconds = phaseTimers.seconds
+    phaseCounts = phaseTimers.counts
+
+from qlbes.population import Population, PopulationSnapshot   # the base population and the views of the runs
+
+if scenarioFile is not None:
+    from qlbes.scenarios import Scenario
+    scenario = Scenario.fromFile(scenarioFile)
+
 print("Qtum LBE Simulator, version", version)
 
 
@@ -418,8 +469,8 @@ if useSpacingDifficultyFile == True:
 
 start = timer()         # to measure seconds duration for simulation
 
-nNetworkWeightList = array('f',(0.0,) * nPoSInterval) # an array for storing old difficulty moving average values
-nStakesTimeList =    array('f',(0.0,) * nPoSInterval) # an array for storing old block spacing moving average values
+nNetworkWeightList = array('d',(0.0,) * nPoSInterval) # an array for storing old difficulty moving average values
+nStakesTimeList =    array('d',(0.0,) * nPoSInterval) # an array for storing old block spacing moving average values
 
 # load up the wallets - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
@@ -498,8 +549,14 @@ elif walletWeightDistribution == "Testnet":    # testnet wallets as of 12/02/201
     
     numWallets = len(walletWeight)
 
+elif walletWeightDistribution == "Snapshot":    # parsed once, then read from the cache
+    from qlbes.snapshots import loadSnapshot
+    snapshotPopulation = loadSnapshot(snapshotFile, snapshotMinWeight, snapshotTopN)
+    walletWeight = array('q', snapshotPopulation.walletWeight)
+    numWallets = len(walletWeight)
+
 else:
-    print("ERROR: need to specify Uniform, Random, Mainnet or Testnet for wallet weight distribution")
+    print("ERROR: need to specify Uniform, Random, Mainnet, Testnet or Snapshot for wallet weight distribution")
     sys.exit()
 
 # print("numWallets", numWallets)
@@ -512,6 +569,14 @@ for i in range(numWallets):
 
 # print("trueNetworkWeight", trueNetworkWeight)
 
+# the base population every run starts from, never changed after this point. Each run
+# reads it through a view of its own (copy on write): the wallets a run changes go to a
+# dict of the view, the wallets it adds to lists of the view, nothing is copied
+
+basePopulation = PopulationSnapshot(Population(walletWeight, walletStaking))
+baseNumWallets = numWallets
+baseTrueNetworkWeight = trueNetworkWeight
+
 # sys.exit()     # use if resetting network weight
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -564,6 +629,8 @@ elif walletWeightDistribution == "Mainnet":
     print("Loading wallets with Mainnet distribuition")
 elif walletWeightDistribution == "Testnet":
     print("Loading wallets with Testnet distribution")
+elif walletWeightDistribution == "Snapshot":
+    print("Loading wallets from staking snapshot", snapshotFile)
 else:
     print('ERROR: wallet weight distribution must be set to "Uniform", "Random", "Mainnet", or "Testnet"')
     sys.exit()
@@ -585,6 +652,9 @@ else:
 if useWalletGrowth == True:
     print("useWalletGrowth = True, start block", walletGrowthStartBlock, "block increment", walletGrowthBlockIncrement, "num each increment", walletGrowthNumWallets, "num increments", walletGrowthNumIncrements, "wallet size", walletGrowthWeight)                 
 
+if scenarioFile is not None:
+    print("scenarioFile =", scenarioFile, "with", len(scenario.events), "events, replaces useDynamicWeights and useWalletGrowth")
+
 # initialize log file - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 if enableLogging == True:    
@@ -666,6 +736,8 @@ if enableLogging == True:
         tempStr = "Loading wallets with Mainnet distribuition\n"
     elif walletWeightDistribution == "Testnet":
         tempStr = "Loading wallets with Testnet distribuition\n"
+    elif walletWeightDistribution == "Snapshot":
+        tempStr = "Loading wallets from staking snapshot," + snapshotFile + "\n"
     else:
         tempStr = "ERROR Unknown wallet distribution\n"
 
@@ -712,9 +784,37 @@ if enableLogging == True:
 
 print("Wallets", numWallets, "blocks", numBlocks, "startingBlock", startingBlock, "targetMultiplier", targetMultiplier)
 
+if enableTelemetry == True:      # after numBlocks is known, it may come from the replay file
+    from qlbes.telemetry import TelemetryWriter
+    telemetry = TelemetryWriter(telemetryFileName, telemetryIntervalSeconds, telemetryFormat, runMax, numBlocks)
+    print("enableTelemetry = True, writing", telemetryFormat, "telemetry to", telemetryFileName, "every", telemetryIntervalSeconds, "seconds")
+
 # calculate the starting target and difficulty - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
-dDiff = trueNetworkWeight / 5.86        # slope from chart of simulated results, uniform wallets
+startingDifficultySlope = 5.86          # slope from chart of simulated results, uniform wallets
+EMAScalingFactor = 5.59                 # simulated value for 20 million network weight
+                                        # 29943463, 5.08
+                                        # 20026263, 5.59
+                                        # 15008923, 5.14
+                                        # not 5.86, based on slope?
+
+# Set useCalibration = True to fit startingDifficultySlope and EMAScalingFactor for the
+# wallet distribution and retarget settings above (with the settings at startup, so the
+# targetMultiplier before the parameter loop changes it). The fit takes a few seconds of
+# fast simulations the first time, then the constants come from the cache directory.
+
+useCalibration = False
+
+if useCalibration == True:
+    from qlbes.config import configFromNamespace
+    from qlbes.calibration import calibratedConfig
+
+    calibrated = calibratedConfig(configFromNamespace(globals()))
+    startingDifficultySlope = calibrated.startingDifficultySlope
+    EMAScalingFactor = calibrated.EMAScalingFactor
+    print("useCalibration = True, startingDifficultySlope", format(startingDifficultySlope, "0.4f"), "EMAScalingFactor", format(EMAScalingFactor, "0.4f"))
+
+dDiff = trueNetworkWeight / startingDifficultySlope
 target = EASIEST_DIFFICULTY / dDiff
 
 # print("target", target, "dDiff", dDiff)
@@ -724,11 +824,6 @@ pFirst121EMA = startingDifficulty       # expotential moving average of difficul
 pSecond121EMA = startingDifficulty      # expotential moving average of pFirst121EMA
 pThird121EMA = startingDifficulty       # expotential moving average of pSecond121EMA
 pFourth121EMA = startingDifficulty      # expotential moving average of pThird121eEMA
-EMAScalingFactor = 5.59                 # simulated value for 20 million network weight
-                                        # 29943463, 5.08
-                                        # 20026263, 5.59
-                                        # 15008923, 5.14
-                                        # not 5.86, based on slope?
 
 savedTarget = target                   # used to reset the target if scaling
 
@@ -770,11 +865,29 @@ while run < runMax:
     nextWeightChangeBlock = changeAfterBlocks  # set first weight change block
     nextWalletGrowthBlock = walletGrowthStartBlock # if growing wallets, set for starting block
 
-    if walletWeightDistribution == "Mainnet" and useDynamicWeights != "No":  # for Once or Multi reset wallet weights
-        loadMainnetWallets()                                                 # will run twice on startup
-        trueNetworkWeight = getNetworkWeight()
-        # print("reset mainnet wallets, trueNetworkWeight", trueNetworkWeight)
-  
+    # reset to the base population, a fresh view with no changes, nothing is copied
+
+    runPopulation = basePopulation.view()
+    stakingWallets = runPopulation.stakingWallets()   # (wallet, weight), made again after a change
+    stakingVersion = runPopulation.version
+    numWallets = baseNumWallets
+    trueNetworkWeight = baseTrueNetworkWeight
+    walletGrowthIncrementsLeft = walletGrowthNumIncrements
+
+    if scenarioFile is not None:      # the scenario changes the wallets of the view
+        scenarioRun = scenario.start(runPopulation, random)
+
+    if enableTelemetry == True:
+        telemetry.startRun(run, startingBlock)
+
+    if enableRunStatistics == True:
+        runStatistics = RunStatistics()
+
+    if enableInstrumentation == True:     # fresh timers and counters for each run
+        phaseTimers.reset()
+        phaseSeconds = phaseTimers.seconds
+        phaseCounts = phaseTimers.counts
+
     # block loop - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
     while block < numBlocks + startingBlock:
@@ -783,16 +896,22 @@ while run < runMax:
         had5xSteps = False   # had 40 steps or more in this block
         # target = savedTarget # in case scaling the target below   what to do? 
         
-        if useDynamicWeights == "Once":                               # COMPLEXITY SETTING 6
+        if scenarioFile is not None:                                  # COMPLEXITY SETTING 11
+
+            scenarioRun.apply(block)
+            numWallets = runPopulation.numWallets
+            trueNetworkWeight = runPopulation.stakingWeight
+
+        elif useDynamicWeights == "Once":                             # COMPLEXITY SETTING 6
             
             if block == changeOnBlock:
 
                 changeAmount = trueNetworkWeight * dynamicWeightChangeOnce / 1000
 
                 for i in range(10,20):
-                    walletWeight[i] += int(changeAmount)
+                    runPopulation.addWeight(i, int(changeAmount))
                 
-                trueNetworkWeight = getNetworkWeight()            # update true network weight 
+                trueNetworkWeight += 10 * int(changeAmount)       # update true network weight, no rescan
 
         elif useDynamicWeights == "Multi" and block == nextWeightChangeBlock:
 
@@ -804,37 +923,41 @@ while run < runMax:
             # determine whether increase or decrease
             if random.randrange(0, 99) <= 33:  # decrease 33% of the time
                 changeAmount *= -1
-                
+
             for i in range(10,20):
-                    walletWeight[i] += int(changeAmount)
+                    runPopulation.addWeight(i, int(changeAmount))
                 
-            trueNetworkWeight = getNetworkWeight()    # update true network weight
+            trueNetworkWeight += 10 * int(changeAmount)    # update true network weight, no rescan
             
         # wallet growth - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
                                                                   # COMPLEXITY SETTING 10
                                                
-        if useWalletGrowth == True:             # wallets grow during the simulation run
+        if useWalletGrowth == True and scenarioFile is None:   # wallets grow during the simulation run
 
-            if block == nextWalletGrowthBlock and walletGrowthNumIncrements > 0:
+            if block == nextWalletGrowthBlock and walletGrowthIncrementsLeft > 0:
 
                 nextWalletGrowthBlock += walletGrowthBlockIncrement # set for next growth block
-                walletGrowthNumIncrements -= 1
+                walletGrowthIncrementsLeft -= 1
 
-                for i in range(0, walletGrowthNumWallets):          # add this many wallets
-                    walletWeight.append(walletGrowthWeight)         # add a wallet
-                    walletStaking.append(1)                         # set for staking
+                runPopulation.addWallets(walletGrowthNumWallets, walletGrowthWeight)   # staking
 
                 numWallets += walletGrowthNumWallets    
-                trueNetworkWeight = getNetworkWeight()    # update true network weighttrue
+                trueNetworkWeight += walletGrowthNumWallets * walletGrowthWeight    # update true network weight
 
                 print("numWallets", numWallets, "trueNetworkWeight", trueNetworkWeight)
         
         # step loop - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+        if runPopulation.version != stakingVersion:   # the wallets changed, make the list again
+            stakingWallets = runPopulation.stakingWallets()
+            stakingVersion = runPopulation.version
+
         while True:  # loop on step until we have a solution
             
-            wallet = 0
             SHA256Solutions = 0
+
+            if enableInstrumentation == True:
+                phaseCounts["steps"] += 1
                                                                      # COMPLEXITY SWITCH 8
             # if useTargetScaling == True:  # increase the target if the block is getting too long
             #     if step >= startingStep:            # starting step for scaling  
@@ -846,18 +969,18 @@ while run < runMax:
             
             # wallet loop - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
             
-            while wallet < numWallets:  # loop through all the wallets
+            if enableInstrumentation == False:   # tested once per step, the wallet loop pays nothing for it
 
-                if walletStaking[wallet] == 1:   # this wallet is staking
+                for wallet, weight in stakingWallets:  # loop through the staking wallets
 
                     # get a 256 bit random number to use as the digest for SHA-256
                     # use either the Python random module of the secrets module
-                    
+
                     if useSecretsModule == True:                        # COMPLEXITY SWITCH 1
                         temp = str(secrets.randbits(256)).encode('utf-8')   # using secrets module
                     else:
                         temp = str(random.getrandbits(256)).encode('utf-8') # using random module
-                    
+
                     hash_object = hashlib.sha256(temp)    # get SHA-256 hash
                     hex_dig = hash_object.hexdigest()
                                       # random module, fixed seed, first time through, 1,000 mainnet wallets
@@ -866,11 +989,11 @@ while run < runMax:
                     hashProofOfStake = int(hex_dig, 16) # convert hex string to a really big decimal int
                     # print(hashProofOfStake) # 6309933071041450796822743352002321870736073756553388285190011991562795831199
                                               # or 6.30993307104145E+75
-                                              
+
                     if useTargetScaling == True: # add 100% target at 17 steps
-                        
+                    
                         if step >= paramValue:
-                            if hashProofOfStake < (target * 2.0) * walletWeight[wallet] * COIN:
+                            if hashProofOfStake < (target * 2.0) * weight * COIN:
                                 SHA256Solutions += 1      # found a solution
                                 walletWinner = wallet     # the block reward winner, last one in this block
                                 numTargetDoubles += 1     # count the number of times the target doubles
@@ -878,9 +1001,9 @@ while run < runMax:
                                 if SHA256Solutions >= 2:
                                     collisionCount+= 1  # count of collisions over all blocks
                                     # print("Collision block", block, "wallet", wallet)
-                                    
+                                
                         else:
-                            if hashProofOfStake < target * walletWeight[wallet] * COIN:
+                            if hashProofOfStake < target * weight * COIN:
                                 SHA256Solutions += 1      # found a solution
                                 walletWinner = wallet     # the block reward winner, last one in this block
 
@@ -888,7 +1011,7 @@ while run < runMax:
                                     collisionCount+= 1  # count of collisions over all blocks
                                     # print
                     else:        
-                        if hashProofOfStake < target * walletWeight[wallet] * COIN:
+                        if hashProofOfStake < target * weight * COIN:
                             SHA256Solutions += 1      # found a solution
                             walletWinner = wallet     # the block reward winner, last one in this block
 
@@ -899,27 +1022,103 @@ while run < runMax:
                             if secondSHA256Check == True and step >= secondCheckStep:   # if the step count is getting long, take a second bite of the applehash_object = hashlib.sha256(temp)    # get SHA-256 hash
 
                                 # nonce += 1
-                                if useSecretsModule == True:                        # COMPLEXITY SWITCH 1
+                                if useSecretsModule == True:                       # COMPLEXITY SWITCH 1
                                     temp = str(secrets.randbits(256)).encode('utf-8')   # using secrets module
                                 else:
                                     temp = str(random.getrandbits(256)).encode('utf-8') # using random module
-                    
+                
                                 hash_object = hashlib.sha256(temp)    # get SHA-256 hash
                                 hex_dig = hash_object.hexdigest()
                                 hashProofOfStake = int(hex_dig, 16) # convert hex string to a really big decimal int
-                                
-                                if hashProofOfStake < target * walletWeight[wallet] * COIN:
+                            
+                                if hashProofOfStake < target * weight * COIN:
                                     SHA256Solutions += 1      # found a solution
                                     walletWinner = wallet     # the block reward winner, last one in this block
                                     numTwoBites += 1
                                     # print("SECOND BITE")
 
                                     if SHA256Solutions >= 2:
-                                        collisionCount+= 1  # count of collisions over all blocks    
-
-                wallet += 1
+                                        collisionCount+= 1  # count of collisions over all blocks
                 
-                # end of wallet loop
+                    # end of wallet loop
+
+            else:     # the same wallet loop with per-phase timers and counters
+
+                for wallet, weight in stakingWallets:  # as above, timing the random, hash and compare phases
+
+                    tRandom = clock()
+
+                    if useSecretsModule == True:                        # COMPLEXITY SWITCH 1
+                        temp = str(secrets.randbits(256)).encode('utf-8')   # using secrets module
+                    else:
+                        temp = str(random.getrandbits(256)).encode('utf-8') # using random module
+
+                    tHash = clock()
+
+                    hash_object = hashlib.sha256(temp)    # get SHA-256 hash
+                    hex_dig = hash_object.hexdigest()
+                    hashProofOfStake = int(hex_dig, 16) # convert hex string to a really big decimal int
+
+                    tCompare = clock()
+                    phaseSeconds["random"] += tHash - tRandom
+                    phaseSeconds["hash"] += tCompare - tHash
+                    phaseCounts["walletChecks"] += 1
+
+                    if useTargetScaling == True: # add 100% target at 17 steps
+
+                        if step >= paramValue:
+                            if hashProofOfStake < (target * 2.0) * weight * COIN:
+                                SHA256Solutions += 1      # found a solution
+                                walletWinner = wallet     # the block reward winner, last one in this block
+                                numTargetDoubles += 1     # count the number of times the target doubles
+
+                                if SHA256Solutions >= 2:
+                                    collisionCount+= 1  # count of collisions over all blocks
+
+                        else:
+                            if hashProofOfStake < target * weight * COIN:
+                                SHA256Solutions += 1      # found a solution
+                                walletWinner = wallet     # the block reward winner, last one in this block
+
+                                if SHA256Solutions >= 2:
+                                    collisionCount+= 1  # count of collisions over all blocks
+                    else:
+                        if hashProofOfStake < target * weight * COIN:
+                            SHA256Solutions += 1      # found a solution
+                            walletWinner = wallet     # the block reward winner, last one in this block
+
+                            if SHA256Solutions >= 2:
+                                collisionCount+= 1  # count of collisions over all blocks
+
+                        else:                                            # COMPLEXITY SWITCH 5
+                            if secondSHA256Check == True and step >= secondCheckStep:   # second bite of the apple
+
+                                # nonce += 1
+                                phaseCounts["secondBiteChecks"] += 1
+
+                                if useSecretsModule == True:                       # COMPLEXITY SWITCH 1
+                                    temp = str(secrets.randbits(256)).encode('utf-8')   # using secrets module
+                                else:
+                                    temp = str(random.getrandbits(256)).encode('utf-8') # using random module
+
+                                hash_object = hashlib.sha256(temp)    # get SHA-256 hash
+                                hex_dig = hash_object.hexdigest()
+                                hashProofOfStake = int(hex_dig, 16) # convert hex string to a really big decimal int
+
+                                if hashProofOfStake < target * weight * COIN:
+                                    SHA256Solutions += 1      # found a solution
+                                    walletWinner = wallet     # the block reward winner, last one in this block
+                                    numTwoBites += 1
+
+                                    if SHA256Solutions >= 2:
+                                        collisionCount+= 1  # count of collisions over all blocks
+
+                    phaseSeconds["compare"] += clock() - tCompare   # compare includes the second bite, if any
+
+                    # end of instrumented wallet loop
+
+            if enableInstrumentation == True and SHA256Solutions >= 2:
+                phaseCounts["collisions"] += SHA256Solutions - 1   # same count as collisionCount
 
             if SHA256Solutions >= 1:  # at least one solution found
        
@@ -992,7 +1191,10 @@ while run < runMax:
                 '''
              
                 # carry offset time across blocks, 1st solution or orphans?
-                
+
+                if enableInstrumentation == True:
+                    tRetarget = clock()
+
                 if useRetarget == True:                                    # COMPLEXITY SWITCH 2
                     nInterval = nPowTargetTimespan / nPowTargetSpacing
                     # target *= ((nInterval - 1) * nTargetSpacing + nActualSpacing + nActualSpacing)
@@ -1004,6 +1206,10 @@ while run < runMax:
 
                 # print(target)    
 
+                if enableInstrumentation == True:
+                    tEstimators = clock()
+                    phaseSeconds["retarget"] += tEstimators - tRetarget
+
                 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
      
                 # calculate the network weight as a moving average of difficulty divided by a
@@ -1074,6 +1280,12 @@ while run < runMax:
                 
                 # print("block", block, "nNewNetworkWeight", nNewNetworkWeight)    
 
+                if enableInstrumentation == True:
+                    phaseSeconds["estimators"] += clock() - tEstimators
+                    phaseTimers.endBlock(step)
+                    if useTargetScaling == True and step >= paramValue:
+                        phaseCounts["scaledTargetBlocks"] += 1   # the target was scaled in this block, once a block
+
                 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -       
 
                 break # found a SHA-256 hash solution, done with this block
@@ -1087,6 +1299,17 @@ while run < runMax:
             fiveXSpacingBlocks += 1
             # print("longer block, steps", step)
 
+        if enableRunStatistics == True:
+            if block >= nPoSInterval + startingBlock:
+                runStatisticsNetworkWeight = nNetworkWeightResult / COIN
+            else:
+                runStatisticsNetworkWeight = None      # not yet
+            runStatistics.addBlock(step, nActualSpacing, SHA256Solutions, runStatisticsNetworkWeight,
+                                   nNewNetworkWeight, trueNetworkWeight)
+
+        if enableInstrumentation == True:
+            tPrint = clock()
+
         if printBlockByBlock == True:
             
             '''
@@ -1110,8 +1333,8 @@ while run < runMax:
             
             spacing is the time between blocks
             
-            Format the data for printing on a display. Calculate the pads to keep 
-            the columns aligned. Numbers are right justified:
+            The rows are formatted and buffered by qlbes/renderer.py, set printEveryNthBlock
+            or printSpacingThreshold to sample the blocks on long runs. Numbers are right justified:
             
                 Block |  wallet |    weight   | true netwt |  new netwt |   target  | network wt | spacing
                     1 |      1  |           1 |  1,234,567 |  1,234,567 |   234,567 | 12,456,789 |     3
@@ -1120,85 +1343,22 @@ while run < runMax:
              
             '''
 
-            if block <= 9999999:
-                blockWithCommas = "{:,d}".format(int(block))
-                pad = " " * (9 - len(blockWithCommas))
-                blockPadCommas = pad + blockWithCommas
-            else:
-                blockPadCommas = "xxxxxxxxx"
+            if blockRenderer.wants(block, nActualSpacing):   # test before doing any formatting
 
-            if walletWinner <= 99999:
-                walletWinnerWithCommas = "{:,d}".format(int(walletWinner))
-                pad = " " * (7 - len(walletWinnerWithCommas))
-                walletWinnerPadCommas = pad + walletWinnerWithCommas
-            else:
-                walletWinnerPadCommas = "xxxxxxx"
-                
-            if walletWeight[walletWinner] <= 9999999:
-                weightWithCommas = ("{:,f}".format(round(walletWeight[walletWinner], 1)))[:-5]
-                pad = " " * (11 - len(weightWithCommas))
-                weightPadCommas = pad + weightWithCommas
-            else:
-                weightPadCommas = "xxxxxxxxxxx"
-           
-            if trueNetworkWeight <= 99999999:
-                trueNetworkWeightWithCommas =  "{:,d}".format(int(trueNetworkWeight))
-                pad = " " * (10 - len(trueNetworkWeightWithCommas))
-                trueNetworkWeightPadCommas = pad + trueNetworkWeightWithCommas
-            else:
-                trueNetworkWeightPadCommas = "xxxxxxxxxx"
-                
-            if nNewNetworkWeight <= 99999999:
-                nNewNetworkWeightWithCommas =  "{:,d}".format(int(nNewNetworkWeight))
-                pad = " " * (10 - len(nNewNetworkWeightWithCommas))
-                nNewNetworkWeightPadCommas = pad + nNewNetworkWeightWithCommas
-            else:
-                nNewNetworkWeightPadCommas = "xxxxxxxxxx"
-
-           # target scaling factor, for printing
-            printTarget = target / 10000000000000000000000000000000000000000000000000000000  # print scaling factor ???
-            
-            if printTarget <= 9999999:
-                printTargetWithCommas = "{:,d}".format(int(printTarget))
-                pad = " " * (9 - len(printTargetWithCommas))
-                printTargetPadCommas = pad + printTargetWithCommas
-            else:
-                printTargetPadCommas = "xxxxxxxxx"
-                
-            if (block >= nPoSInterval + startingBlock):   # nNetworkWeight or "Network Weight"
+                if block >= nPoSInterval + startingBlock:    # nNetworkWeight or "Network Weight"
                                           # is a simple moving average for nPoSInterval
                                           # blocks of the reciprocal of the target divided by
                                           # the block spacing for nPosInterval blocks
-
-                nNetworkWeightResultMillions = nNetworkWeightResult / COIN              
-                if nNetworkWeightResultMillions <= 99999999:
-                    nNetworkWeightResultMillionsWithCommas =  "{:,d}".format(int(nNetworkWeightResultMillions))
-                    pad = " " * (10 - len(nNetworkWeightResultMillionsWithCommas))
-                    nNetworkWeightResultMillionsPadCommas = pad + nNetworkWeightResultMillionsWithCommas
+                    nNetworkWeightResultMillions = nNetworkWeightResult / COIN
                 else:
-                    nNetworkWeightResultMillionsPadCommas = "xxxxxxxxx"
-                    
-            else:
-                nNetworkWeightResultMillionsPadCommas = "   not yet"  # no pseudoNetworkWeight for the first nPoSInterval blocks  
-       
-            if nActualSpacing <= 9999:
-                nActualSpacingWithCommas = ("{:,f}".format(round(nActualSpacing, 1)))[:-5]
-                pad = " " * (7 - len(nActualSpacingWithCommas))
-                nActualSpacingPadCommas = pad + nActualSpacingWithCommas
-            else:
-                nActualSpacingPadCommas = "xxxxx"
+                    nNetworkWeightResultMillions = None    # "not yet" for the first nPoSInterval blocks
 
-            if dDiff <= 9999999:
-                dDiffWithCommas = ("{:,f}".format(round(dDiff, 1)))[:-5]
-                pad = " " * (10 - len(dDiffWithCommas))
-                dDiffPadCommas = pad + dDiffWithCommas
-            else:
-                dDiffPadCommas = "xxxxxxxx"
-                
-            if block % 20 == 0: # print column labels
-                print("    Block |  wallet |    weight   | true netwt |  new netwt | network wt |   target  |  difficulty | spacing")
+                blockRenderer.row(block, walletWinner, runPopulation.weightOf(walletWinner), trueNetworkWeight, nNewNetworkWeight,
+                                  nNetworkWeightResultMillions, target, dDiff, nActualSpacing)
 
-            print(blockPadCommas, "|", walletWinnerPadCommas, "|", weightPadCommas, "|", trueNetworkWeightPadCommas, "|", nNewNetworkWeightPadCommas, "|", nNetworkWeightResultMillionsPadCommas, "|", printTargetPadCommas, "|", dDiffPadCommas, "|", nActualSpacingPadCommas)
+        if enableInstrumentation == True:
+            tLog = clock()
+            phaseSeconds["print"] += tLog - tPrint
 
         if logBlockByBlock == True:
 
@@ -1219,15 +1379,26 @@ while run < runMax:
 
             if block >= nPoSInterval + startingBlock:
                 nNetworkWeightResultMillions = nNetworkWeightResult / COIN  
-                tempStr = str(block) + "," + str(walletWinner) + "," + str(walletWeight[walletWinner]) + "," + str(trueNetworkWeight) + "," + str(nNewNetworkWeight) + "," + str(nNetworkWeightResultMillions) + "," + str(logTarget) + "," + str(dDiff) + "," + str(nActualSpacing)
+                tempStr = str(block) + "," + str(walletWinner) + "," + str(runPopulation.weightOf(walletWinner)) + "," + str(trueNetworkWeight) + "," + str(nNewNetworkWeight) + "," + str(nNetworkWeightResultMillions) + "," + str(logTarget) + "," + str(dDiff) + "," + str(nActualSpacing)
 
             else:  # no good values yet for the true wallet and network weight averages
-                tempStr = str(block) + "," + str(walletWinner) + "," + str(walletWeight[walletWinner]) + "," + str(trueNetworkWeight) + "," + str(nNewNetworkWeight) + "," + str(0) + "," + str(logTarget) + "," + str(dDiff) + "," + str(nActualSpacing)
+                tempStr = str(block) + "," + str(walletWinner) + "," + str(runPopulation.weightOf(walletWinner)) + "," + str(trueNetworkWeight) + "," + str(nNewNetworkWeight) + "," + str(0) + "," + str(logTarget) + "," + str(dDiff) + "," + str(nActualSpacing)
              
             outFileQLBES.write(tempStr)
             outFileQLBES.write('\n')
             time.sleep(0.01)
 
+        if enableInstrumentation == True:
+            phaseSeconds["log"] += clock() - tLog
+
+        if enableTelemetry == True:   # returns right away until the next report is due
+            if block >= nPoSInterval + startingBlock:
+                telemetryNetworkWeight = nNetworkWeightResult / COIN
+            else:
+                telemetryNetworkWeight = None      # not yet
+            telemetry.blockDone(block, stepTotal, numWallets, target, dDiff, nNewNetworkWeight,
+                                telemetryNetworkWeight, trueNetworkWeight, fiveXSpacingBlocks)
+
         block += 1  # end of block loop
 
     '''
@@ -1240,6 +1411,9 @@ while run < runMax:
            \ pads go here
     '''
 
+    if printBlockByBlock == True:   # write out any buffered block rows before the run summary
+        blockRenderer.flush()
+
     if run <= 999:
         runWithCommas = "{:,d}".format(run)
         pad = " " * (5 - len(runWithCommas))
@@ -1322,6 +1496,21 @@ while run < runMax:
         
     print(runPadCommas, "|", paramValuePadCommas, "|", aveSecondsPadCommas, "|", fiveXSpacingBlocksPadCommas, "|", maxSecondsPadCommas, "|", collisionCountPadCommas, "|", numTwoBites)
 
+    if enableRunStatistics == True:
+        print(runStatistics.formatSummary())
+
+    if enableTelemetry == True:
+        telemetry.endRun()
+
+    if enableInstrumentation == True:   # where did the time go in this run?
+        phaseTimers.endRun()
+        print(phaseTimers.breakdownTable())
+        phaseTimers.writeJson(instrumentationFileName, version=version, run=run, paramLabel=paramLabel,
+                              paramValue=paramValue, walletWeightDistribution=walletWeightDistribution,
+                              numWallets=numWallets, numBlocks=numBlocks, useSecretsModule=useSecretsModule,
+                              useRetarget=useRetarget, useTargetScaling=useTargetScaling,
+                              secondSHA256Check=secondSHA256Check, useDynamicWeights=useDynamicWeights)
+
     if enableLogging == True:
 
         if run == 0:  # write column labels to log
@@ -1335,6 +1524,13 @@ while run < runMax:
         outFileQLBES.write(tempStr)
         outFileQLBES.write('\n')
         time.sleep(0.01)
+
+        if enableRunStatistics == True:   # one more row, name value pairs
+            tempStr = "run statistics," + str(run)
+            for name, value in runStatistics.summary().items():
+                tempStr += "," + name + "," + str(value)
+            outFileQLBES.write(tempStr)
+            outFileQLBES.write('\n')
   
     # increment the parameter here, some examples
 
@@ -0,0 +1,22 @@
+'''
+qlbes - support modules for the Qtum LBE Simulator (LBE = Long Block Eradicator)
+
+Copyright (c) 2017 Jackson Belove
+Beta software, use at your own risk
+MIT License, free, open software for the Qtum Community
+
+The simulator itself is the stand-alone script "Qtum LBE Simulator 02-15-2018.py".
+The modules in this package are imported by the script only when the matching
+switch is turned on, so importing the package must stay cheap and must not
+start a simulation or print anything.
+
+The same simulation is available as a library, see simulator.py:
+
+    from qlbes.config import SimulationConfig
+    from qlbes.simulator import simulateBlocks
+
+    for record in simulateBlocks(SimulationConfig(numBlocks=500)):
+        ...
+'''
+
+version = "02-15-2018"
@@ -0,0 +1,272 @@
+'''
+Headless batch runs, for driving many short simulations from scripts.
+
+The script is set up by editing its globals, prints its settings line by line
+(with a short sleep per log line) and beeps at the end on Windows. A batch
+job takes the same settings from a config file and the command line, checks
+all of them before anything runs, and writes one result file, nothing else:
+
+    python -m qlbes.batch job.json
+    python -m qlbes.batch job.txt numBlocks=500 --output=result.json
+    python -m qlbes.batch engine=bernoulli paramName=targetMultiplier paramValue=15000 paramIncrement=5000 runMax=5
+
+A config file is either JSON, one object of settings, or text with one
+name = value per line as at the top of the script, values read as by
+parseSettings(), "#" starting a comment. Settings on the command line win
+over the file. Besides the SimulationConfig settings a job takes the parameter
+loop of the script:
+
+    runMax = 1              runs, each with its own random stream (see sweep.runRng)
+    paramName = None        the setting changed from run to run, None for repeats
+    paramValue = None       its value in the first run
+    paramIncrement = 0      added on each run
+    paramValues = None      or the values themselves, a list
+
+and profile = "sample" or "cprofile" writes a profile of the job next to the
+result file (see profiling.py).
+
+The result, JSON (or CSV, one row per run, for an output ending in .csv),
+holds the settings, their fingerprint, and per run the value, the seconds and
+the RunStatistics summary; the runs are the ones runSweep() and the job
+service give for the same settings. A job that fails still writes its result,
+with status "error" and the message, and exits with 1 (2 for bad settings).
+
+Only the config and the cache are imported up front; the simulator, engines
+and wallet loaders are imported after the settings are checked, and worker
+processes only for processes > 1, so a small job starts in a few tens of
+milliseconds.
+'''
+
+import json
+import os
+import sys
+import time
+
+from . import version
+from .cache import writeFileAtomic
+from .config import DEFAULTS, SimulationConfig, parseSettings
+
+BATCH_OPTIONS = {
+    "runMax": 1,
+    "paramName": None,
+    "paramValue": None,
+    "paramIncrement": 0,
+    "paramValues": None,
+    "processes": 1,
+    "output": "qlbes_result.json",
+    "profile": None,
+}
+
+INPUT_FILE_SETTINGS = ("snapshotFile", "scenarioFile")
+
+
+def readConfigFile(path):
+    # the settings of a JSON or name = value config file, as a dict
+
+    with open(path, 'r') as inFile:
+        text = inFile.read()
+
+    if text.lstrip().startswith("{"):
+        settings = json.loads(text)
+        if not isinstance(settings, dict):
+            raise ValueError(path + ": a JSON config file must hold one object")
+        return(settings)
+
+    arguments = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.partition("#")[0].strip()
+        if line == "":
+            continue
+        name, equals, value = line.partition("=")
+        if equals == "":
+            raise ValueError("{}, line {:d}: expected name = value, not {!r}".format(path, number, line))
+        arguments.append(name.strip() + "=" + value.strip())
+    return(parseSettings(arguments))
+
+
+class BatchJob:
+    '''
+    A checked batch job: the base config, the setting changed from run to run
+    (or None) with its values, processes and the output path. Everything is
+    checked here, so a job that builds runs to the end unless the simulation
+    itself fails.
+    '''
+
+    def __init__(self, settings):
+
+        settings = dict(settings)
+        options = {name: settings.pop(name, value) for name, value in BATCH_OPTIONS.items()}
+
+        self.config = SimulationConfig(**settings).validate()
+        self.output = options["output"]
+        self.processes = options["processes"]
+        self.name = options["paramName"]
+        self.profile = options["profile"]
+
+        runMax = options["runMax"]
+        if not isinstance(runMax, int) or runMax < 1:
+            raise ValueError("runMax must be a whole number, 1 or more, not " + repr(runMax))
+        if not isinstance(self.processes, int) or self.processes < 1:
+            raise ValueError("processes must be a whole number, 1 or more, not " + repr(self.processes))
+
+        if self.profile is not None:
+            from .profiling import PROFILE_MODES
+            if self.profile not in PROFILE_MODES:
+                raise ValueError("profile must be one of " + ", ".join(PROFILE_MODES) + ", not " + repr(self.profile))
+            if self.processes != 1:
+                raise ValueError("profile needs processes = 1, worker processes are not profiled")
+
+        if self.name is None:
+            if options["paramValues"] is not None or options["paramValue"] is not None:
+                raise ValueError("paramValue and paramValues need a paramName")
+            self.values = [None] * runMax
+        elif self.name not in DEFAULTS:
+            raise ValueError("paramName must be a simulation setting, not " + repr(self.name))
+        elif options["paramValues"] is not None:
+            self.values = list(options["paramValues"])
+        elif options["paramValue"] is not None:
+            self.values = [options["paramValue"] + run * options["paramIncrement"] for run in range(runMax)]
+        else:
+            raise ValueError("paramName " + repr(self.name) + " needs paramValue or paramValues")
+
+        if self.name is not None:
+            for value in self.values:
+                self.config.replace(**{self.name: value}).validate()
+
+        for name in INPUT_FILE_SETTINGS:
+            path = getattr(self.config, name)
+            if path is not None and not os.path.isfile(path):
+                raise ValueError(name + " " + repr(path) + " does not exist")
+        directory = os.path.dirname(os.path.abspath(self.output))
+        if self.output != "-" and not os.path.isdir(directory):
+            raise ValueError("output directory " + repr(directory) + " does not exist")
+
+    def run(self):
+        # the results of runSweep(), one dict per run, in order
+
+        from .population import POPULATION_SETTINGS, loadWallets
+        from .simulator import makeRng
+        from .sweep import runOne, runSweep
+
+        if self.processes == 1 or len(self.values) == 1:        # no need for a shared table
+            snapshots = {}          # population fingerprint: snapshot, one per population the values make
+            runs = []
+            for run, value in enumerate(self.values):
+                runConfig = self.config if self.name is None else self.config.replace(**{self.name: value})
+                key = runConfig.fingerprint(POPULATION_SETTINGS)
+                if key not in snapshots:
+                    snapshots[key] = loadWallets(runConfig, makeRng(runConfig)).snapshot()
+                runs.append(runOne(self.config, snapshots[key], run, self.name, value))
+            return(runs)
+        return(runSweep(self.config, self.name, self.values, self.processes))
+
+    def result(self, runs, seconds, error=None):
+        # the content of the result file
+
+        return({"status": "ok" if error is None else "error", "error": error, "qlbesVersion": version,
+                "fingerprint": self.config.fingerprint(), "settings": self.config.asDict(),
+                "paramName": self.name, "runs": runs, "seconds": seconds})
+
+    def execute(self):
+        # run the job and write its result file, also when a run fails
+
+        profiler = None
+        if self.profile is not None:
+            from .profiling import makeProfiler
+            profiler = makeProfiler(self.profile)
+            profiler.start()
+
+        start = time.perf_counter()
+        try:
+            runs = self.run()
+        except Exception as error:
+            message = "{}: {}".format(type(error).__name__, error)
+            writeResult(self.result([], time.perf_counter() - start, message), self.output)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        result = self.result(runs, time.perf_counter() - start)
+
+        if profiler is not None:                   # next to the result file, tagged with the fingerprint
+            from .profiling import writeProfile
+            directory = "." if self.output == "-" else os.path.dirname(os.path.abspath(self.output))
+            result["profile"] = list(writeProfile(profiler, self.config, directory, self.profile))
+
+        writeResult(result, self.output)
+        return(result)
+
+
+def formatResult(result, output):
+    # the result file as bytes, JSON, or CSV for an output ending in .csv
+
+    if not output.endswith(".csv"):
+        return((json.dumps(result, indent=1, sort_keys=True, default=str) + "\n").encode('utf-8'))
+
+    import csv
+    import io
+
+    rows = [dict({"run": run["run"], "name": run["name"], "value": run["value"], "seconds": run["seconds"]},
+                 **run["summary"]) for run in result["runs"]]
+    columns = list(rows[0]) if rows else ["run", "name", "value", "seconds"]
+    text = io.StringIO()
+    writer = csv.DictWriter(text, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return(text.getvalue().encode('utf-8'))
+
+
+def writeResult(result, output):
+    data = formatResult(result, output)
+    if output == "-":
+        sys.stdout.write(data.decode('utf-8'))
+    else:
+        writeFileAtomic(output, data)
+
+
+def runBatch(settings):
+    '''
+    Check and run a batch job given as a dict of settings and batch options,
+    write its result file and return the result. Bad settings raise
+    ValueError before anything is run or written.
+    '''
+
+    return(BatchJob(settings).execute())
+
+
+def main(arguments):
+
+    settings = {}
+    commandLine = []
+    for argument in arguments:
+        if argument.startswith("--"):
+            commandLine.append(argument[2:])
+        elif "=" in argument:
+            commandLine.append(argument)
+        elif not settings:
+            try:
+                settings = readConfigFile(argument)
+            except (OSError, ValueError) as error:
+                sys.stderr.write("qlbes.batch: " + str(error) + "\n")
+                return(2)
+        else:
+            sys.stderr.write("usage: python -m qlbes.batch [config file] [name=value ...] [--output=result.json] [--processes=N]\n")
+            return(2)
+
+    try:
+        settings.update(parseSettings(commandLine))
+        job = BatchJob(settings)
+    except ValueError as error:
+        sys.stderr.write("qlbes.batch: " + str(error) + "\n")
+        return(2)
+
+    try:
+        job.execute()
+    except Exception as error:
+        sys.stderr.write("qlbes.batch: {}: {}\n".format(type(error).__name__, error))
+        return(1)
+    return(0)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,46 @@
+'''
+On-disk cache shared by the qlbes modules.
+
+Everything goes into one directory, ".qlbes_cache" in the current directory
+unless the QLBES_CACHE_DIR environment variable names another one. Files are
+written to a temporary name and renamed, so a run that is stopped half way
+never leaves a broken cache behind.
+'''
+
+import json
+import os
+
+CACHE_DIR_VARIABLE = "QLBES_CACHE_DIR"
+DEFAULT_CACHE_DIR = ".qlbes_cache"
+
+
+def cacheDirectory(create=True):
+    directory = os.environ.get(CACHE_DIR_VARIABLE, DEFAULT_CACHE_DIR)
+    if create == True:
+        os.makedirs(directory, exist_ok=True)
+    return(directory)
+
+
+def cachePath(fileName, create=True):
+    return(os.path.join(cacheDirectory(create), fileName))
+
+
+def readJsonCache(fileName):
+    # the cached dict, or an empty one if there is no cache yet (or it cannot be read)
+
+    try:
+        with open(cachePath(fileName, create=False), 'r') as inFile:
+            return(json.load(inFile))
+    except (OSError, ValueError):
+        return({})
+
+
+def writeJsonCache(fileName, data):
+    writeFileAtomic(cachePath(fileName), json.dumps(data, sort_keys=True, indent=1).encode('utf-8'))
+
+
+def writeFileAtomic(path, data):
+    tempPath = path + ".tmp" + str(os.getpid())
+    with open(tempPath, 'wb') as outFile:
+        outFile.write(data)
+    os.replace(tempPath, path)
@@ -0,0 +1,155 @@
+'''
+Automatic calibration of the starting difficulty slope and the EMA scaling factor.
+
+Two constants come from charts of earlier simulations:
+
+    dDiff = trueNetworkWeight / 5.86     slope from chart of simulated results, uniform wallets
+    EMAScalingFactor = 5.59              simulated value for 20 million network weight
+
+Both depend on the wallet population and the retarget settings. With the wrong
+slope a run starts away from equilibrium and the first few hundred blocks are
+warm-up, with the wrong EMA factor the 4 x 121 EMA network weight is biased.
+
+calibrate() fits both by least squares through the origin over short runs with
+the fast "bernoulli" engine, scaling the population to a few network weights,
+each run with its own random stream so the points are independent. The fits of
+the runs are averaged with equal weight, whatever their network weight:
+
+    dDiff = trueNetworkWeight / startingDifficultySlope     from the equilibrium difficulty
+    trueNetworkWeight = EMAScalingFactor x 4th EMA          from the unrounded 4th EMA
+
+calibratedConfig() looks the constants up in the cache first, keyed by a
+fingerprint of the settings that change them, so only the first run with a new
+population or retarget configuration pays for the fit.
+
+    python -m qlbes.calibration walletWeightDistribution=Uniform targetMultiplier=45000
+'''
+
+import random
+import sys
+
+from .cache import readJsonCache, writeJsonCache
+from .estimators import CascadedEMAEstimator
+from .population import POPULATION_SETTINGS, Population, loadWallets
+from .simulator import makeRng, simulateBlocks
+
+CALIBRATION_CACHE = "calibration.json"
+
+# the settings that move the equilibrium difficulty or the EMA: those of the
+# population (POPULATION_SETTINGS, the seed too, it draws the "Random" and
+# "Library" wallets) and of the retarget. The rest (engine, numBlocks, logging)
+# do not change the constants
+
+CONSENSUS_SETTINGS = ("useRetarget", "targetMultiplier", "useNormalDistributionForOffset", "offsetFromStartOfStep",
+                      "standardDeviationWithinStep", "secondSHA256Check", "secondCheckStep", "useTargetScaling",
+                      "compoundTargetScaling", "targetScalingFactor", "startingStep")
+
+CALIBRATION_SETTINGS = POPULATION_SETTINGS + CONSENSUS_SETTINGS
+
+WEIGHT_MULTIPLIERS = (0.6, 1.0, 1.6)     # network weights around the population as given
+
+
+def calibrationFingerprint(config):
+    return(config.fingerprint(CALIBRATION_SETTINGS))
+
+
+def scalePopulation(population, multiplier):
+    # the same wallets, every weight times multiplier, at least 1 coin each
+
+    return(Population([max(1, int(round(weight * multiplier))) for weight in population.walletWeight],
+                      population.walletStaking))
+
+
+def calibrate(config, weightMultipliers=WEIGHT_MULTIPLIERS, numBlocks=3000, warmupBlocks=600):
+    '''
+    Fit startingDifficultySlope and EMAScalingFactor for the population and
+    retarget settings of config. Returns a dict with both constants and the
+    points the fit was made from, one per network weight.
+    '''
+
+    config = config.replace(engine="bernoulli", numBlocks=numBlocks, useDynamicWeights="No", scenarioFile=None,
+                            useWalletGrowth=False, useSecretsModule=False).validate()
+
+    basePopulation = loadWallets(config, makeRng(config))
+
+    points = []
+
+    for point, multiplier in enumerate(weightMultipliers):
+
+        rng = random.Random(str(config.seed) + " calibration " + str(point))
+        population = scalePopulation(basePopulation, multiplier)
+        fourthEMA = CascadedEMAEstimator(121, 4, 1.0, 0, alpha=0.0164, name="fourthEMA")   # unscaled, unrounded
+
+        pointWD = pointWW = pointWE = pointEE = 0.0
+        blocks = 0
+
+        for record in simulateBlocks(config, population, rng, estimators=[fourthEMA]):
+            if record.block - config.startingBlock < warmupBlocks:
+                continue
+            weight = record.trueNetworkWeight
+            ema = record.estimates[0]
+            pointWD += weight * record.difficulty
+            pointWW += weight * weight
+            pointWE += weight * ema
+            pointEE += ema * ema
+            blocks += 1
+
+        points.append({"multiplier": multiplier,
+                       "trueNetworkWeight": population.trueNetworkWeight,
+                       "blocks": blocks,
+                       "slope": pointWW / pointWD,
+                       "EMAScalingFactor": pointWE / pointEE})
+
+    # dDiff = k x weight fitted in each run, slope = 1 / k
+
+    return({"fingerprint": calibrationFingerprint(config),
+            "startingDifficultySlope": sum(point["slope"] for point in points) / len(points),
+            "EMAScalingFactor": sum(point["EMAScalingFactor"] for point in points) / len(points),
+            "numBlocks": numBlocks,
+            "warmupBlocks": warmupBlocks,
+            "points": points})
+
+
+def cachedCalibration(config, refresh=False, **calibrateOptions):
+    # the calibration for config from the cache, fitting and storing it if needed
+
+    fingerprint = calibrationFingerprint(config)
+    cache = readJsonCache(CALIBRATION_CACHE)
+
+    if refresh == False and fingerprint in cache:
+        return(cache[fingerprint])
+
+    calibration = calibrate(config, **calibrateOptions)
+    cache = readJsonCache(CALIBRATION_CACHE)    # again, another process may have added to it
+    cache[fingerprint] = calibration
+    writeJsonCache(CALIBRATION_CACHE, cache)
+    return(calibration)
+
+
+def calibratedConfig(config, refresh=False, **calibrateOptions):
+    # config with the fitted startingDifficultySlope and EMAScalingFactor
+
+    calibration = cachedCalibration(config, refresh, **calibrateOptions)
+    return(config.replace(startingDifficultySlope=calibration["startingDifficultySlope"],
+                          EMAScalingFactor=calibration["EMAScalingFactor"]))
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+
+    refresh = "--refresh" in arguments
+    settings = parseSettings([argument for argument in arguments if argument != "--refresh"])
+    config = SimulationConfig(**settings).validate()
+
+    calibration = cachedCalibration(config, refresh)
+
+    print("fingerprint", calibration["fingerprint"])
+    for point in calibration["points"]:
+        print("  true network weight {:>12,d} | blocks {:>6,d} | slope {:6.3f} | EMAScalingFactor {:6.3f}".format(
+            point["trueNetworkWeight"], point["blocks"], point["slope"], point["EMAScalingFactor"]))
+    print("startingDifficultySlope = {:.4f}".format(calibration["startingDifficultySlope"]))
+    print("EMAScalingFactor = {:.4f}".format(calibration["EMAScalingFactor"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
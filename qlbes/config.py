@@ -0,0 +1,233 @@
+'''
+Simulation settings for the library simulator.
+
+SimulationConfig carries the same switches and parameters as the top of the
+simulator script, under the same names, so a setting can be moved between the
+script and the library without translation. Settings not given keep the
+defaults below. Unknown names are rejected, so a typo cannot silently run the
+default simulation.
+
+    config = SimulationConfig(walletWeightDistribution="Uniform", numBlocks=5000,
+                              targetMultiplier=45000)
+'''
+
+import ast
+import hashlib
+import json
+
+from .population import WALLET_DISTRIBUTIONS
+
+DYNAMIC_WEIGHT_MODES = ("No", "Once", "Multi")
+
+DEFAULTS = {
+    # 0. fixed seed for repeatable outputs
+    "useFixedSeed": True,
+    "seed": "The Blockchain Made Ready for Business",
+
+    # 1. secrets module for cryptographically strong random numbers, no repeatability
+    "useSecretsModule": False,
+
+    # 2. retarget with each block, or use a fixed target
+    "useRetarget": True,
+    "targetMultiplier": 832,                # for retargeting, default = 832, proposed = 25000
+
+    # 3. block timing within the 16 second steps
+    "useNormalDistributionForOffset": False,
+    "offsetFromStartOfStep": 5.0,           # based on mainnet averages
+    "standardDeviationWithinStep": 0.7,     # based on mainnet timing
+
+    # 4. wallet weight distribution
+    "walletWeightDistribution": "Mainnet",  # "Uniform", "Random", "Mainnet", "Testnet", "Snapshot" or "Library"
+    "numUniformDistbnWallets": 1500,
+    "numRandomDistbnWallets": 1500,
+    "numMainnetWallets": 1500,
+    "snapshotFile": None,                   # staking snapshot for "Snapshot", see snapshots.py
+    "snapshotMinWeight": 0,                 # drop snapshot wallets under this weight
+    "snapshotTopN": None,                   # keep only the largest snapshot wallets, None for all
+    "libraryGenerator": "pareto",           # generated population for "Library", see library.py
+    "libraryWallets": 1500,
+    "libraryWeight": 25000000,
+    "libraryParameters": None,              # generator parameters as a dict, None for the defaults
+
+    # 5. second bite of the apple
+    "secondSHA256Check": False,
+    "secondCheckStep": 16,
+
+    # 6. dynamic weights
+    "useDynamicWeights": "No",              # "No", "Once" or "Multi"
+    "dynamicWeightChangeOnce": 100,         # change in percent network weight in Once mode, over wallets 10 to 19
+    "changeOnBlock": 2000,                  # change once on this block, in Once mode
+    "dynamicWeightChangeMulti": 33,         # change in percent network weight in Multi mode, over wallets 10 to 19
+    "changeAfterBlocks": 2000,              # in Multi mode, change after this many blocks
+
+    # 8. target scaling within a block
+    "useTargetScaling": False,              # double the target from startingStep, as the script
+    "compoundTargetScaling": False,         # or multiply it by targetScalingFactor on each step from startingStep
+    "targetScalingFactor": 1.05,
+    "startingStep": 16,
+
+    # 10. wallet growth
+    "useWalletGrowth": False,
+    "walletGrowthStartBlock": 1000,         # block to start wallet growth
+    "walletGrowthBlockIncrement": 500,      # spacing between blocks of wallet growth
+    "walletGrowthNumWallets": 5000,         # number of wallets to grow in each increment
+    "walletGrowthNumIncrements": 10,        # number of times to grow wallets
+    "walletGrowthWeight": 500,              # weight of each new wallet
+
+    # run length
+    "numBlocks": 2000,                      # 675 blocks a day, 4725 a week, 20250 month, 246375 a year
+    "startingBlock": 0,
+
+    # population churn, see scenarios.py, None for the dynamic weights and wallet growth settings
+    "scenarioFile": None,
+
+    # starting difficulty and network weight estimation
+    "startingDifficultySlope": 5.86,        # dDiff = trueNetworkWeight / 5.86, slope from chart of simulated results
+    "EMAScalingFactor": 5.59,               # simulated value for 20 million network weight
+
+    # step engine, see engines.py
+    "engine": "sha256",
+    "numShards": 0,                         # split the wallet scan of each step into shards, see parallel.py
+    "shardWorkers": None,                   # workers checking the shards, None for one per CPU
+    "shardMode": "auto",                    # "auto", "threads", "processes" or "serial"
+
+    # winner among the solvers of a step, "last", "first", "uniform" or "offset", see selection.py
+    "tieBreak": "last",
+
+    # orphans among the solvers of a step, reported next to collisionCount, see orphans.py
+    "useOrphanModel": False,
+    "propagationDelayMedian": 1.0,          # seconds for a block to reach another staker, log-normal
+    "propagationDelaySigma": 0.8,
+}
+
+
+class SimulationConfig:
+
+    def __init__(self, **settings):
+
+        unknown = sorted(set(settings) - set(DEFAULTS))
+        if unknown:
+            raise ValueError("unknown simulation setting(s): " + ", ".join(unknown))
+
+        for name, value in DEFAULTS.items():
+            setattr(self, name, settings.get(name, value))
+
+    def __repr__(self):
+        changed = ["{}={!r}".format(name, value) for name, value in self.asDict().items() if value != DEFAULTS[name]]
+        return("SimulationConfig(" + ", ".join(changed) + ")")
+
+    def __eq__(self, other):
+        return(isinstance(other, SimulationConfig) and self.asDict() == other.asDict())
+
+    def asDict(self):
+        return({name: getattr(self, name) for name in DEFAULTS})
+
+    @classmethod
+    def fromDict(cls, settings):
+        return(cls(**settings))
+
+    def replace(self, **settings):
+        # a copy with some settings changed, the config itself is left alone
+
+        newSettings = self.asDict()
+        newSettings.update(settings)
+        return(SimulationConfig(**newSettings))
+
+    def fingerprint(self, names=None):
+        '''
+        Short hex digest of the settings (or just the named settings), the
+        same on every machine, used to key caches and tag outputs.
+        '''
+
+        if names is None:
+            names = DEFAULTS
+        settings = {name: getattr(self, name) for name in names}
+        text = json.dumps(settings, sort_keys=True, default=str)
+        return(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16])
+
+    def validate(self):
+        # check everything up front, before any simulating is done
+
+        if self.walletWeightDistribution not in WALLET_DISTRIBUTIONS:
+            raise ValueError('walletWeightDistribution must be "Uniform", "Random", "Mainnet", "Testnet", "Snapshot", or "Library", not ' + repr(self.walletWeightDistribution))
+
+        if self.useDynamicWeights not in DYNAMIC_WEIGHT_MODES:
+            raise ValueError('useDynamicWeights must be "No", "Once" or "Multi", not ' + repr(self.useDynamicWeights))
+
+        if self.walletWeightDistribution == "Mainnet" and self.numMainnetWallets < 401:
+            raise ValueError("numMainnetWallets must be at least 401, the big and little guys plus one")
+
+        if self.walletWeightDistribution == "Snapshot" and self.snapshotFile is None:
+            raise ValueError('walletWeightDistribution "Snapshot" needs a snapshotFile')
+
+        if self.walletWeightDistribution == "Library":
+            from .library import generatorParameters
+            generatorParameters(self.libraryGenerator, self.libraryParameters)
+            if self.libraryWallets < 1 or self.libraryWeight < self.libraryWallets:
+                raise ValueError("libraryWallets must be 1 or more and libraryWeight at least 1 coin per wallet")
+
+        for name in ("numBlocks", "targetMultiplier", "numUniformDistbnWallets", "numRandomDistbnWallets",
+                     "startingDifficultySlope", "EMAScalingFactor", "changeAfterBlocks"):
+            if getattr(self, name) <= 0:
+                raise ValueError(name + " must be greater than 0, not " + repr(getattr(self, name)))
+
+        for name in ("secondCheckStep", "startingStep"):
+            if getattr(self, name) < 1:
+                raise ValueError(name + " must be 1 or more, steps start from 1")
+
+        if self.targetScalingFactor <= 0.0:
+            raise ValueError("targetScalingFactor must be greater than 0")
+
+        from .engines import ENGINES        # only needed here, keeps importing the config cheap
+        if self.engine not in ENGINES:
+            raise ValueError("engine must be one of " + ", ".join(sorted(ENGINES)) + ", not " + repr(self.engine))
+
+        if self.numShards < 0:
+            raise ValueError("numShards must be 0 or more, not " + repr(self.numShards))
+
+        if self.numShards > 0:
+            from .parallel import SHARD_MODES, SHARDED_ENGINES
+            if self.engine not in SHARDED_ENGINES:
+                raise ValueError("numShards needs a wallet scanning engine, " + " or ".join(SHARDED_ENGINES) + ", not " + repr(self.engine))
+            if self.shardMode not in SHARD_MODES:
+                raise ValueError("shardMode must be one of " + ", ".join(SHARD_MODES) + ", not " + repr(self.shardMode))
+
+        from .selection import TIE_BREAKS
+        if self.tieBreak not in TIE_BREAKS:
+            raise ValueError("tieBreak must be one of " + ", ".join(TIE_BREAKS) + ", not " + repr(self.tieBreak))
+
+        if self.propagationDelayMedian <= 0.0 or self.propagationDelaySigma < 0.0:
+            raise ValueError("propagationDelayMedian must be greater than 0 and propagationDelaySigma 0 or more")
+
+        return(self)
+
+
+def configFromNamespace(namespace):
+    '''
+    SimulationConfig from the settings found in a namespace, for the simulator
+    script to pass its globals(). Names the config does not know are ignored.
+    '''
+
+    return(SimulationConfig(**{name: namespace[name] for name in DEFAULTS if name in namespace}))
+
+
+def parseSettings(arguments):
+    '''
+    Settings from command line arguments of the form name=value. Values are
+    read as Python literals (numbers, True, False, quoted strings), anything
+    else is taken as a plain string, so walletWeightDistribution=Uniform works.
+    '''
+
+    settings = {}
+
+    for argument in arguments:
+        name, equals, text = argument.partition("=")
+        if equals == "":
+            raise ValueError("settings must look like name=value, not " + repr(argument))
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            value = text
+        settings[name.strip()] = value
+
+    return(settings)
@@ -0,0 +1,21 @@
+'''
+Consensus parameters, or constants from the bitcoin / qtum source code, the same
+values the simulator script uses.
+'''
+
+nPowTargetTimespan = 16 * 60            # from chainparams.cpp, line 89
+nPowTargetSpacing = 2 * 64              # from chainparams.cpp, line 90
+nPoSInterval = 72                       # for GetPoSKernelPS() in blockchain.cpp line 111, default 72
+COIN = 100000000                        # from amount.h line 17: static const CAmount COIN = 100000000;
+
+                                        # // To decrease granularity of timestamp, Supposed to be 2^n-1
+STAKE_TIMESTAMP_MASK = 15               # pos.h line 21: static const uint32_t STAKE_TIMESTAMP_MASK = 15;
+
+EASIEST_DIFFICULTY = 26959000000000000000000000000000000000000000000000000000000000000000
+                                        # = ffff0000000000000000000000000000000000000000000000000000 in hex
+
+STEP_SECONDS = STAKE_TIMESTAMP_MASK + 1  # 16 second steps
+
+MAX_ACTUAL_SPACING = nPowTargetSpacing * 10    # pow.cpp, line 82, limit adjustment step, 1280 seconds
+
+FIVE_X_STEPS = 40                       # 40 steps x 16 seconds = 640 seconds, 5x target spacing
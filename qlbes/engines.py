@@ -0,0 +1,226 @@
+'''
+Step engines, the wallet loop of the simulator.
+
+An engine checks every staking wallet for one 16 second step and returns the
+wallets that found a solution, in wallet order:
+
+    solvers, secondBites = engine.checkStep(population, stepTarget, secondBite)
+
+stepTarget already includes any target scaling for the step. If secondBite is
+True, a wallet that misses takes a second bite of the apple with a fresh hash
+(COMPLEXITY SWITCH 5), secondBites counts the solutions found that way.
+
+"sha256" is the reference engine, the same hash-and-compare as the script:
+
+    hashProofOfStake = SHA-256 of a 256 bit random number, as a big int
+    solution if hashProofOfStake < target * walletWeight * COIN
+
+"bernoulli" skips the hashing. The hash is uniform over 0 .. 2^256 - 1, so the
+comparison succeeds with probability target * walletWeight * COIN / 2^256, and
+one random() per wallet gives the same odds at a small fraction of the cost.
+
+"thinning" gives the same odds again without visiting every wallet, jumping
+between candidates within weight classes (see large.py). Its time per step
+hardly depends on the number of wallets, it is the engine for LargePopulation.
+
+"index" gives the same odds by drawing hits from a Fenwick tree of the staking
+weights (see selection.py), O(log n) per hit and per wallet change.
+
+With numShards > 0 the "sha256" or "bernoulli" wallet scan is split into
+shards checked by a pool of workers, see parallel.py.
+'''
+
+import hashlib
+import random
+
+from .consensus import COIN
+from .large import WeightClasses
+from .selection import WeightIndex, indexSolvers
+
+
+def sha256Solvers(staking, targetCoin, randbits, secondBite):
+    # the hash-and-compare loop over (wallet, weight) pairs, targetCoin = stepTarget * COIN
+
+    sha256 = hashlib.sha256
+    fromBytes = int.from_bytes
+
+    solvers = []
+    secondBites = 0
+
+    for wallet, weight in staking:
+
+        temp = str(randbits(256)).encode('utf-8')
+        hashProofOfStake = fromBytes(sha256(temp).digest(), 'big')   # same as int(hexdigest, 16)
+
+        if hashProofOfStake < targetCoin * weight:
+            solvers.append(wallet)
+
+        elif secondBite == True:                          # nonce += 1
+            temp = str(randbits(256)).encode('utf-8')
+            hashProofOfStake = fromBytes(sha256(temp).digest(), 'big')
+
+            if hashProofOfStake < targetCoin * weight:
+                solvers.append(wallet)
+                secondBites += 1
+
+    return(solvers, secondBites)
+
+
+def bernoulliSolvers(staking, scale, rand, secondBite):
+    # one random() per (wallet, weight) pair, scale = probability of a solution per coin of weight
+
+    solvers = []
+    secondBites = 0
+
+    for wallet, weight in staking:
+
+        if rand() < scale * weight:
+            solvers.append(wallet)
+
+        elif secondBite == True and rand() < scale * weight:
+            solvers.append(wallet)
+            secondBites += 1
+
+    return(solvers, secondBites)
+
+
+class Sha256Engine:
+
+    name = "sha256"
+
+    def __init__(self, config, rng):
+
+        # get a 256 bit random number to use as the digest for SHA-256
+        # use either the Python random module of the secrets module
+
+        if config.useSecretsModule == True:                  # COMPLEXITY SWITCH 1
+            import secrets                                   # only when used, keeps startup cheap
+            self.randbits = secrets.randbits
+        else:
+            self.randbits = rng.getrandbits
+
+        self.stakingPopulation = None
+        self.stakingVersion = None
+        self.staking = []
+
+    def stakingWallets(self, population):
+        # (wallet, weight) for the staking wallets, rebuilt only after the population changes
+
+        if population.version != self.stakingVersion or self.stakingPopulation is not population:
+            self.staking = population.stakingWallets()
+            self.stakingVersion = population.version
+            self.stakingPopulation = population
+        return(self.staking)
+
+    def close(self):
+        # engines with workers stop them here, at the end of the run
+        pass
+
+    def checkStep(self, population, stepTarget, secondBite):
+        return(sha256Solvers(self.stakingWallets(population), stepTarget * COIN, self.randbits, secondBite))
+
+
+class BernoulliEngine(Sha256Engine):
+
+    name = "bernoulli"
+
+    def __init__(self, config, rng):
+        Sha256Engine.__init__(self, config, rng)
+
+        if config.useSecretsModule == True:
+            self.random = random.SystemRandom().random
+        else:
+            self.random = rng.random
+
+    def checkStep(self, population, stepTarget, secondBite):
+        return(bernoulliSolvers(self.stakingWallets(population), stepTarget * COIN / HASH_SPACE, self.random, secondBite))
+
+
+class ThinningEngine(BernoulliEngine):
+
+    name = "thinning"
+
+    def __init__(self, config, rng):
+        BernoulliEngine.__init__(self, config, rng)
+        self.classes = None
+
+    def weightClasses(self, population):
+        # a LargePopulation keeps its own, others are grouped again after they change
+
+        classes = getattr(population, "weightClasses", None)
+        if classes is not None:
+            return(classes)
+
+        if population.version != self.stakingVersion or self.stakingPopulation is not population:
+            weights = getattr(population, "walletWeight", None)
+            if weights is None:
+                weights = [population.weightOf(wallet) for wallet in range(population.numWallets)]
+            self.classes = WeightClasses(weights)
+            self.stakingVersion = population.version
+            self.stakingPopulation = population
+        return(self.classes)
+
+    def checkStep(self, population, stepTarget, secondBite):
+
+        scale = stepTarget * COIN / HASH_SPACE
+        classes = self.weightClasses(population)
+
+        solvers = classes.solvers(scale, self.random, population.weightOf, population.isStaking)
+        secondBites = 0
+
+        if secondBite == True:        # a second, independent pass, new solvers are second bites
+            again = set(classes.solvers(scale, self.random, population.weightOf, population.isStaking))
+            again.difference_update(solvers)
+            if again:
+                secondBites = len(again)
+                solvers = sorted(again.union(solvers))
+
+        return(solvers, secondBites)
+
+
+class IndexEngine(ThinningEngine):
+
+    name = "index"
+
+    MAX_THINNING_PROBABILITY = 0.5     # above this the hits are mostly thrown away, check each wallet
+
+    def checkStep(self, population, stepTarget, secondBite):
+
+        index = population.weightIndex
+        if index is None:
+            index = population.weightIndex = WeightIndex.fromPopulation(population)   # kept up to date from now on
+
+        scale = stepTarget * COIN / HASH_SPACE
+        if scale * index.maxWeight >= self.MAX_THINNING_PROBABILITY:
+            return(ThinningEngine.checkStep(self, population, stepTarget, secondBite))
+
+        solvers = indexSolvers(index, scale, self.random, population.weightOf)
+        secondBites = 0
+
+        if secondBite == True:        # a second, independent draw, new solvers are second bites
+            again = set(indexSolvers(index, scale, self.random, population.weightOf))
+            again.difference_update(solvers)
+            if again:
+                secondBites = len(again)
+                solvers = sorted(again.union(solvers))
+
+        return(solvers, secondBites)
+
+
+HASH_SPACE = 2 ** 256
+
+ENGINES = {
+    Sha256Engine.name: Sha256Engine,
+    BernoulliEngine.name: BernoulliEngine,
+    ThinningEngine.name: ThinningEngine,
+    IndexEngine.name: IndexEngine,
+}
+
+
+def makeEngine(config, rng):
+
+    if config.numShards > 0:
+        from .parallel import ShardedEngine     # worker pools only when sharding
+        return(ShardedEngine(config, rng))
+
+    return(ENGINES[config.engine](config, rng))
@@ -0,0 +1,183 @@
+'''
+Statistical equivalence of a step engine with the SHA-256 reference.
+
+A faster engine is only worth having if it gives the same chain as the
+hash-and-compare loop of the script. compareEngines() runs the "sha256" engine
+and a candidate on the same configurations, the same wallets and independent
+random streams, and compares per block:
+
+    steps           16 second steps to the solution     Kolmogorov-Smirnov
+    winner weight   weight of the block reward winner   Kolmogorov-Smirnov
+    collisions      solvers - 1 in the winning step      chi-square
+
+over EQUIVALENCE_CONFIGURATIONS, which cover the four wallet distributions,
+a fixed target, target scaling, the second SHA-256 check and dynamic weights
+("Once", the same change for both engines; "Multi" draws its changes from the
+run's random stream, so the two populations would drift apart).
+A candidate passes if no p-value falls under alpha divided by the number of
+tests (Bonferroni), so a correct engine fails only alpha of the time overall.
+With retargeting on, neighbouring blocks are correlated through the target,
+the p-values are approximate there; runs adds independent runs to the samples.
+
+    python -m qlbes.equivalence bernoulli --blocks=500 --runs=2
+    python -m qlbes.equivalence sha256 numShards=4 --only=Mainnet,second check
+
+The report also gives the speedup, reference seconds over candidate seconds.
+'''
+
+import random
+import sys
+import time
+
+from .config import SimulationConfig, parseSettings
+from .population import loadWallets
+from .simulator import makeRng, simulateBlocks
+from .statistics import chiSquareTwoSample, ksTwoSample
+
+REFERENCE_ENGINE = "sha256"
+
+EQUIVALENCE_CONFIGURATIONS = [
+    ("Uniform", {"walletWeightDistribution": "Uniform"}),
+    ("Random", {"walletWeightDistribution": "Random"}),
+    ("Mainnet", {"walletWeightDistribution": "Mainnet"}),
+    ("Testnet", {"walletWeightDistribution": "Testnet"}),
+    ("fixed target", {"walletWeightDistribution": "Mainnet", "useRetarget": False}),
+    ("target scaling", {"walletWeightDistribution": "Mainnet", "useTargetScaling": True, "startingStep": 6}),
+    ("second check", {"walletWeightDistribution": "Mainnet", "secondSHA256Check": True, "secondCheckStep": 6}),
+    ("dynamic weights", {"walletWeightDistribution": "Mainnet", "useDynamicWeights": "Once", "changeOnBlock": 100}),
+]
+
+METRICS = (("steps", ksTwoSample, "KS"),
+           ("winner weight", ksTwoSample, "KS"),
+           ("collisions", chiSquareTwoSample, "chi2"))
+
+
+def blockSamples(config, snapshot, seed, runs):
+    # steps, winner weights and collisions of runs runs, and the seconds they took
+
+    samples = {name: [] for name, test, label in METRICS}
+    seconds = 0.0
+
+    for run in range(runs):
+        rng = random.Random(seed + " " + str(run))
+        start = time.perf_counter()
+        records = list(simulateBlocks(config, snapshot, rng))
+        seconds += time.perf_counter() - start
+
+        samples["steps"].extend(record.steps for record in records)
+        samples["winner weight"].extend(record.weight for record in records)
+        samples["collisions"].extend(len(record.solvers) - 1 for record in records)
+
+    return(samples, seconds)
+
+
+def compareEngines(candidate, config=None, numBlocks=500, runs=1, alpha=0.01, configurations=None):
+    '''
+    Run the reference and the candidate engine (a name from ENGINES, or a dict
+    of settings such as {"engine": "sha256", "numShards": 4}) on every
+    configuration. Returns a report dict: passed, speedup, and per
+    configuration the p-value of every test and the seconds of both engines.
+    '''
+
+    if config is None:
+        config = SimulationConfig()
+    if configurations is None:
+        configurations = EQUIVALENCE_CONFIGURATIONS
+    if isinstance(candidate, str):
+        candidate = {"engine": candidate}
+
+    threshold = alpha / (len(configurations) * len(METRICS))
+    results = []
+    referenceSeconds = candidateSeconds = 0.0
+
+    for name, settings in configurations:
+
+        base = config.replace(numBlocks=numBlocks, **settings)
+        reference = base.replace(engine=REFERENCE_ENGINE, numShards=0)
+        tested = base.replace(**candidate)
+        reference.validate()
+        tested.validate()
+
+        snapshot = loadWallets(base, makeRng(base)).snapshot()      # the same wallets for both
+
+        referenceSamples, referenceTime = blockSamples(reference, snapshot, str(base.seed) + " reference", runs)
+        candidateSamples, candidateTime = blockSamples(tested, snapshot, str(base.seed) + " candidate", runs)
+        referenceSeconds += referenceTime
+        candidateSeconds += candidateTime
+
+        tests = []
+        for metric, test, label in METRICS:
+            statistic, pValue = test(referenceSamples[metric], candidateSamples[metric])
+            referenceValues = referenceSamples[metric]
+            candidateValues = candidateSamples[metric]
+            tests.append({"metric": metric, "test": label, "statistic": statistic, "pValue": pValue,
+                          "referenceMean": sum(referenceValues) / len(referenceValues),
+                          "candidateMean": sum(candidateValues) / len(candidateValues),
+                          "passed": pValue >= threshold})
+
+        results.append({"name": name, "settings": settings, "tests": tests,
+                        "passed": all(test["passed"] for test in tests),
+                        "referenceSeconds": referenceTime, "candidateSeconds": candidateTime,
+                        "speedup": referenceTime / candidateTime if candidateTime > 0.0 else None})
+
+    return({"candidate": candidate, "numBlocks": numBlocks, "runs": runs, "alpha": alpha, "threshold": threshold,
+            "passed": all(result["passed"] for result in results),
+            "speedup": referenceSeconds / candidateSeconds if candidateSeconds > 0.0 else None,
+            "configurations": results})
+
+
+def formatReport(report):
+    # a table for the display, one line per test
+
+    candidate = ", ".join("{}={}".format(name, value) for name, value in report["candidate"].items())
+    lines = ["candidate {} against {} | {:,d} blocks x {:d} runs | alpha {:g}, {:.2e} per test".format(
+                 candidate, REFERENCE_ENGINE, report["numBlocks"], report["runs"], report["alpha"], report["threshold"]),
+             "   configuration |        metric | test |  statistic |  p-value |   ref mean |  cand mean | speedup | result"]
+
+    for result in report["configurations"]:
+        speedup = "{:7.1f}".format(result["speedup"]) if result["speedup"] is not None else "    n/a"
+        for index, test in enumerate(result["tests"]):
+            lines.append("{:>16} | {:>13} | {:>4} | {:>10.4f} | {:>8.4f} | {:>10,.2f} | {:>10,.2f} | {} | {}".format(
+                result["name"] if index == 0 else "", test["metric"], test["test"], test["statistic"], test["pValue"],
+                test["referenceMean"], test["candidateMean"], speedup if index == 0 else "       ",
+                "pass" if test["passed"] else "FAIL"))
+
+    speedup = "n/a" if report["speedup"] is None else "{:.1f}x".format(report["speedup"])
+    lines.append("overall: " + ("PASS" if report["passed"] else "FAIL") + ", speedup " + speedup)
+    return("\n".join(lines))
+
+
+def main(arguments):
+
+    options = {"--blocks": "500", "--runs": "1", "--alpha": "0.01", "--only": None}
+    settingArguments = []
+    for argument in arguments:
+        name, equals, value = argument.partition("=")
+        if name in options:
+            options[name] = value
+        else:
+            settingArguments.append(argument)
+
+    if not settingArguments:
+        print("usage: python -m qlbes.equivalence engine [name=value ...] [--blocks=500] [--runs=1] [--alpha=0.01] [--only=name,name]")
+        return(2)
+
+    settings = parseSettings(settingArguments[1:])
+    candidate = {"engine": settingArguments[0]}
+    for name in ("numShards", "shardWorkers", "shardMode"):       # settings of the candidate only
+        if name in settings:
+            candidate[name] = settings.pop(name)
+
+    configurations = EQUIVALENCE_CONFIGURATIONS
+    if options["--only"] is not None:
+        names = options["--only"].split(",")
+        configurations = [item for item in EQUIVALENCE_CONFIGURATIONS if item[0] in names]
+
+    report = compareEngines(candidate, SimulationConfig(**settings), int(options["--blocks"]), int(options["--runs"]),
+                            float(options["--alpha"]), configurations)
+    print(formatReport(report))
+    return(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
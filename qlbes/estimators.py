@@ -0,0 +1,326 @@
+'''
+Network weight estimators, and scoring them against the true network weight.
+
+The simulator has two estimators built in:
+
+    "72 block"   nNetworkWeight / nStakesTime x (STAKE_TIMESTAMP_MASK + 1) over the
+                 last nPoSInterval blocks, GetPoSKernelPS() in blockchain.cpp
+    "4x121 EMA"  four cascaded 121 block EMAs of the difficulty, times
+                 EMAScalingFactor = 5.59, rounded down to 250
+
+Both are estimators here, next to others, all with the same interface:
+
+    estimator.reset(startingDifficulty)
+    estimate = estimator.update(dDiff, nActualSpacing)   # coins, or None while warming up
+
+update() is O(1) per block, and O(window) for the median (a binary search,
+then a list insert and delete, memory moves of a few hundred pointers), so any
+number of estimators can run side by side in a single pass over a simulated
+chain or a replayed one. evaluateEstimators() does that pass and scores each estimator
+for bias, noise and lag against trueNetworkWeight, including the response to
+step changes from dynamic weights.
+'''
+
+import bisect
+import math
+from array import array
+
+from .consensus import COIN, STAKE_TIMESTAMP_MASK, nPoSInterval, nPowTargetSpacing
+
+TWO_TO_32 = 4294967296
+
+LAG_FRACTION = 1.0 - math.exp(-1.0)     # lag is the time constant, 63.2% of a step change
+
+STEP_THRESHOLD = 0.05                   # a change of the true network weight by 5% or more in one block
+
+
+class PoSIntervalEstimator:
+    '''
+    Moving sum of difficulty x 2^32 over the moving sum of the block spacing, for
+    the last window blocks. None until window + 1 blocks have been seen, the same
+    as the "not yet" of the script.
+    '''
+
+    def __init__(self, window=nPoSInterval, name=None):
+        self.window = window
+        self.name = name if name is not None else "sma" + str(window)
+        self.reset(0.0)
+
+    def reset(self, startingDifficulty):
+        self.nNetworkWeightList = array('d', (startingDifficulty * TWO_TO_32,) * self.window)
+        self.nStakesTimeList = array('d', (float(nPowTargetSpacing),) * self.window)   # nominally 128 seconds
+        self.nNetworkWeight = 0.0
+        self.nStakesTime = 0.0
+        self.index = 0
+        self.blocks = 0
+
+    def update(self, dDiff, nActualSpacing):
+
+        index = self.index
+
+        if self.blocks >= self.window:      # subtract old moving average contribution, after initialization
+            self.nNetworkWeight -= self.nNetworkWeightList[index]
+            self.nStakesTime -= self.nStakesTimeList[index]
+
+        self.nNetworkWeight += dDiff * TWO_TO_32
+        self.nNetworkWeightList[index] = dDiff * TWO_TO_32
+        self.nStakesTime += nActualSpacing
+        self.nStakesTimeList[index] = nActualSpacing
+
+        index += 1
+        self.index = index if index < self.window else 0     # wrap
+        self.blocks += 1
+
+        if self.blocks <= self.window:
+            return(None)                    # not yet
+
+        return(self.nNetworkWeight / self.nStakesTime * (STAKE_TIMESTAMP_MASK + 1) / COIN)
+
+
+class CascadedEMAEstimator:
+    '''
+    depth cascaded EMAs of the difficulty, the last one times scalingFactor and
+    rounded down to roundTo. EMA multiplier = 2 / (period + 1), unless alpha is
+    given; the simulator uses 0.0164 for 121 blocks.
+    '''
+
+    def __init__(self, period=121, depth=4, scalingFactor=5.59, roundTo=250, alpha=None, name=None):
+        self.period = period
+        self.depth = depth
+        self.scalingFactor = scalingFactor
+        self.roundTo = roundTo
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.name = name if name is not None else "ema" + str(depth) + "x" + str(period)
+        self.reset(0.0)
+
+    def reset(self, startingDifficulty):
+        self.stages = [startingDifficulty] * self.depth
+
+    def update(self, dDiff, nActualSpacing):
+
+        alpha = self.alpha
+        beta = 1.0 - alpha
+        stages = self.stages
+
+        x = dDiff
+        for i in range(self.depth):
+            x = alpha * x + beta * stages[i]
+            stages[i] = x
+
+        estimate = self.scalingFactor * x
+        if self.roundTo:
+            estimate -= estimate % self.roundTo     # round down, to elliminate noise
+        return(estimate)
+
+
+class MedianEstimator:
+    '''
+    Median difficulty over the last window blocks times scalingFactor, a
+    median filter that ignores the odd very short or very long block. The
+    window is kept as a sorted list, O(window) per update.
+    '''
+
+    def __init__(self, window=121, scalingFactor=5.59, name=None):
+        self.window = window
+        self.scalingFactor = scalingFactor
+        self.name = name if name is not None else "median" + str(window)
+        self.reset(0.0)
+
+    def reset(self, startingDifficulty):
+        self.ring = [startingDifficulty] * self.window
+        self.sorted = sorted(self.ring)
+        self.index = 0
+
+    def update(self, dDiff, nActualSpacing):
+
+        old = self.ring[self.index]
+        del self.sorted[bisect.bisect_left(self.sorted, old)]
+        bisect.insort(self.sorted, dDiff)
+        self.ring[self.index] = dDiff
+
+        self.index += 1
+        if self.index >= self.window:
+            self.index = 0
+
+        return(self.scalingFactor * self.sorted[self.window // 2])
+
+
+def defaultEstimators(EMAScalingFactor=5.59):
+    # the two estimators of the simulator, under the names used in the records
+
+    return([PoSIntervalEstimator(nPoSInterval, name="networkWeight"),
+            CascadedEMAEstimator(121, 4, EMAScalingFactor, 250, alpha=0.0164, name="newNetworkWeight")])
+
+
+def parseEstimator(text, EMAScalingFactor=5.59):
+    '''
+    Estimator from a short description, for command lines and config files:
+
+        "sma:72"      72 block nPoSInterval ratio
+        "ema:121x4"   four cascaded 121 block EMAs
+        "median:121"  121 block median of the difficulty
+    '''
+
+    kind, _, argument = text.partition(":")
+
+    try:
+        if kind == "sma":
+            return(PoSIntervalEstimator(int(argument or nPoSInterval)))
+        elif kind == "ema":
+            period, _, depth = (argument or "121x4").partition("x")
+            return(CascadedEMAEstimator(int(period), int(depth or 4), EMAScalingFactor))
+        elif kind == "median":
+            return(MedianEstimator(int(argument or 121), EMAScalingFactor))
+    except ValueError:
+        pass
+
+    raise ValueError('estimator must look like "sma:72", "ema:121x4" or "median:121", not ' + repr(text))
+
+
+# scoring - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+class EstimatorScore:
+    '''
+    Streaming score of one estimator against the true network weight:
+
+        bias    mean relative error, (estimate - true) / true
+        rmse    root mean square relative error
+        noise   block to block jitter of the relative error, the RMS of its first
+                difference over root 2, which is the stdev for white noise
+        lag     blocks for the estimate to cover 63.2% of a step change in the true
+                network weight, averaged over the step changes; None without any
+
+    A step change is a change of the true network weight by stepThreshold (relative,
+    5% by default) or more from one block to the next, as from dynamic weights or
+    wallet growth. Ramps and churn change it by a little on many blocks, that is
+    not a step to lag behind.
+    '''
+
+    def __init__(self, name, warmupBlocks=0, stepThreshold=STEP_THRESHOLD):
+        self.name = name
+        self.warmupBlocks = warmupBlocks
+        self.stepThreshold = stepThreshold
+        self.blocks = 0
+        self.count = 0
+        self.errorSum = 0.0
+        self.errorSquares = 0.0
+        self.diffSquares = 0.0
+        self.diffCount = 0
+        self.lastError = None
+        self.lastTrue = None
+        self.stepChange = None          # (block, old true, new true) while waiting on the estimate
+        self.lags = []
+        self.missedSteps = 0            # step changes the estimate never covered
+
+    def add(self, estimate, trueNetworkWeight):
+        # trueNetworkWeight is None on a replayed chain, the block is only counted
+
+        block = self.blocks
+        self.blocks += 1
+
+        if trueNetworkWeight is None:
+            return
+
+        if self.lastTrue is not None and abs(trueNetworkWeight - self.lastTrue) >= self.stepThreshold * self.lastTrue:
+            if self.stepChange is not None:
+                self.missedSteps += 1
+            self.stepChange = (block, self.lastTrue, trueNetworkWeight)
+        self.lastTrue = trueNetworkWeight
+
+        if estimate is None:
+            self.lastError = None
+            return
+
+        if self.stepChange is not None:
+            changeBlock, oldTrue, newTrue = self.stepChange
+            if (estimate - oldTrue) / (newTrue - oldTrue) >= LAG_FRACTION:
+                self.lags.append(block - changeBlock)
+                self.stepChange = None
+
+        if block < self.warmupBlocks:
+            return
+
+        error = (estimate - trueNetworkWeight) / trueNetworkWeight
+        self.count += 1
+        self.errorSum += error
+        self.errorSquares += error * error
+
+        if self.lastError is not None:
+            self.diffSquares += (error - self.lastError) ** 2
+            self.diffCount += 1
+        self.lastError = error
+
+    def summary(self):
+
+        if self.count == 0:
+            return({"name": self.name, "blocks": self.blocks, "bias": None, "rmse": None, "noise": None, "lag": None, "stepChanges": 0})
+
+        if self.lags:
+            lag = sum(self.lags) / len(self.lags)
+        else:
+            lag = None
+
+        if self.diffCount > 0:
+            noise = math.sqrt(self.diffSquares / self.diffCount / 2.0)
+        else:
+            noise = 0.0
+
+        return({"name": self.name,
+                "blocks": self.count,
+                "bias": self.errorSum / self.count,
+                "rmse": math.sqrt(self.errorSquares / self.count),
+                "noise": noise,
+                "lag": lag,
+                "stepChanges": len(self.lags) + self.missedSteps + (self.stepChange is not None)})
+
+
+def chainFromRecords(records):
+    # (dDiff, nActualSpacing, trueNetworkWeight) from BlockRecord of the library simulator
+
+    for record in records:
+        yield (record.difficulty, record.spacing, record.trueNetworkWeight)
+
+
+def evaluateEstimators(chain, estimators, startingDifficulty=None, warmupBlocks=0, stepThreshold=STEP_THRESHOLD):
+    '''
+    One pass over a chain of (dDiff, nActualSpacing, trueNetworkWeight), updating
+    every estimator on every block. Returns the estimator summaries, in the order
+    given, stepThreshold as for EstimatorScore. For a replayed chain the true
+    network weight is not known; pass None for it and only the block count is
+    reported. readChain() in replay.py gives such a chain from a spacing
+    difficulty file.
+    '''
+
+    scores = None
+
+    for dDiff, nActualSpacing, trueNetworkWeight in chain:
+
+        if scores is None:             # start the estimators from the first difficulty, unless told
+            first = dDiff if startingDifficulty is None else startingDifficulty
+            for estimator in estimators:
+                estimator.reset(first)
+            scores = [EstimatorScore(estimator.name, warmupBlocks, stepThreshold) for estimator in estimators]
+
+        for estimator, score in zip(estimators, scores):
+            score.add(estimator.update(dDiff, nActualSpacing), trueNetworkWeight)
+
+    if scores is None:
+        return([EstimatorScore(estimator.name).summary() for estimator in estimators])
+
+    return([score.summary() for score in scores])
+
+
+def formatScores(summaries):
+    # a table for the display
+
+    lines = ["       estimator |   blocks |   bias % |   rmse % |  noise % |  lag blks | steps"]
+
+    for summary in summaries:
+        def percent(value):
+            return("     n/a" if value is None else "{:8.3f}".format(100.0 * value))
+        lag = "      n/a" if summary["lag"] is None else "{:9.1f}".format(summary["lag"])
+        lines.append("{:>16} | {:8,d} | {} | {} | {} | {} | {:5d}".format(
+            summary["name"][:16], summary["blocks"], percent(summary["bias"]), percent(summary["rmse"]),
+            percent(summary["noise"]), lag, summary["stepChanges"]))
+
+    return("\n".join(lines))
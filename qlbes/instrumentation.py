@@ -0,0 +1,118 @@
+'''
+Hot path instrumentation, per-phase timers and counters for a simulation run.
+
+Turn on with enableInstrumentation = True in the simulator. When the switch is
+off the script never imports this module, and the wallet loop pays nothing:
+the switch is tested once per step to pick the plain or the timed wallet loop.
+
+The phases follow the Program Summary of the simulator:
+
+    random      - 256 bit random number from the random or secrets module
+    hash        - SHA-256 hash of the random number, converted to a big int
+    compare     - hashProofOfStake < target * weight * COIN, incl. second bite
+    retarget    - pow.cpp style adjustment of the target for the next block
+    estimators  - 72 block nPoSInterval ratio and 4 x 121 EMA network weight
+    print       - block-by-block console output
+    log         - block-by-block log file output
+
+Anything not covered by a phase (loop overhead, dynamic weights, wallet growth)
+shows up as "other" in the breakdown table.
+'''
+
+import json
+from time import perf_counter
+
+PHASES = ("random", "hash", "compare", "retarget", "estimators", "print", "log")
+
+COUNTERS = ("blocks", "steps", "walletChecks", "secondBiteChecks", "collisions", "scaledTargetBlocks")
+
+
+class PhaseTimers:
+    '''
+    Cumulative timers (seconds) and counters for one run. The simulator adds
+    to the seconds and counts dictionaries directly, the bound clock is kept
+    as an attribute so the hot loop does not look it up through the module.
+    '''
+
+    clock = staticmethod(perf_counter)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # called at the top of each run in the parameter loop
+
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.stepsPerBlock = {}          # steps to a solution -> number of blocks
+        self.runStart = perf_counter()
+        self.runSeconds = 0.0
+
+    def endBlock(self, steps):
+        # steps is the step count of the solution for the block just finished
+
+        self.counts["blocks"] += 1
+        self.stepsPerBlock[steps] = self.stepsPerBlock.get(steps, 0) + 1
+
+    def endRun(self):
+        self.runSeconds = perf_counter() - self.runStart
+
+    def otherSeconds(self):
+        return(max(self.runSeconds - sum(self.seconds.values()), 0.0))
+
+    def breakdownTable(self):
+        '''
+        Format the phase timers for printing on a display, for example:
+
+              phase |    seconds | percent | usec/check
+             random |      12.41 |   21.3% |      0.901
+        '''
+
+        lines = ["      phase |    seconds | percent | usec/check"]
+
+        checks = self.counts["walletChecks"]
+        runSeconds = self.runSeconds if self.runSeconds > 0.0 else 1e-9
+
+        rows = [(phase, self.seconds[phase]) for phase in PHASES]
+        rows.append(("other", self.otherSeconds()))
+
+        for phase, seconds in rows:
+            if checks > 0:
+                perCheck = "{:10.3f}".format(seconds * 1e6 / checks)
+            else:
+                perCheck = "       n/a"
+            lines.append("{:>11} | {:10.2f} | {:6.1f}% | {}".format(phase, seconds, 100.0 * seconds / runSeconds, perCheck))
+
+        lines.append("{:>11} | {:10.2f} |".format("total", self.runSeconds))
+
+        blocks = self.counts["blocks"]
+        if blocks > 0:
+            maxSteps = max(self.stepsPerBlock)
+            aveSteps = self.counts["steps"] / blocks
+        else:
+            maxSteps = 0
+            aveSteps = 0.0
+
+        lines.append("blocks {:,d} | steps {:,d} (ave {:.2f}, max {:,d}) | wallet checks {:,d} | 2nd bite checks {:,d} | collisions {:,d} | blocks at scaled target {:,d}".format(
+            blocks, self.counts["steps"], aveSteps, maxSteps, checks,
+            self.counts["secondBiteChecks"], self.counts["collisions"], self.counts["scaledTargetBlocks"]))
+
+        return("\n".join(lines))
+
+    def jsonRecord(self, **settings):
+        # settings are extra key/values to identify the run (run, paramValue, ...)
+
+        record = dict(settings)
+        record["runSeconds"] = round(self.runSeconds, 6)
+        record["phaseSeconds"] = {phase: round(seconds, 6) for phase, seconds in self.seconds.items()}
+        record["phaseSeconds"]["other"] = round(self.otherSeconds(), 6)
+        record["counts"] = dict(self.counts)
+        record["stepsPerBlock"] = {str(steps): blocks for steps, blocks in sorted(self.stepsPerBlock.items())}
+        return(record)
+
+    def writeJson(self, fileName, **settings):
+        # append one line of JSON per run, so a sweep can be read back line by line
+
+        with open(fileName, 'a') as outFile:
+            outFile.write(json.dumps(self.jsonRecord(**settings), sort_keys=True))
+            outFile.write('\n')
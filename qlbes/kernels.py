@@ -0,0 +1,283 @@
+'''
+Estimator kernels over whole series, for replays and for re-scoring saved traces.
+
+The estimators of estimators.py update once per block, through the attributes
+of an object, and score as they go. When the whole chain is known up front,
+the kernels here compute the estimates of a whole series at once, in float64,
+as tight generator loops over typed arrays:
+
+    cascadedEMA(values, alpha, depth, initial)    depth EMAs, each over the one before
+    windowSums(values, window)                    sum of values[i .. i + window - 1]
+    posIntervalEstimates(difficulties, spacings)  the 72 block estimator
+    emaEstimates(difficulties, ...)               the 4 x 121 EMA estimator
+
+cascadedEMA() does the same operations in the same order as the per-block
+update, so it matches CascadedEMAEstimator exactly. The four stages of the
+4 x 121 EMA, the scaling and the rounding run in one loop over the series, in
+local variables, about twice as fast as update() block by block.
+
+The moving sums, of the difficulties and of the spacings, subtract what they
+added window values before, like the ring buffers of PoSIntervalEstimator, but
+the rounding error of every addition and subtraction is recovered (TwoSum,
+Knuth) and summed on the side, compensated summation, so they stay within
+rounding of the exact window sums over any length of chain, where the plain
+ring buffer slowly drifts (spacings are fractions of a second with
+useNormalDistributionForOffset).
+
+    python -m qlbes.kernels 1000000         # blocks per second and the largest differences
+'''
+
+import itertools
+import math
+import operator
+import random
+import sys
+import time
+from array import array
+
+from .consensus import COIN, STAKE_TIMESTAMP_MASK, nPoSInterval
+from .estimators import STEP_THRESHOLD, TWO_TO_32, CascadedEMAEstimator, EstimatorScore, PoSIntervalEstimator
+
+NO_ESTIMATE = float("nan")      # blocks without an estimate, the None of update()
+
+
+# exponential moving averages - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def emaStage(values, alpha, initial):
+    # one EMA over values, a list, the same arithmetic as the per-block update
+
+    beta = 1.0 - alpha
+    y = initial
+    series = []
+    append = series.append
+    for x in values:
+        y = alpha * x + beta * y
+        append(y)
+    return(series)
+
+
+def emaFourStages(values, alpha, initial, scalingFactor=1.0, roundTo=0):
+    '''
+    The fourth of four cascaded EMAs, times scalingFactor and rounded down to
+    roundTo as in update(), a list. The four stages, the scaling and the
+    rounding are one loop in local variables.
+    '''
+
+    beta = 1.0 - alpha
+    y1 = y2 = y3 = y4 = initial
+    series = []
+    append = series.append
+    for x in values:
+        y1 = alpha * x + beta * y1
+        y2 = alpha * y1 + beta * y2
+        y3 = alpha * y2 + beta * y3
+        y4 = alpha * y3 + beta * y4
+        estimate = scalingFactor * y4
+        if roundTo:
+            estimate -= estimate % roundTo
+        append(estimate)
+    return(series)
+
+
+def cascadedEMA(values, alpha, depth, initial):
+    '''
+    The last of depth cascaded EMAs, every stage starting from initial as after
+    reset(). Four stages at a time go through one loop, the rest one by one.
+    '''
+
+    series = values
+    while depth >= 4:
+        series = emaFourStages(series, alpha, initial)
+        depth -= 4
+    for stage in range(depth):
+        series = emaStage(series, alpha, initial)
+    return(array('d', series))
+
+
+def emaEstimates(difficulties, alpha, depth, scalingFactor, roundTo, initial):
+    # CascadedEMAEstimator over a series of difficulties, scaled and rounded down, the last four stages in one loop
+
+    if depth >= 4:
+        series = cascadedEMA(difficulties, alpha, depth - 4, initial) if depth > 4 else difficulties
+        return(array('d', emaFourStages(series, alpha, initial, scalingFactor, roundTo)))
+
+    estimates = array('d', map(operator.mul, cascadedEMA(difficulties, alpha, depth, initial),
+                               itertools.repeat(scalingFactor)))
+    if not roundTo:
+        return(estimates)
+    return(array('d', map(operator.sub, estimates, map(operator.mod, estimates, itertools.repeat(roundTo)))))
+
+
+# moving sums - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def movingSums(values, window):
+    '''
+    Generator of the sum of the last window values, one per value, the first
+    window - 1 over fewer. Each value is added once and subtracted window
+    values later; the rounding error of every addition and subtraction is
+    recovered exactly (TwoSum, Knuth) and kept on the side, so the sums do not
+    drift, however long the series.
+    '''
+
+    s = 0.0                     # running sum
+    c = 0.0                     # sum of its rounding errors
+    for x, old in zip(values, itertools.chain(itertools.repeat(0.0, window), values)):
+        t = s + x
+        b = t - s
+        c += (s - (t - b)) + (x - b)
+        s = t
+        t = s - old
+        b = t - s
+        c += (s - (t - b)) - (old + b)
+        s = t
+        yield s + c
+
+
+def windowSums(values, window):
+    # sum of values[i .. i + window - 1] for every i, len(values) - window + 1 of them
+
+    values = array('d', values)
+    return(array('d', itertools.islice(movingSums(values, window), window - 1, None)))
+
+
+def posIntervalEstimates(difficulties, spacings, window=nPoSInterval):
+    '''
+    PoSIntervalEstimator over a series: NO_ESTIMATE for the first window
+    blocks, then difficulty x 2^32 over the spacing, summed over the last
+    window blocks, in coins. Both moving sums are compensated as in
+    movingSums(), in one loop; 2^32 is applied to the sum, exactly.
+    '''
+
+    factor = TWO_TO_32 * (STAKE_TIMESTAMP_MASK + 1) / COIN
+
+    s = c = 0.0                 # difficulty sum and its rounding errors
+    u = e = 0.0                 # spacing sum and its rounding errors
+    ratios = []
+    append = ratios.append
+    for x, old, y, oldY in zip(difficulties, itertools.chain(itertools.repeat(0.0, window), difficulties),
+                               spacings, itertools.chain(itertools.repeat(0.0, window), spacings)):
+        t = s + x
+        b = t - s
+        c += (s - (t - b)) + (x - b)
+        s = t
+        t = s - old
+        b = t - s
+        c += (s - (t - b)) - (old + b)
+        s = t
+        t = u + y
+        b = t - u
+        e += (u - (t - b)) + (y - b)
+        u = t
+        t = u - oldY
+        b = t - u
+        e += (u - (t - b)) - (oldY + b)
+        u = t
+        append((s + c) / (u + e) * factor)
+
+    estimates = array('d', itertools.repeat(NO_ESTIMATE, min(window, len(ratios))))
+    estimates.extend(itertools.islice(ratios, window, None))
+    return(estimates)
+
+
+# estimators and scoring - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def kernelEstimates(estimator, difficulties, spacings, startingDifficulty=None):
+    '''
+    The estimates of an estimator over a whole series, as array('d') with
+    NO_ESTIMATE where update() gives None. The two built in estimators use the
+    kernels, any other one is run block by block.
+    '''
+
+    if startingDifficulty is None:
+        startingDifficulty = difficulties[0] if len(difficulties) > 0 else 0.0
+
+    if type(estimator) is CascadedEMAEstimator:
+        return(emaEstimates(difficulties, estimator.alpha, estimator.depth, estimator.scalingFactor,
+                            estimator.roundTo, startingDifficulty))
+
+    if type(estimator) is PoSIntervalEstimator:
+        return(posIntervalEstimates(difficulties, spacings, estimator.window))
+
+    estimator.reset(startingDifficulty)
+    estimates = array('d')
+    for dDiff, nActualSpacing in zip(difficulties, spacings):
+        estimate = estimator.update(dDiff, nActualSpacing)
+        estimates.append(NO_ESTIMATE if estimate is None else estimate)
+    return(estimates)
+
+
+def seriesFromChain(chain):
+    # difficulties, spacings and true network weights of a chain of (dDiff, nActualSpacing, trueNetworkWeight)
+
+    difficulties = array('d')
+    spacings = array('d')
+    trueWeights = []
+    for dDiff, nActualSpacing, trueNetworkWeight in chain:
+        difficulties.append(dDiff)
+        spacings.append(nActualSpacing)
+        trueWeights.append(trueNetworkWeight)
+    return(difficulties, spacings, trueWeights)
+
+
+def evaluateSeries(difficulties, spacings, trueWeights, estimators, startingDifficulty=None, warmupBlocks=0,
+                   stepThreshold=STEP_THRESHOLD):
+    '''
+    evaluateEstimators() over series instead of a chain, the estimates from
+    the kernels. trueWeights may hold None, as for a replayed chain.
+    '''
+
+    summaries = []
+    for estimator in estimators:
+        score = EstimatorScore(estimator.name, warmupBlocks, stepThreshold)
+        estimates = kernelEstimates(estimator, difficulties, spacings, startingDifficulty)
+        for estimate, trueNetworkWeight in zip(estimates, trueWeights):
+            score.add(None if math.isnan(estimate) else estimate, trueNetworkWeight)
+        summaries.append(score.summary())
+    return(summaries)
+
+
+# benchmark - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def incrementalEstimates(estimator, difficulties, spacings, startingDifficulty):
+    estimator.reset(startingDifficulty)
+    return([estimator.update(dDiff, nActualSpacing) for dDiff, nActualSpacing in zip(difficulties, spacings)])
+
+
+def largestDifference(estimates, incremental):
+    # largest relative difference between the kernel and the per-block estimates
+
+    largest = 0.0
+    for estimate, expected in zip(estimates, incremental):
+        if expected is None:
+            if not math.isnan(estimate):
+                return(math.inf)
+        elif expected != estimate:
+            largest = max(largest, abs(estimate - expected) / max(abs(expected), 1.0))
+    return(largest)
+
+
+def main(arguments):
+
+    numBlocks = int(arguments[0]) if arguments else 1000000
+    rng = random.Random(numBlocks)
+    difficulties = array('d', (3400000.0 * (1.0 + 0.2 * math.sin(block / 5000.0)) * rng.lognormvariate(0.0, 0.3)
+                               for block in range(numBlocks)))
+    spacings = array('d', (16 * rng.randint(1, 40) + rng.random() for block in range(numBlocks)))   # offsets within the step
+
+    print("   estimator | kernel blocks/s | per block blocks/s | speedup | largest rel. difference")
+    for estimator in [CascadedEMAEstimator(121, 4, 5.59, 250, alpha=0.0164), PoSIntervalEstimator(nPoSInterval)]:
+        start = time.perf_counter()
+        estimates = kernelEstimates(estimator, difficulties, spacings, difficulties[0])
+        kernelSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        incremental = incrementalEstimates(estimator, difficulties, spacings, difficulties[0])
+        incrementalSeconds = time.perf_counter() - start
+
+        print("{:>12} | {:>15,.0f} | {:>18,.0f} | {:>6.2f}x | {:.3e}".format(
+            estimator.name, numBlocks / kernelSeconds, numBlocks / incrementalSeconds, incrementalSeconds / kernelSeconds,
+            largestDifference(estimates, incremental)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,355 @@
+'''
+Large populations, ten million wallets and more in bounded memory.
+
+A Population keeps 8 bytes of weight and 1 byte of staking flag per wallet,
+and the engines walk a list of (wallet, weight) tuples, tens of bytes more per
+wallet, every step. LargePopulation keeps
+
+    walletWeight    typed array of 4 byte unsigned coins (Qtum has ~100 million)
+    stakingMask     one bit per wallet
+    weightClasses   the wallet numbers, 4 bytes each, grouped by weight class
+
+about 8.1 bytes per wallet, under 100 MB for 10 million wallets. Arrays are
+built in chunks of CHUNK_WALLETS so nothing larger is ever held as Python ints.
+
+The "thinning" engine (engines.py) does not visit every wallet. The wallets of
+one weight class, weights between 2^(k-1) and 2^k - 1, all solve with about the
+same probability, at most pMax = scale * (2^k - 1). It jumps from candidate to
+candidate with geometric skips of probability pMax, and accepts a candidate
+with probability p / pMax, which gives every wallet exactly its own chance of
+a solution. A step costs one skip per weight class plus about two per solver,
+so the time per step hardly depends on the number of wallets.
+
+Benchmark of per-step time and resident memory versus population size, each
+size in a fresh process:
+
+    python -m qlbes.large 10000 100000 1000000 10000000
+'''
+
+import math
+import os
+import random
+import sys
+import time
+from array import array
+
+CHUNK_WALLETS = 65536           # 256 KB of weights, builds go a chunk at a time
+MAX_LIVE_FRACTION = 64          # rebuild the weight classes when numWallets / 64 moved wallets can solve
+MIN_LIVE_REBUILD = 4096
+
+
+class WeightClasses:
+    '''
+    Wallet numbers by weight class, k = weight.bit_length(), in wallet order.
+    A wallet whose weight changes class goes to the moved set, skipped in the
+    classes until the next rebuild, and to the live set, checked on its own,
+    unless its weight is now 0. Wallets of weight 0 cannot solve and are left
+    out.
+    '''
+
+    def __init__(self, weights):
+        self.build(weights)
+
+    @classmethod
+    def fromClasses(cls, classes):
+        # weight classes from a dict of k: wallet numbers, shared as they are, not copied
+
+        weightClasses = cls.__new__(cls)
+        weightClasses.classes = classes
+        weightClasses.moved = set()
+        weightClasses.live = set()
+        return(weightClasses)
+
+    def build(self, weights):
+
+        self.classes = {}
+        for wallet, weight in enumerate(weights):
+            if weight > 0:
+                k = weight.bit_length()
+                wallets = self.classes.get(k)
+                if wallets is None:
+                    wallets = self.classes[k] = array('I')
+                wallets.append(wallet)
+        self.moved = set()
+        self.live = set()
+
+    def add(self, wallet, weight):
+        # a new wallet, numbered after all the others so wallet order is kept
+
+        if weight > 0:
+            k = weight.bit_length()
+            if k not in self.classes:
+                self.classes[k] = array('I')
+            self.classes[k].append(wallet)
+
+    def change(self, wallet, oldWeight, newWeight):
+        if oldWeight.bit_length() != newWeight.bit_length():
+            self.moved.add(wallet)
+            if newWeight > 0:
+                self.live.add(wallet)
+            else:
+                self.live.discard(wallet)
+
+    def solvers(self, scale, rand, weightOf, isStaking, moved=None, check=None):
+        '''
+        Wallets that solve with probability min(1, scale * weight), in wallet order.
+        rand is a random() function, weightOf and isStaking come from the population.
+        A view that changed some of the wallets passes them as moved, skipped in
+        the classes, and the ones that can still solve as check.
+        '''
+
+        if moved is None:
+            moved = self.moved
+            check = self.live
+        log = math.log
+        solvers = []
+
+        for k, wallets in self.classes.items():
+
+            numInClass = len(wallets)
+            pMax = scale * ((1 << k) - 1)
+
+            if pMax >= 1.0:                                  # every wallet is a candidate, no thinning
+                for wallet in wallets:
+                    if wallet not in moved and isStaking(wallet) and rand() < scale * weightOf(wallet):
+                        solvers.append(wallet)
+                continue
+
+            logMiss = math.log1p(-pMax)
+            if logMiss == 0.0:                               # pMax below double precision, no candidates
+                continue
+
+            j = -1
+            while True:
+                j += 1 + int(log(1.0 - rand()) / logMiss)   # misses before the next candidate
+                if j >= numInClass:
+                    break
+                wallet = wallets[j]
+                if wallet not in moved and isStaking(wallet) and rand() * pMax < scale * weightOf(wallet):
+                    solvers.append(wallet)
+
+        for wallet in check:
+            if isStaking(wallet) and rand() < scale * weightOf(wallet):
+                solvers.append(wallet)
+
+        solvers.sort()
+        return(solvers)
+
+
+class OverlayWeightClasses:
+    '''
+    Weight classes of a PopulationView: the shared classes of its snapshot,
+    with the wallets the view changed checked on their own, and the wallets
+    it added in classes of their own. Nothing of the snapshot is copied.
+    '''
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.changed = set()          # snapshot wallets the view changed
+        self.live = set()             # the changed ones with weight that are staking, the rest cannot solve
+        self.added = WeightClasses(())
+
+    def change(self, wallet, canSolve):
+        self.changed.add(wallet)
+        if canSolve == True:
+            self.live.add(wallet)
+        else:
+            self.live.discard(wallet)
+
+    def solvers(self, scale, rand, weightOf, isStaking):
+
+        solvers = self.snapshot.classes().solvers(scale, rand, weightOf, isStaking, self.changed, self.live)
+        if self.added.classes or self.added.live:
+            solvers.extend(self.added.solvers(scale, rand, weightOf, isStaking))   # numbered after the snapshot
+        return(solvers)
+
+
+class LargePopulation:
+    '''
+    Population for millions of wallets, the same methods as Population but
+    without stakingWallets(), use it with the "thinning" engine. Weights are
+    whole coins below 2^32.
+    '''
+
+    def __init__(self, weights=()):
+
+        self.walletWeight = array('I')
+        for chunk in chunked(weights):
+            self.walletWeight.extend(chunk)
+
+        numWallets = len(self.walletWeight)
+        self.stakingMask = bytearray(b'\xff') * ((numWallets + 7) // 8)   # all wallets staking
+        self.trueNetworkWeight = sum(self.walletWeight)
+        self.stakingWeight = self.trueNetworkWeight
+        self.weightClasses = WeightClasses(self.walletWeight)
+        self.weightIndex = None
+        self.version = 0
+
+    @property
+    def numWallets(self):
+        return(len(self.walletWeight))
+
+    def weightOf(self, wallet):
+        return(self.walletWeight[wallet])
+
+    def isStaking(self, wallet):
+        return(self.stakingMask[wallet >> 3] >> (wallet & 7) & 1 == 1)
+
+    def addWeight(self, wallet, delta):
+
+        oldWeight = self.walletWeight[wallet]
+        self.walletWeight[wallet] = oldWeight + delta
+        self.trueNetworkWeight += delta
+        if self.isStaking(wallet):
+            self.stakingWeight += delta
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, delta)
+        self.weightClasses.change(wallet, oldWeight, oldWeight + delta)
+        self.version += 1
+
+        classes = self.weightClasses
+        if (len(classes.live) > max(MIN_LIVE_REBUILD, self.numWallets // MAX_LIVE_FRACTION) or
+                len(classes.moved) > self.numWallets // 4):
+            classes.build(self.walletWeight)
+
+    def setWeight(self, wallet, weight):
+        self.addWeight(wallet, weight - self.walletWeight[wallet])
+
+    def setStaking(self, wallet, staking):
+
+        if self.isStaking(wallet) != bool(staking):
+            weight = self.walletWeight[wallet]
+            self.stakingWeight += weight if staking else -weight
+            self.stakingMask[wallet >> 3] ^= 1 << (wallet & 7)
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, weight if staking else -weight)
+        self.version += 1
+
+    def addWallets(self, count, weight):
+
+        first = self.numWallets
+        for chunk in chunked(weight for i in range(count)):
+            self.walletWeight.extend(chunk)
+
+        # new bits past the old end are set, the bytes added after it are all ones
+        for wallet in range(first, min(self.numWallets, (first + 7) // 8 * 8)):
+            self.stakingMask[wallet >> 3] |= 1 << (wallet & 7)
+        self.stakingMask.extend(b'\xff' * ((self.numWallets + 7) // 8 - len(self.stakingMask)))
+
+        for wallet in range(first, self.numWallets):
+            self.weightClasses.add(wallet, weight)
+            if self.weightIndex is not None:
+                self.weightIndex.append(weight)
+
+        self.trueNetworkWeight += count * weight
+        self.stakingWeight += count * weight
+        self.version += 1
+        return(first)
+
+    def copy(self):
+        population = LargePopulation(self.walletWeight)
+        population.stakingMask[:] = self.stakingMask
+        population.stakingWeight = self.stakingWeight
+        return(population)
+
+
+def chunked(values, size=CHUNK_WALLETS):
+    # lists of at most size values, to fill typed arrays without one big list
+
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def loadLargeRandomWallets(numWallets, rng, low=100, high=33535):
+    # random weights between low and high like the "Random" distribution, built a chunk at a time
+
+    rand = rng.random
+    span = high - low + 1
+    return(LargePopulation(low + int(span * rand()) for i in range(numWallets)))
+
+
+# benchmark - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def residentMegabytes():
+    # resident set size of this process, from /proc where there is one
+
+    try:
+        with open("/proc/self/statm", 'r') as inFile:
+            return(int(inFile.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return(maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 2 ** 10)
+
+
+def benchmarkSize(numWallets, steps=2000, scanSteps=20):
+    '''
+    Build a population of numWallets random wallets and time steps at the
+    retarget equilibrium, about 1 in 8 steps with a solution, for the
+    thinning engine and (up to a million wallets) a full Bernoulli scan.
+    '''
+
+    from .consensus import COIN
+    from .engines import HASH_SPACE
+
+    rng = random.Random(numWallets)
+    startMegabytes = residentMegabytes()
+
+    start = time.perf_counter()
+    population = loadLargeRandomWallets(numWallets, rng)
+    buildSeconds = time.perf_counter() - start
+    megabytes = residentMegabytes() - startMegabytes
+
+    stepTarget = HASH_SPACE / COIN / population.stakingWeight / 8    # one solution per 8 steps
+    scale = stepTarget * COIN / HASH_SPACE
+    rand = rng.random
+    classes = population.weightClasses
+
+    start = time.perf_counter()
+    solutions = 0
+    for step in range(steps):
+        solutions += len(classes.solvers(scale, rand, population.weightOf, population.isStaking))
+    thinningMicroseconds = (time.perf_counter() - start) / steps * 1e6
+
+    scanMicroseconds = None
+    if numWallets <= 1000000:
+        weights = population.walletWeight
+        start = time.perf_counter()
+        for step in range(scanSteps):
+            [wallet for wallet, weight in enumerate(weights) if rand() < scale * weight]
+        scanMicroseconds = (time.perf_counter() - start) / scanSteps * 1e6
+
+    return({"numWallets": numWallets, "buildSeconds": buildSeconds, "megabytes": megabytes,
+            "bytesPerWallet": megabytes * 2 ** 20 / numWallets, "thinningMicroseconds": thinningMicroseconds,
+            "solutionsPerStep": solutions / steps, "scanMicroseconds": scanMicroseconds})
+
+
+def main(arguments):
+    import json
+    import subprocess
+
+    if arguments[:1] == ["--one"]:
+        print(json.dumps(benchmarkSize(int(arguments[1]))))
+        return
+
+    sizes = [int(argument) for argument in arguments] or [10000, 100000, 1000000, 10000000]
+
+    print("    wallets |  build s | +RSS MB | bytes/wallet | thinning us/step | scan us/step | solutions/step")
+    for numWallets in sizes:
+        output = subprocess.run([sys.executable, "-m", "qlbes.large", "--one", str(numWallets)],
+                                stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        result = json.loads(output)
+        scan = "-" if result["scanMicroseconds"] is None else "{:,.0f}".format(result["scanMicroseconds"])
+        print("{:>11,d} | {:>8.2f} | {:>7.1f} | {:>12.1f} | {:>16.1f} | {:>12} | {:>14.3f}".format(
+            numWallets, result["buildSeconds"], result["megabytes"], result["bytesPerWallet"],
+            result["thinningMicroseconds"], scan, result["solutionsPerStep"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+'''
+A library of generated wallet populations, cached on disk and memory-mapped.
+
+The loaders of population.py each build one fixed shape of population. The
+library has named generators instead, any of them at any number of wallets
+and any total weight:
+
+    uniform       all wallets the same
+    random        randint(100, 33535) as the "Random" distribution, scaled
+    pareto        Pareto weights, alpha = 1.16 (80 / 20)
+    lognormal     log-normal weights, sigma = 2.0
+    exchange      a few exchange wallets (exchanges = 10) holding
+                  exchangeShare = 0.4 of the weight, first, then log-normal
+                  retail wallets, sigma = 1.5
+    testnet       like the testnet wallets of 12/02/2017: weights within 4x
+                  of each other, dustFraction = 0.03 of them dust
+
+A generator draws raw weights from its own random stream, seeded from the
+seed, and they are scaled to whole coins, at least 1 each, adding up to
+exactly totalWeight. The result is written once to the cache directory as a
+population table (the format of shared.py, with the weight classes of the
+"thinning" engine), keyed by the generator, its parameters, the size, the total
+weight and the seed; later loads map the table read-only and return a
+PopulationSnapshot over it, nothing parsed and nothing copied, the same
+wallets on every machine. New generators register with @registerGenerator.
+
+In a config, walletWeightDistribution = "Library" with:
+
+    libraryGenerator = "pareto"
+    libraryWallets = 1500
+    libraryWeight = 25000000
+    libraryParameters = None        a dict of generator parameters, e.g. {"alpha": 1.5}
+
+    python -m qlbes.library pareto 1000000 alpha=1.3
+'''
+
+import hashlib
+import heapq
+import json
+import math
+import random
+import struct
+import sys
+import time
+from array import array
+
+from .cache import cachePath, writeFileAtomic
+from .population import Population
+from .shared import attachPopulation, tableBytes
+
+LIBRARY_VERSION = 1             # part of the cache key, bump when a generator changes
+
+GENERATORS = {}                 # name: (function, default parameters)
+
+
+def registerGenerator(name, **defaults):
+    '''
+    Decorator for a generator function(rng, numWallets, **parameters) that
+    returns numWallets raw weights, any positive numbers, to be scaled.
+    '''
+
+    def register(function):
+        GENERATORS[name] = (function, defaults)
+        return(function)
+    return(register)
+
+
+# the generators - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+@registerGenerator("uniform")
+def uniformWeights(rng, numWallets):
+    return(array('d', [1.0]) * numWallets)
+
+
+@registerGenerator("random")
+def randomWeights(rng, numWallets):
+    return(array('d', (rng.randint(100, 33535) for i in range(numWallets))))
+
+
+@registerGenerator("pareto", alpha=1.16)
+def paretoWeights(rng, numWallets, alpha):
+    return(array('d', (rng.paretovariate(alpha) for i in range(numWallets))))
+
+
+@registerGenerator("lognormal", sigma=2.0)
+def lognormalWeights(rng, numWallets, sigma):
+    return(array('d', (rng.lognormvariate(0.0, sigma) for i in range(numWallets))))
+
+
+@registerGenerator("exchange", exchanges=10, exchangeShare=0.4, sigma=1.5)
+def exchangeWeights(rng, numWallets, exchanges, exchangeShare, sigma):
+    # the exchange wallets first, then the retail wallets
+
+    exchanges = min(exchanges, numWallets)
+    retail = array('d', (rng.lognormvariate(0.0, sigma) for i in range(numWallets - exchanges)))
+    splits = [rng.uniform(0.5, 1.5) for i in range(exchanges)]
+
+    retailWeight = math.fsum(retail) if len(retail) > 0 else 1.0
+    exchangeWeight = retailWeight * exchangeShare / (1.0 - exchangeShare) if exchangeShare < 1.0 else 1.0
+    weights = array('d', (exchangeWeight * split / math.fsum(splits) for split in splits))
+    weights.extend(retail)
+    return(weights)
+
+
+@registerGenerator("testnet", dustFraction=0.03)
+def testnetWeights(rng, numWallets, dustFraction):
+    return(array('d', (rng.uniform(0.0005, 0.005) if rng.random() < dustFraction else rng.uniform(0.25, 1.0)
+                       for i in range(numWallets))))
+
+
+# scaling, caching and loading - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def scaleWeights(raw, totalWeight):
+    '''
+    Whole coin weights in proportion to raw, at least 1 each, adding up to
+    exactly totalWeight: each wallet gets 1 plus the whole part of its share
+    of the rest, and the coins left over go to the largest fractions.
+    '''
+
+    numWallets = len(raw)
+    spare = totalWeight - numWallets
+    scale = spare / math.fsum(raw)
+
+    shares = array('d', (weight * scale for weight in raw))
+    weights = array('q', (1 + int(share) for share in shares))
+    leftOver = totalWeight - sum(weights)
+    while leftOver < 0:                       # rounding of the shares, never more than a coin or two
+        weights[weights.index(max(weights))] -= 1
+        leftOver += 1
+    for wallet in heapq.nlargest(leftOver, range(numWallets), key=lambda wallet: shares[wallet] - int(shares[wallet])):
+        weights[wallet] += 1
+    return(weights)
+
+
+def generatorParameters(name, parameters=None):
+    # the parameters of a generator, the defaults with any given ones
+
+    if name not in GENERATORS:
+        raise ValueError("library generator must be one of " + ", ".join(sorted(GENERATORS)) + ", not " + repr(name))
+    function, defaults = GENERATORS[name]
+    parameters = dict(parameters or {})
+    unknown = sorted(set(parameters) - set(defaults))
+    if unknown:
+        raise ValueError("unknown parameter(s) for the " + name + " generator: " + ", ".join(unknown))
+    return(dict(defaults, **parameters))
+
+
+def generateWeights(name, numWallets, totalWeight, seed, parameters=None):
+    # the weights of a library population, without the cache
+
+    if numWallets < 1 or totalWeight < numWallets:
+        raise ValueError("a library population needs 1 or more wallets and at least 1 coin per wallet")
+    parameters = generatorParameters(name, parameters)
+    rng = random.Random(str(seed) + " library " + name)
+    return(scaleWeights(GENERATORS[name][0](rng, numWallets, **parameters), totalWeight))
+
+
+def libraryCacheName(name, numWallets, totalWeight, seed, parameters=None):
+    # cache file name for a library population, keyed by everything that makes its weights
+
+    key = json.dumps([LIBRARY_VERSION, name, numWallets, totalWeight, str(seed),
+                      generatorParameters(name, parameters)], sort_keys=True)
+    return("library-" + name + "-" + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16] + ".tbl")
+
+
+def libraryPopulation(name, numWallets, totalWeight=25000000, seed=0, parameters=None, useCache=True):
+    '''
+    PopulationSnapshot of a library population, mapped from the cache when it
+    was generated before, else generated, written to the cache and mapped.
+    Without the cache, a snapshot of a plain Population.
+    '''
+
+    if useCache == False:
+        return(Population(generateWeights(name, numWallets, totalWeight, seed, parameters)).snapshot())
+
+    path = cachePath(libraryCacheName(name, numWallets, totalWeight, seed, parameters))
+    try:
+        return(attachPopulation(path))
+    except (OSError, ValueError, struct.error):
+        pass
+
+    population = Population(generateWeights(name, numWallets, totalWeight, seed, parameters))
+    writeFileAtomic(path, tableBytes(population))
+    return(attachPopulation(path))
+
+
+def loadLibraryWallets(config):
+    # the library population of config, for loadWallets()
+
+    return(libraryPopulation(config.libraryGenerator, config.libraryWallets, config.libraryWeight, config.seed,
+                             config.libraryParameters))
+
+
+def main(arguments):
+    from .config import parseSettings
+
+    if len(arguments) < 2:
+        print("usage: python -m qlbes.library generator numWallets [totalWeight=25000000] [seed=0] [parameter=value ...]")
+        print("generators: " + ", ".join("{} {}".format(name, defaults) for name, (function, defaults) in sorted(GENERATORS.items())))
+        return(2)
+
+    parameters = parseSettings(arguments[2:])
+    totalWeight = parameters.pop("totalWeight", 25000000)
+    seed = parameters.pop("seed", 0)
+
+    for attempt in ("first load", "second load"):
+        start = time.perf_counter()
+        snapshot = libraryPopulation(arguments[0], int(arguments[1]), totalWeight, seed, parameters)
+        seconds = time.perf_counter() - start
+        weights = sorted(snapshot.walletWeight, reverse=True)
+        top = sum(weights[:max(1, len(weights) // 100)])
+        print("{} {:.3f} s | wallets {:,d} | weight {:,d} | largest {:,d} | smallest {:,d} | top 1% {:.1%}".format(
+            attempt, seconds, snapshot.numWallets, snapshot.trueNetworkWeight, weights[0], weights[-1],
+            top / snapshot.trueNetworkWeight))
+    return(0)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
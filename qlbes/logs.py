@@ -0,0 +1,371 @@
+'''
+Aggregator for the QLBES_Log_*.csv files the simulator script writes.
+
+A log file holds one or more sessions, the script appends to the file of the
+day. Each session is:
+
+    header      QLBES version, the GMT start, wallets / blocks / targetMultiplier,
+                one line per complexity switch, trueNetworkWeight
+    blocks      with logBlockByBlock, "block,wallet,wallet weight,..." and one row per block
+    summary     "Run,paramLabel,ave secs,'>=640 blks,max secs,collisions" and one row
+                per run, with enableRunStatistics a "run statistics" row after each
+
+parseLog() reads a file as a stream, one line at a time, and splits it into
+sessions: the header as raw lines and as settings, the runs from the summary
+rows, and for each run the block rows folded into a few numbers (blocks,
+spacing, the >=640 second blocks) instead of kept. Spreadsheet edits such as
+trailing commas are ignored.
+
+loadLogs() parses many files in worker processes and keeps each parsed file
+in the cache directory, keyed by the file's name, size and time, so asking
+again is a cache read. The runs of all files go into a SummaryTable, one row
+per run, with an index on any column for selecting rows:
+
+    python -m qlbes.logs QLBES_Log_*.csv
+    python -m qlbes.logs *.csv --where=distribution=Mainnet --sort=aveSeconds
+    python -m qlbes.logs *.csv --csv > summary.csv
+'''
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+
+from .cache import readJsonCache, writeJsonCache
+from .consensus import MAX_ACTUAL_SPACING
+
+LOG_CACHE_VERSION = 1
+
+BLOCK_COLUMNS = "block,wallet,wallet weight,true network weight,new network weight,network weight,target,difficulty,spacing"
+SUMMARY_COLUMNS = "Run,paramLabel,ave secs,'>=640 blks,max secs,collisions"
+
+FIVE_X_SECONDS = 640
+
+# the columns of the summary table, the header settings then the run
+
+SUMMARY_TABLE_COLUMNS = ("file", "session", "version", "started", "wallets", "blocks", "targetMultiplier",
+                         "randomNumbers", "distribution", "retarget", "targetScaling", "secondSHA256",
+                         "dynamicWeights", "walletGrowth", "replayFile", "trueNetworkWeight",
+                         "run", "paramLabel", "aveSeconds", "fiveXSpacingBlocks", "maxSeconds", "collisions",
+                         "blockRows", "blockSpacingMean")
+
+
+def fields(line):
+    # the comma separated fields of a line, without the empty ones a spreadsheet adds at the end
+
+    parts = [part.strip() for part in line.rstrip("\r\n").split(",")]
+    while parts and parts[-1] == "":
+        parts.pop()
+    return(parts)
+
+
+def number(text):
+    # int or float from the text, the text itself if it is neither
+
+    try:
+        return(int(text))
+    except ValueError:
+        try:
+            return(float(text))
+        except ValueError:
+            return(text)
+
+
+def headerSetting(line, parts, settings):
+    # the settings one header line gives, from the exact wording of the script
+
+    if line.startswith("QLBES version"):
+        settings["version"] = line[len("QLBES version"):].strip(" ,")
+    elif line.startswith("Starting_"):
+        settings["started"] = parts[0][len("Starting_"):] + " GMT " + (parts[3] if len(parts) > 3 else "")
+    elif parts[0] == "wallets":
+        for name, value in zip(parts[0::2], parts[1::2]):
+            settings[name] = number(value)
+    elif line.startswith("Using Python secrets"):
+        settings["randomNumbers"] = "secrets"
+    elif line.startswith("Using Python random module with fixed seed"):
+        settings["randomNumbers"] = "fixed seed"
+    elif line.startswith("Using Python random module"):
+        settings["randomNumbers"] = "random seed"
+    elif line.startswith("useRetarget"):
+        settings["retarget"] = "= True" in line
+    elif line.startswith("Using target scaling"):
+        settings["targetScaling"] = "{} from step {}".format(parts[2] if len(parts) > 2 else "?", parts[4] if len(parts) > 4 else "?")
+    elif line.startswith("useSpacingDifficultyFile"):
+        settings["replayFile"] = parts[-1]
+    elif line.startswith("Loading wallets"):
+        for distribution in ("uniform", "random", "Mainnet", "Testnet", "snapshot"):
+            if distribution in line:
+                settings["distribution"] = distribution[0].upper() + distribution[1:]
+                break
+    elif line.startswith("secondSHA256"):
+        settings["secondSHA256"] = "= True" in line
+    elif line.startswith("useDynamicWeights"):
+        settings["dynamicWeights"] = line.partition("=")[2].replace(",", " ").split()[0]
+    elif line.startswith("useWalletGrowth"):
+        settings["walletGrowth"] = "= True" in line
+    elif parts[0] == "trueNetworkWeight" and len(parts) > 1:
+        settings["trueNetworkWeight"] = number(parts[1])
+    else:
+        return(False)
+    return(True)
+
+
+class BlockSection:
+    # the block rows of one run, folded as they stream past
+
+    def __init__(self):
+        self.rows = 0
+        self.firstBlock = None
+        self.lastBlock = None
+        self.spacingTotal = 0.0
+        self.fiveXSpacingBlocks = 0
+        self.maxSpacing = 0.0
+
+    def add(self, parts):
+        block = int(parts[0])
+        spacing = float(parts[8])
+        if self.firstBlock is None:
+            self.firstBlock = block
+        self.lastBlock = block
+        self.rows += 1
+        self.spacingTotal += spacing
+        if spacing >= FIVE_X_SECONDS:
+            self.fiveXSpacingBlocks += 1
+        self.maxSpacing = max(self.maxSpacing, min(spacing, MAX_ACTUAL_SPACING))
+
+    def summary(self):
+        if self.rows == 0:
+            return(None)
+        return({"rows": self.rows, "firstBlock": self.firstBlock, "lastBlock": self.lastBlock,
+                "spacingMean": self.spacingTotal / self.rows, "fiveXSpacingBlocks": self.fiveXSpacingBlocks,
+                "maxSpacing": self.maxSpacing})
+
+
+def parseLog(path):
+    '''
+    The sessions of one log file, each a dict: header (raw lines), settings
+    (from the header), runs (one dict per summary row, with the folded block
+    rows of the run and any run statistics), and notes, lines that fit nowhere.
+    '''
+
+    sessions = []
+    session = None
+    blocks = BlockSection()
+    section = "header"
+
+    def newSession():
+        return({"header": [], "settings": {}, "runs": [], "notes": []})
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as inFile:
+
+        for lineNumber, line in enumerate(inFile, 1):
+
+            parts = fields(line)
+            if not parts:
+                continue
+            text = ",".join(parts)
+
+            if text.startswith("QLBES version") or session is None:
+                if session is not None and blocks.rows > 0:
+                    session["notes"].append("{} block rows without a run summary".format(blocks.rows))
+                session = newSession()
+                sessions.append(session)
+                blocks = BlockSection()
+                section = "header"
+
+            if text == BLOCK_COLUMNS:
+                section = "blocks"
+                continue
+            if text == SUMMARY_COLUMNS:
+                section = "summary"
+                continue
+
+            first = parts[0]
+
+            if first.isdigit() and len(parts) == 9:             # a block row
+                try:
+                    blocks.add(parts)
+                    section = "blocks"
+                    continue
+                except ValueError:
+                    pass
+
+            if first.isdigit() and len(parts) == 6 and section in ("summary", "blocks"):     # a run summary row
+                run = dict(zip(("run", "paramLabel", "aveSeconds", "fiveXSpacingBlocks", "maxSeconds", "collisions"),
+                               [number(part) for part in parts]))
+                run["blockSection"] = blocks.summary()
+                session["runs"].append(run)
+                blocks = BlockSection()
+                section = "summary"
+                continue
+
+            if first == "run statistics" and session["runs"]:
+                session["runs"][-1]["statistics"] = {name: number(value) for name, value in zip(parts[2::2], parts[3::2])}
+                continue
+
+            if section == "header":
+                session["header"].append(text)
+                headerSetting(text, parts, session["settings"])
+            else:
+                session["notes"].append("line {}: {}".format(lineNumber, text))
+
+    if session is not None and blocks.rows > 0:
+        session["notes"].append("{} block rows without a run summary".format(blocks.rows))
+
+    return(sessions)
+
+
+# many files, cached - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def logCacheName(path):
+    # cache file for one log, changes when the log does
+
+    status = os.stat(path)
+    key = json.dumps([LOG_CACHE_VERSION, os.path.abspath(path), status.st_size, status.st_mtime_ns])
+    return("log-" + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16] + ".json")
+
+
+def parseAndCache(path):
+    sessions = parseLog(path)
+    writeJsonCache(logCacheName(path), {"path": path, "sessions": sessions})
+    return(sessions)
+
+
+def loadLogs(paths, processes=None, useCache=True):
+    '''
+    {path: sessions} for every log file, read from the cache where the file
+    has not changed, the others parsed in worker processes and cached.
+    '''
+
+    parsed = {}
+    missing = []
+    for path in paths:
+        cached = readJsonCache(logCacheName(path)) if useCache == True else {}
+        if "sessions" in cached:
+            parsed[path] = cached["sessions"]
+        else:
+            missing.append(path)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(missing)))
+
+    work = parseAndCache if useCache == True else parseLog
+    if processes == 1:
+        results = [work(path) for path in missing]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(work, missing, chunksize=1)
+
+    parsed.update(zip(missing, results))
+    return({path: parsed[path] for path in paths})
+
+
+class SummaryTable:
+    '''
+    One row per run of every session of every log, SUMMARY_TABLE_COLUMNS,
+    with an index on a column built the first time it is selected on.
+    '''
+
+    def __init__(self, logs):
+        self.rows = []
+        self.indexes = {}
+
+        for path, sessions in logs.items():
+            for sessionNumber, session in enumerate(sessions):
+                settings = session["settings"]
+                for run in session["runs"]:
+                    row = dict.fromkeys(SUMMARY_TABLE_COLUMNS)
+                    row.update({name: value for name, value in settings.items() if name in row})
+                    row.update({name: value for name, value in run.items() if name in row})
+                    row["file"] = os.path.basename(path)
+                    row["session"] = sessionNumber
+                    if run.get("blockSection") is not None:
+                        row["blockRows"] = run["blockSection"]["rows"]
+                        row["blockSpacingMean"] = run["blockSection"]["spacingMean"]
+                    self.rows.append(row)
+
+    def index(self, column):
+        if column not in self.indexes:
+            index = {}
+            for rowNumber, row in enumerate(self.rows):
+                index.setdefault(str(row[column]), []).append(rowNumber)
+            self.indexes[column] = index
+        return(self.indexes[column])
+
+    def select(self, **criteria):
+        # the rows with column == value for every criterion, values compared as text
+
+        rowNumbers = None
+        for column, value in criteria.items():
+            if column not in SUMMARY_TABLE_COLUMNS:
+                raise ValueError("no column " + repr(column) + ", the columns are " + ", ".join(SUMMARY_TABLE_COLUMNS))
+            matches = set(self.index(column).get(str(value), ()))
+            rowNumbers = matches if rowNumbers is None else rowNumbers & matches
+        if rowNumbers is None:
+            return(list(self.rows))
+        return([self.rows[rowNumber] for rowNumber in sorted(rowNumbers)])
+
+
+def formatTable(rows):
+    # the settings that matter most against the run results, for the display
+
+    lines = ["{:>40} | {:>2} | {:>8} | {:>6} | {:>6} | {:>8} | {:>10} | {:>8} | {:>8} | {:>10} | {:>8} | {:>8}".format(
+        "file", "s", "distrib", "wallet", "blocks", "tMult", "param", "ave secs", ">=640", "max secs", "collisns", "dynamic")]
+    for row in rows:
+        def text(value):
+            return("" if value is None else str(value))
+        lines.append("{:>40} | {:>2} | {:>8} | {:>6} | {:>6} | {:>8} | {:>10} | {:>8} | {:>8} | {:>10} | {:>8} | {:>8}".format(
+            text(row["file"])[-40:], text(row["session"]), text(row["distribution"])[:8], text(row["wallets"]),
+            text(row["blocks"]), text(row["targetMultiplier"]), text(row["paramLabel"]), text(row["aveSeconds"]),
+            text(row["fiveXSpacingBlocks"]), text(row["maxSeconds"]), text(row["collisions"]), text(row["dynamicWeights"])[:8]))
+    return("\n".join(lines))
+
+
+def main(arguments):
+
+    options = {}
+    patterns = []
+    for argument in arguments:
+        if argument.startswith("--"):
+            name, _, value = argument.partition("=")
+            options.setdefault(name, []).append(value)
+        else:
+            patterns.append(argument)
+
+    paths = []
+    for pattern in patterns or ["QLBES_Log_*.csv", "*QLBES_Log_*.csv"]:
+        for path in sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else []):
+            if path not in paths:
+                paths.append(path)
+    if not paths:
+        print("usage: python -m qlbes.logs [log files or patterns] [--where=column=value] [--sort=column] [--csv | --json] [--no-cache]")
+        return(2)
+
+    logs = loadLogs(paths, int(options["--processes"][0]) if "--processes" in options else None,
+                    "--no-cache" not in options)
+    table = SummaryTable(logs)
+
+    criteria = dict(where.partition("=")[0::2] for where in options.get("--where", []))
+    rows = table.select(**criteria)
+    for column in options.get("--sort", []):
+        rows.sort(key=lambda row: (row[column] is None, row[column] if isinstance(row[column], (int, float)) else str(row[column])))
+
+    if "--json" in options:
+        print(json.dumps(rows, indent=1))
+    elif "--csv" in options:
+        print(",".join(SUMMARY_TABLE_COLUMNS))
+        for row in rows:
+            print(",".join("" if row[column] is None else str(row[column]).replace(",", ";") for column in SUMMARY_TABLE_COLUMNS))
+    else:
+        print(formatTable(rows))
+        print("{:,d} runs in {:,d} sessions of {:,d} files".format(
+            len(rows), sum(len(sessions) for sessions in logs.values()), len(logs)))
+    return(0)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+'''
+Orphans among the solvers of a step, from timestamp offsets and propagation delays.
+
+collisionCount counts every extra solver in the winning step, but two solvers
+of the same step only orphan one another if neither block reaches the other
+staker before it signs its own. With useOrphanModel = True each solver of a
+winning step with two or more solvers gets an offset within the step, drawn
+as for useNormalDistributionForOffset (selection.solverOffsets), and each
+block a log-normal propagation delay to each later solver:
+
+    useOrphanModel = False
+    propagationDelayMedian = 1.0    seconds
+    propagationDelaySigma = 0.8     log-normal shape, 0 for a fixed delay
+
+Going through the solvers in offset order, a solver publishes its block unless
+a block published before has reached it (offset + delay <= its offset); every
+published block but one is an orphan. The run summary then has orphanCount
+and orphanRate, orphans per block, next to collisionCount.
+
+The model runs on the records after the step engine, with a random stream of
+its own, so the chain is the same with it on or off. Steps with one solver,
+nearly all of them, cost one comparison. Delays longer than the 16 second step
+are not carried over into the next step.
+
+    python -m qlbes.orphans engine=index numBlocks=20000 propagationDelayMedian=0.5,1,2,4
+'''
+
+import math
+import random
+import sys
+
+from .selection import solverOffsets
+
+
+class OrphanModel:
+
+    def __init__(self, config, rng):
+        self.config = config
+        self.rng = rng
+        self.mu = math.log(config.propagationDelayMedian)
+        self.sigma = config.propagationDelaySigma
+
+    def orphans(self, numSolvers):
+        # orphaned blocks among numSolvers solvers of one step
+
+        if numSolvers < 2:
+            return(0)
+
+        delay = self.rng.lognormvariate
+        mu = self.mu
+        sigma = self.sigma
+        published = []
+        for offset in sorted(solverOffsets(numSolvers, self.rng, self.config)):
+            if all(offset < earlier + delay(mu, sigma) for earlier in published):    # no block has reached it yet
+                published.append(offset)
+        return(len(published) - 1)
+
+    def orphanCounts(self, solverCounts):
+        # orphans of a batch of steps, given their numbers of solvers
+
+        orphans = self.orphans
+        return([orphans(numSolvers) if numSolvers >= 2 else 0 for numSolvers in solverCounts])
+
+
+def orphanModel(config, run=0):
+    # the OrphanModel of one run of config, None with useOrphanModel off
+
+    if config.useOrphanModel == False:
+        return(None)
+    if config.useFixedSeed == True:
+        return(OrphanModel(config, random.Random(str(config.seed) + " orphans " + str(run))))
+    return(OrphanModel(config, random.Random()))
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+    from .simulator import makeRng, simulateBlocks
+
+    settings = {"engine": "index", "numBlocks": 20000}
+    settings.update(parseSettings(arguments))
+    medians = settings.pop("propagationDelayMedian", 1.0)
+    medians = list(medians) if isinstance(medians, tuple) else [medians]
+    config = SimulationConfig(useOrphanModel=True, **settings)
+
+    solverCounts = [len(record.solvers) for record in simulateBlocks(config, rng=makeRng(config))]
+
+    print("{:,d} blocks, {:,d} collisions".format(len(solverCounts), sum(count - 1 for count in solverCounts)))
+    print(" delay median | orphans | orphan rate")
+    for median in medians:
+        model = orphanModel(config.replace(propagationDelayMedian=median))
+        orphans = sum(model.orphanCounts(solverCounts))
+        print("{:>11g} s | {:>7,d} | {:>11.4%}".format(median, orphans, orphans / len(solverCounts)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,309 @@
+'''
+Sharded wallet scanning, one run spread over several cores.
+
+The "sha256" and "bernoulli" engines check every staking wallet in every step,
+one after another, so a long run with many wallets uses one core however many
+there are. With numShards > 0 the staking wallets are split into numShards
+shards of consecutive wallets, and a persistent pool of workers checks them:
+
+    numShards = 8               shards, 0 for the plain engine
+    shardWorkers = None         workers, None for one per CPU (never more than the shards)
+    shardMode = "auto"          "threads", "processes", "serial", or "auto":
+                                threads on a free-threaded CPython, processes otherwise
+
+Each shard draws from its own random stream, seeded from the run's random
+stream when the engine starts, and always checks the same wallets in the same
+order. Each step the workers return the solvers and second bites of their
+shards, and they are put together in shard order at the step barrier, which
+is wallet order. So the records depend on numShards but not on the workers or
+the mode: "serial" checks the shards one after another in this process and
+gives the same run as 16 worker processes. Inside a worker of a sweep's pool
+(sweep.py, batch.py, sensitivity.py), which may not start processes, the
+"processes" mode runs as "threads".
+
+Worker processes keep their shards of the staking wallets between steps. When
+the population changes (a scenario, wallet growth) the new (wallet, weight)
+table is written once to shared memory (a file in /dev/shm, as in shared.py),
+each worker maps it and takes its shards, and the file is removed. Each step
+then costs one short message to each worker and one back.
+
+    python -m qlbes.parallel numUniformDistbnWallets=50000 numShards=4
+'''
+
+import mmap
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from .consensus import COIN
+from .engines import HASH_SPACE, bernoulliSolvers, sha256Solvers
+from .shared import SHARED_DIRECTORY
+
+SHARD_MODES = ("auto", "serial", "threads", "processes")
+SHARDED_ENGINES = ("sha256", "bernoulli")
+
+
+def freeThreaded():
+    # True on a CPython built without the GIL and running without it
+
+    isGilEnabled = getattr(sys, "_is_gil_enabled", None)
+    return(isGilEnabled is not None and isGilEnabled() == False)
+
+
+def shardRandom(seed, useSecretsModule):
+    # the random stream of one shard
+
+    if useSecretsModule == True:
+        return(random.SystemRandom())
+    return(random.Random(seed))
+
+
+def shardBounds(numWallets, numShards):
+    # (start, end) of each shard in the staking table, consecutive and as even as can be
+
+    return([(numWallets * shard // numShards, numWallets * (shard + 1) // numShards) for shard in range(numShards)])
+
+
+def checkShard(kind, staking, stepTarget, secondBite, shardRng):
+    # one step over the (wallet, weight) pairs of one shard
+
+    if kind == "sha256":
+        return(sha256Solvers(staking, stepTarget * COIN, shardRng.getrandbits, secondBite))
+    return(bernoulliSolvers(staking, stepTarget * COIN / HASH_SPACE, shardRng.random, secondBite))
+
+
+# shard pools, all with load(staking), step(stepTarget, secondBite) and close() - - - - - - - - - -
+
+class SerialShards:
+
+    def __init__(self, kind, seeds, useSecretsModule):
+        self.kind = kind
+        self.rngs = [shardRandom(seed, useSecretsModule) for seed in seeds]
+        self.shards = [[] for seed in seeds]
+
+    def load(self, staking):
+        self.shards = [staking[start:end] for start, end in shardBounds(len(staking), len(self.rngs))]
+
+    def checkShard(self, shard, stepTarget, secondBite):
+        return(checkShard(self.kind, self.shards[shard], stepTarget, secondBite, self.rngs[shard]))
+
+    def step(self, stepTarget, secondBite):
+        return([self.checkShard(shard, stepTarget, secondBite) for shard in range(len(self.shards))])
+
+    def close(self):
+        pass
+
+
+class ThreadShards(SerialShards):
+    '''
+    The shards checked by a pool of threads. Each shard and its random stream
+    belong to one task per step, so the threads share nothing but the results.
+    Faster than SerialShards only on a free-threaded CPython.
+    '''
+
+    def __init__(self, kind, seeds, useSecretsModule, workers):
+        SerialShards.__init__(self, kind, seeds, useSecretsModule)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="qlbes-shard")
+
+    def step(self, stepTarget, secondBite):
+        return(list(self.executor.map(lambda shard: self.checkShard(shard, stepTarget, secondBite),
+                                      range(len(self.shards)))))
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def shardWorker(connection, kind, shards, useSecretsModule, numShards):
+    '''
+    A worker process, shards is [(shard, seed)]. Messages:
+
+        ("load", path, numWallets)      take the shards from the staking table file
+        ("step", stepTarget, secondBite)
+        ("stop",)
+    '''
+
+    rngs = {shard: shardRandom(seed, useSecretsModule) for shard, seed in shards}
+    staking = {shard: [] for shard, seed in shards}
+
+    while True:
+        message = connection.recv()
+
+        if message[0] == "step":
+            stepTarget, secondBite = message[1:]
+            connection.send([(shard, checkShard(kind, staking[shard], stepTarget, secondBite, rngs[shard]))
+                             for shard in staking])
+
+        elif message[0] == "load":
+            path, numWallets = message[1:]
+            bounds = shardBounds(numWallets, numShards)
+            with open(path, 'rb') as inFile:
+                mapped = mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ) if numWallets > 0 else None
+            table = memoryview(mapped).cast('q') if mapped is not None else []
+            for shard in staking:
+                start, end = bounds[shard]
+                staking[shard] = list(zip(table[2 * start:2 * end:2], table[2 * start + 1:2 * end:2]))
+            if mapped is not None:
+                table.release()
+                mapped.close()
+            connection.send(True)
+
+        else:
+            connection.close()
+            return
+
+
+class ProcessShards:
+    '''
+    The shards checked by worker processes, shard i by worker i % workers.
+    The random streams live in the workers, the staking table goes through
+    shared memory.
+    '''
+
+    def __init__(self, kind, seeds, useSecretsModule, workers):
+
+        self.numShards = len(seeds)
+        self.connections = []
+        self.processes = []
+
+        for worker in range(workers):
+            shards = [(shard, seed) for shard, seed in enumerate(seeds) if shard % workers == worker]
+            parentEnd, workerEnd = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=shardWorker, daemon=True,
+                                              args=(workerEnd, kind, shards, useSecretsModule, self.numShards))
+            process.start()
+            workerEnd.close()
+            self.connections.append(parentEnd)
+            self.processes.append(process)
+
+    def load(self, staking):
+
+        table = array('q')
+        for wallet, weight in staking:
+            table.append(wallet)
+            table.append(weight)
+
+        directory = SHARED_DIRECTORY if os.path.isdir(SHARED_DIRECTORY) else tempfile.gettempdir()
+        handle, path = tempfile.mkstemp(prefix="qlbes-shards-", suffix=".tbl", dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as outFile:
+                outFile.write(table.tobytes())
+            for connection in self.connections:
+                connection.send(("load", path, len(staking)))
+            for connection in self.connections:
+                connection.recv()
+        finally:
+            os.remove(path)
+
+    def step(self, stepTarget, secondBite):
+
+        for connection in self.connections:
+            connection.send(("step", stepTarget, secondBite))
+
+        results = [None] * self.numShards
+        for connection in self.connections:
+            for shard, result in connection.recv():
+                results[shard] = result
+        return(results)
+
+    def close(self):
+
+        for connection in self.connections:
+            try:
+                connection.send(("stop",))
+                connection.close()
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(5)
+        self.connections = []
+        self.processes = []
+
+
+# the engine - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def resolveShardMode(config, workers):
+    # the mode "auto" stands for, serial when there is a single worker, threads in a pool worker
+
+    if workers <= 1:
+        return("serial")
+    mode = config.shardMode
+    if mode == "auto":
+        mode = "threads" if freeThreaded() else "processes"
+    if mode == "processes" and multiprocessing.current_process().daemon == True:
+        mode = "threads"            # a sweep's pool workers are daemonic and cannot start processes of their own
+    return(mode)
+
+
+class ShardedEngine:
+
+    name = "sharded"
+
+    def __init__(self, config, rng):
+
+        self.kind = config.engine
+        seeds = [rng.getrandbits(64) for shard in range(config.numShards)]   # the shard streams, from the run's
+
+        workers = config.shardWorkers if config.shardWorkers is not None else (os.cpu_count() or 1)
+        workers = max(1, min(workers, config.numShards))
+        self.mode = resolveShardMode(config, workers)
+
+        if self.mode == "processes":
+            self.shards = ProcessShards(self.kind, seeds, config.useSecretsModule, workers)
+        elif self.mode == "threads":
+            self.shards = ThreadShards(self.kind, seeds, config.useSecretsModule, workers)
+        else:
+            self.shards = SerialShards(self.kind, seeds, config.useSecretsModule)
+
+        self.stakingPopulation = None
+        self.stakingVersion = None
+
+    def checkStep(self, population, stepTarget, secondBite):
+
+        if population.version != self.stakingVersion or self.stakingPopulation is not population:
+            self.shards.load(population.stakingWallets())
+            self.stakingVersion = population.version
+            self.stakingPopulation = population
+
+        # the step barrier, shard results put together in wallet order
+
+        solvers = []
+        secondBites = 0
+        for shardSolvers, shardSecondBites in self.shards.step(stepTarget, secondBite):
+            solvers.extend(shardSolvers)
+            secondBites += shardSecondBites
+        return(solvers, secondBites)
+
+    def close(self):
+        self.shards.close()
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+    from .simulator import simulateBlocks
+
+    settings = {"walletWeightDistribution": "Uniform", "numUniformDistbnWallets": 50000, "numBlocks": 200,
+                "engine": "bernoulli", "numShards": 4}
+    settings.update(parseSettings(arguments))
+    config = SimulationConfig(**settings)
+
+    print("wallets {:,d} | shards {:d} | CPUs {:d} | free-threaded {}".format(
+        config.numUniformDistbnWallets, config.numShards, os.cpu_count() or 1, freeThreaded()))
+    print("      mode | workers |  seconds | same records as serial")
+
+    serial = None
+    for mode, workers in [("serial", 1), (resolveShardMode(config.replace(shardMode="auto"), 2), max(2, os.cpu_count() or 1))]:
+        start = time.perf_counter()
+        records = list(simulateBlocks(config.replace(shardMode=mode, shardWorkers=workers)))
+        seconds = time.perf_counter() - start
+        if serial is None:
+            serial = records
+        print("{:>10} | {:>7d} | {:>8.2f} | {}".format(mode, workers, seconds, records == serial))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
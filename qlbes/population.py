@@ -0,0 +1,410 @@
+'''
+Wallet populations for the library simulator.
+
+A Population holds the wallet weights (in coins) and the staking flags, and
+keeps trueNetworkWeight, the sum of all wallet weights, and stakingWeight, the
+sum of the weights of the staking wallets, up to date as wallets change, so a
+dynamic weight change costs time in proportion to the wallets it touches
+instead of a getNetworkWeight() rescan.
+
+A PopulationSnapshot is a frozen population that many runs start from. Each
+run takes snapshot.view(), a copy-on-write PopulationView that keeps its
+changes in a small overlay over the shared wallets, so resetting for the next
+run is a new view, O(1), and every run of a sweep starts from the same wallets.
+
+The loaders build the same four distributions as the simulator script:
+"Uniform", "Random", "Mainnet" and "Testnet", "Snapshot" loads a real
+staking snapshot (see snapshots.py), and "Library" maps a generated population
+from the cache (see library.py).
+'''
+
+import itertools
+from array import array
+
+from .large import OverlayWeightClasses, WeightClasses
+
+WALLET_DISTRIBUTIONS = ("Uniform", "Random", "Mainnet", "Testnet", "Snapshot", "Library")
+
+# the settings loadWallets() depends on, the seed for the "Random" distribution
+
+POPULATION_SETTINGS = ("walletWeightDistribution", "numUniformDistbnWallets", "numRandomDistbnWallets",
+                       "numMainnetWallets", "snapshotFile", "snapshotMinWeight", "snapshotTopN",
+                       "libraryGenerator", "libraryWallets", "libraryWeight", "libraryParameters",
+                       "useFixedSeed", "seed")
+
+# 0 to 199 Big guys, 1.5 million to 11.5k coins, 17529755 subtotal, Mainnet scrape 12/16/2017
+
+MAINNET_BIG_GUYS = (
+    1540561, 1419648, 817193, 720017, 705309, 635108, 634289, 524979, 501631, 350003,
+    328899, 302864, 294290, 237965, 223800, 190088, 184761, 176591, 162036, 132052,
+    109115, 105678, 100340, 100330, 100306, 100305, 100302, 100302, 100302, 100299,
+    100294, 100294, 100292, 100291, 100290, 100286, 100282, 100278, 100272, 100272,
+    100272, 100271, 100271, 100268, 100268, 100267, 100267, 100261, 100261, 100259,
+    100253, 100252, 100239, 100230, 100230, 100191, 100166, 93021, 81860, 75930,
+    72298, 70566, 65027, 60907, 56020, 55468, 53556, 52114, 50276, 50268,
+    50129, 43915, 42909, 42830, 42651, 40265, 40212, 40188, 40180, 40171,
+    40143, 40028, 39764, 37800, 37559, 37533, 37053, 35017, 33783, 32112,
+    31405, 30489, 30421, 30204, 30167, 29553, 28617, 28123, 28074, 28001,
+    27736, 27732, 27526, 27437, 26784, 25445, 25323, 25225, 25200, 25159,
+    25096, 24324, 24219, 23489, 23088, 22669, 22564, 21995, 21704, 21383,
+    21351, 21203, 21088, 21050, 20947, 20697, 20221, 20192, 20124, 20119,
+    20096, 20061, 20046, 19986, 19967, 19888, 19587, 19480, 19305, 19272,
+    19101, 18802, 18786, 18783, 18639, 18462, 18302, 18283, 18067, 18008,
+    17976, 17891, 17552, 17432, 17430, 16945, 16454, 16443, 16401, 16253,
+    15730, 15722, 15596, 15522, 15402, 15194, 15109, 15038, 14566, 14548,
+    14444, 14137, 14087, 13913, 13631, 13624, 13612, 13611, 13611, 13575,
+    13439, 13261, 13240, 13163, 13147, 12930, 12846, 12833, 12715, 12538,
+    12531, 12509, 12254, 12199, 12146, 12116, 12045, 12029, 11730, 11577)
+
+# testnet wallets as of 12/02/2017, wallets 0..30, 3864113 total
+
+TESTNET_WALLETS = (
+    143099, 193363, 89341, 128595, 84284, 143694, 77200, 196241, 82733, 208009,
+    134267, 170248, 183450, 116931, 95888, 84865, 159591, 64177, 50450, 241,
+    186143, 180077, 140432, 206759, 52160, 88620, 61543, 61820, 148059, 146921, 184912)
+
+
+class Population:
+    '''
+    Wallet weights and staking flags. walletWeight is a typed array of coins,
+    walletStaking a bytearray of 1 (staking) or 0. Change wallets through the
+    methods so trueNetworkWeight and version stay right; engines use version
+    to know when a cached view of the staking wallets has gone stale.
+    '''
+
+    def __init__(self, weights, staking=None):
+
+        self.walletWeight = array('q', weights)
+
+        if staking is None:
+            self.walletStaking = bytearray(b'\x01') * len(self.walletWeight)  # all wallets staking
+        else:
+            self.walletStaking = bytearray(staking)
+            if len(self.walletStaking) != len(self.walletWeight):
+                raise ValueError("need one staking flag per wallet")
+
+        self.trueNetworkWeight = sum(self.walletWeight)
+        self.stakingWeight = sum(weight for weight, staking in zip(self.walletWeight, self.walletStaking) if staking)
+        self.weightIndex = None          # selection.WeightIndex, kept up to date once an engine builds it
+        self.version = 0
+
+    @property
+    def numWallets(self):
+        return(len(self.walletWeight))
+
+    def weightOf(self, wallet):
+        return(self.walletWeight[wallet])
+
+    def isStaking(self, wallet):
+        return(self.walletStaking[wallet] == 1)
+
+    def addWeight(self, wallet, delta):
+        self.walletWeight[wallet] += delta
+        self.trueNetworkWeight += delta
+        if self.walletStaking[wallet]:
+            self.stakingWeight += delta
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, delta)
+        self.version += 1
+
+    def setWeight(self, wallet, weight):
+        self.addWeight(wallet, weight - self.walletWeight[wallet])
+
+    def setStaking(self, wallet, staking):
+        flag = 1 if staking else 0
+        if flag != self.walletStaking[wallet]:
+            delta = self.walletWeight[wallet] if flag else -self.walletWeight[wallet]
+            self.stakingWeight += delta
+            self.walletStaking[wallet] = flag
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, delta)
+        self.version += 1
+
+    def addWallets(self, count, weight):
+        # new wallets are staking, returns the index of the first new wallet
+
+        first = len(self.walletWeight)
+        self.walletWeight.extend([weight] * count)
+        self.walletStaking.extend(b'\x01' * count)
+        self.trueNetworkWeight += count * weight
+        self.stakingWeight += count * weight
+        if self.weightIndex is not None:
+            for i in range(count):
+                self.weightIndex.append(weight)
+        self.version += 1
+        return(first)
+
+    def stakingWallets(self):
+        # list of (wallet, weight) for the wallets that are staking, in wallet order
+
+        return([(wallet, weight) for wallet, (weight, staking)
+                in enumerate(zip(self.walletWeight, self.walletStaking)) if staking])
+
+    def copy(self):
+        return(Population(self.walletWeight, self.walletStaking))
+
+    def snapshot(self):
+        return(PopulationSnapshot(self))
+
+
+class PopulationSnapshot:
+    '''
+    A frozen copy of a population for runs to start from. The wallets are
+    copied once, and the staking wallet list is built once and shared by the
+    views of all the runs until one of them changes a wallet.
+    '''
+
+    def __init__(self, population):
+
+        self.walletWeight = array('q', population.walletWeight)
+        self.walletStaking = bytes(population.walletStaking)
+        self.trueNetworkWeight = population.trueNetworkWeight
+        self.stakingWeight = population.stakingWeight
+        self.staking = None
+        self.weightClasses = None
+
+    @classmethod
+    def fromBuffers(cls, walletWeight, walletStaking, trueNetworkWeight, stakingWeight, weightClasses=None):
+        # a snapshot over buffers that are already frozen, shared memory for one, nothing is copied
+
+        snapshot = cls.__new__(cls)
+        snapshot.walletWeight = walletWeight
+        snapshot.walletStaking = walletStaking
+        snapshot.trueNetworkWeight = trueNetworkWeight
+        snapshot.stakingWeight = stakingWeight
+        snapshot.staking = BufferStakingWallets(walletWeight, walletStaking)
+        snapshot.weightClasses = weightClasses
+        return(snapshot)
+
+    @property
+    def numWallets(self):
+        return(len(self.walletWeight))
+
+    def stakingWallets(self):
+        if self.staking is None:
+            self.staking = Population.stakingWallets(self)
+        return(self.staking)
+
+    def classes(self):
+        # WeightClasses for the "thinning" engine, built once and shared by the views
+        if self.weightClasses is None:
+            self.weightClasses = WeightClasses(self.walletWeight)
+        return(self.weightClasses)
+
+    def view(self):
+        return(PopulationView(self))
+
+    def snapshot(self):
+        # already frozen, as loadWallets() gives for "Library"
+        return(self)
+
+
+class BufferStakingWallets:
+    '''
+    The (wallet, weight) pairs of the staking wallets of a snapshot over
+    shared buffers, made from the buffers each time they are iterated instead
+    of kept as a list, so a worker holds no per-wallet objects of its own for
+    the "sha256" and "bernoulli" engines. Iterating costs a few percent more
+    than a list.
+    '''
+
+    def __init__(self, walletWeight, walletStaking):
+        self.walletWeight = walletWeight
+        self.walletStaking = walletStaking
+        self.count = sum(walletStaking)
+        self.allStaking = self.count == len(walletStaking)
+
+    def __len__(self):
+        return(self.count)
+
+    def __iter__(self):
+        if self.allStaking == True:
+            return(enumerate(self.walletWeight))
+        return(itertools.compress(enumerate(self.walletWeight), self.walletStaking))
+
+    def __getitem__(self, part):
+        # a slice as a list, for the shards of parallel.py
+
+        if not isinstance(part, slice):
+            raise TypeError("staking wallets over buffers are sliced, not indexed")
+        start, stop, step = part.indices(self.count)
+        return(list(itertools.islice(self, start, stop, step)))
+
+
+class PopulationView:
+    '''
+    Copy-on-write population over a PopulationSnapshot, with the same methods
+    as Population. Changed wallets go to the overlay dicts and new wallets to
+    arrays of their own, the snapshot is never written.
+    '''
+
+    def __init__(self, snapshot):
+
+        self.base = snapshot
+        self.baseWallets = snapshot.numWallets
+        self.overlayWeight = {}          # wallet: weight, for changed snapshot wallets
+        self.overlayStaking = {}         # wallet: 1 or 0
+        self.newWeight = array('q')      # wallets added by this view
+        self.newStaking = bytearray()
+        self.trueNetworkWeight = snapshot.trueNetworkWeight
+        self.stakingWeight = snapshot.stakingWeight
+        self.weightClasses = OverlayWeightClasses(snapshot)
+        self.weightIndex = None
+        self.version = 0
+
+    @property
+    def numWallets(self):
+        return(self.baseWallets + len(self.newWeight))
+
+    def weightOf(self, wallet):
+        if wallet >= self.baseWallets:
+            return(self.newWeight[wallet - self.baseWallets])
+        return(self.overlayWeight.get(wallet, self.base.walletWeight[wallet]))
+
+    def isStaking(self, wallet):
+        if wallet >= self.baseWallets:
+            return(self.newStaking[wallet - self.baseWallets] == 1)
+        return(self.overlayStaking.get(wallet, self.base.walletStaking[wallet]) == 1)
+
+    def addWeight(self, wallet, delta):
+
+        oldWeight = self.weightOf(wallet)
+        if wallet >= self.baseWallets:
+            self.newWeight[wallet - self.baseWallets] += delta
+            self.weightClasses.added.change(wallet, oldWeight, oldWeight + delta)
+        else:
+            self.overlayWeight[wallet] = oldWeight + delta
+            self.weightClasses.change(wallet, oldWeight + delta > 0 and self.isStaking(wallet))
+
+        self.trueNetworkWeight += delta
+        if self.isStaking(wallet):
+            self.stakingWeight += delta
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, delta)
+        self.version += 1
+
+    def setWeight(self, wallet, weight):
+        self.addWeight(wallet, weight - self.weightOf(wallet))
+
+    def setStaking(self, wallet, staking):
+
+        flag = 1 if staking else 0
+        if self.isStaking(wallet) != (flag == 1):
+            weight = self.weightOf(wallet)
+            self.stakingWeight += weight if flag else -weight
+            if self.weightIndex is not None:
+                self.weightIndex.add(wallet, weight if flag else -weight)
+            if wallet >= self.baseWallets:
+                self.newStaking[wallet - self.baseWallets] = flag
+            else:
+                self.overlayStaking[wallet] = flag
+                self.weightClasses.change(wallet, weight > 0 and flag == 1)
+        self.version += 1
+
+    def addWallets(self, count, weight):
+
+        first = self.numWallets
+        self.newWeight.extend([weight] * count)
+        self.newStaking.extend(b'\x01' * count)
+        for wallet in range(first, first + count):
+            self.weightClasses.added.add(wallet, weight)
+            if self.weightIndex is not None:
+                self.weightIndex.append(weight)
+        self.trueNetworkWeight += count * weight
+        self.stakingWeight += count * weight
+        self.version += 1
+        return(first)
+
+    def stakingWallets(self):
+        # the shared snapshot list until a snapshot wallet changes, then merged with the overlay
+
+        staking = self.base.stakingWallets()
+
+        changed = set(self.overlayWeight) | set(self.overlayStaking)
+        if changed:
+            staking = [item for item in staking if item[0] not in changed]
+            staking.extend((wallet, self.weightOf(wallet)) for wallet in changed if self.isStaking(wallet))
+            staking.sort()
+
+        if self.newWeight:
+            staking = list(staking) + [(self.baseWallets + i, weight) for i, (weight, flag)
+                                       in enumerate(zip(self.newWeight, self.newStaking)) if flag]
+
+        return(staking)
+
+    def copy(self):
+        # a plain Population with the changes applied
+
+        population = Population(self.base.walletWeight, self.base.walletStaking)
+        for wallet, weight in self.overlayWeight.items():
+            population.walletWeight[wallet] = weight
+        for wallet, flag in self.overlayStaking.items():
+            population.walletStaking[wallet] = flag
+        population.walletWeight.extend(self.newWeight)
+        population.walletStaking.extend(self.newStaking)
+        population.trueNetworkWeight = self.trueNetworkWeight
+        population.stakingWeight = self.stakingWeight
+        return(population)
+
+
+def getNetworkWeight(population):
+    # the true network weight, the sum of all wallet weights, staking or not
+
+    return(sum(population.walletWeight))
+
+
+# load up the wallets - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def loadUniformWallets(numWallets):
+    # all wallets identical for a network weight of 25000000, or close to it
+
+    return(Population([round(25000000 / numWallets)] * numWallets))
+
+
+def loadRandomWallets(numWallets, rng):
+    # random weights between 100 and 33535, 24986700 for 1500 wallets
+
+    return(Population([rng.randint(100, 33535) for i in range(numWallets)]))
+
+
+def loadMainnetWallets(numMainnetWallets):
+    '''
+    0 to 199   Big guys, 1.5 million to 11.5k coins, 17529755 subtotal, Mainnet scrape 12/16/2017
+    200 to 399   Little guys, 1 to 200 coins, 20100 subtotal
+    400 to numWallets - 401 linear distribution, 7448224 subtotal
+    numWallets - 1, 1921, top off to 25 million
+    '''
+
+    weights = list(MAINNET_BIG_GUYS)
+    weights.extend(i + 1 for i in range(200))                                    # the little guys
+    weights.extend((200 + i * 24) % 14800 for i in range(numMainnetWallets - 401))
+    weights.append(1921)                                                         # top off to 25 million even
+
+    return(Population(weights))
+
+
+def loadTestnetWallets():
+    return(Population(TESTNET_WALLETS))
+
+
+def loadWallets(config, rng):
+    # COMPLEXITY SWITCH 4, build the population named by config.walletWeightDistribution
+
+    distribution = config.walletWeightDistribution
+
+    if distribution == "Uniform":
+        return(loadUniformWallets(config.numUniformDistbnWallets))
+    elif distribution == "Random":
+        return(loadRandomWallets(config.numRandomDistbnWallets, rng))
+    elif distribution == "Mainnet":
+        return(loadMainnetWallets(config.numMainnetWallets))
+    elif distribution == "Testnet":
+        return(loadTestnetWallets())
+    elif distribution == "Snapshot":
+        from .snapshots import loadSnapshot
+        return(loadSnapshot(config.snapshotFile, config.snapshotMinWeight, config.snapshotTopN))
+    elif distribution == "Library":
+        from .library import loadLibraryWallets
+        return(loadLibraryWallets(config))        # a PopulationSnapshot, mapped from the cache
+
+    raise ValueError('wallet weight distribution must be set to "Uniform", "Random", "Mainnet", "Testnet", "Snapshot", or "Library", not ' + repr(distribution))
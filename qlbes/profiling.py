@@ -0,0 +1,288 @@
+'''
+Profiles of simulation runs, as collapsed call stacks and a hot function table.
+
+The phase timers of instrumentation.py say how long the fixed phases of the
+script take; a profile says where the Python time goes in any configuration,
+the target scaling or second bite branches, the engines, a scenario. Two
+profilers, both started and stopped around a run:
+
+    "sample"      a thread samples the call stack of the running thread every
+                  interval seconds (5 ms), a few microseconds a sample, so
+                  the run is hardly slowed down
+    "cprofile"    cProfile, every call timed; exact call counts, but the
+                  run is several times slower, and the stacks only go one
+                  caller deep (the total times are the cumulative times
+                  of cProfile)
+
+The output goes to a directory, the run's output directory, under the
+engine and the fingerprint of the config, so profiles of different engines
+and settings sit side by side:
+
+    profile-<engine>-<fingerprint>.collapsed    "a;b;c 42" lines, for flame
+                                                graph tools (flamegraph.pl,
+                                                speedscope, inferno)
+    profile-<engine>-<fingerprint>.txt          the settings, time per phase
+                                                and the top functions
+
+Phases are by the innermost qlbes module on the stack: step engine, selection,
+estimators, scenario, population, statistics, orphans, simulator loop.
+
+    python -m qlbes.profiling engine=sha256 useTargetScaling=True startingStep=6 --mode=sample --output=profiles
+    python -m qlbes.batch job.txt profile=sample --output=runs/result.json
+'''
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = ("sample", "cprofile")
+
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 25
+
+PROFILE_PHASES = {
+    "engines": "step engine", "parallel": "step engine", "large": "step engine",
+    "selection": "selection", "estimators": "estimators", "kernels": "estimators",
+    "scenarios": "scenario", "population": "population", "statistics": "statistics",
+    "orphans": "orphans", "simulator": "simulator loop",
+}
+
+
+def codeLabel(fileName, name):
+    # module:function, the module from the file name
+
+    module = os.path.splitext(os.path.basename(fileName))[0]
+    return(module + ":" + name)
+
+
+class SamplingProfiler:
+    '''
+    Samples the stack of the thread that started it, from a thread of its
+    own. The stacks are counted as tuples of labels, outermost first.
+    '''
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.labels = {}            # code object: label, so a sample is mostly dict lookups
+        self.stopping = threading.Event()
+        self.thread = None
+        self.seconds = 0.0
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = codeLabel(code.co_filename, getattr(code, "co_qualname", code.co_name))
+        return(label)
+
+    def sampleLoop(self, threadId):
+        frames = sys._current_frames
+        label = self.label
+        while not self.stopping.wait(self.interval):
+            frame = frames().get(threadId)
+            stack = []
+            while frame is not None:
+                stack.append(label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+    def start(self):
+        self.startTime = time.perf_counter()
+        self.thread = threading.Thread(target=self.sampleLoop, args=(threading.get_ident(),),
+                                       name="qlbes-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        self.seconds = time.perf_counter() - self.startTime
+
+    def weightedStacks(self):
+        # stack: seconds, the run time shared out over the samples
+
+        samples = sum(self.stacks.values())
+        if samples == 0:
+            return({})
+        return({stack: self.seconds * count / samples for stack, count in self.stacks.items()})
+
+    def totalSeconds(self):
+        # inclusive time per function, None as the full stacks give it
+        return(None)
+
+
+class CProfileProfiler:
+    # cProfile, the stacks are (caller, function) pairs weighted with the function's own time
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.seconds = 0.0
+
+    def start(self):
+        self.startTime = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.seconds = time.perf_counter() - self.startTime
+
+    def weightedStacks(self):
+        import pstats
+
+        stacks = {}
+        for (fileName, line, name), (calls, numCalls, ownTime, totalTime, callers) in pstats.Stats(self.profile).stats.items():
+            function = codeLabel(fileName, name)
+            if not callers:
+                stacks[(function,)] = stacks.get((function,), 0.0) + ownTime
+            for (callerFile, callerLine, callerName), callerStats in callers.items():
+                stack = (codeLabel(callerFile, callerName), function)
+                stacks[stack] = stacks.get(stack, 0.0) + callerStats[2]
+        return(stacks)
+
+    def totalSeconds(self):
+        # inclusive time per function, the cumulative time of pstats; the pairs cannot give it
+
+        import pstats
+
+        totals = Counter()
+        for (fileName, line, name), (calls, numCalls, ownTime, totalTime, callers) in pstats.Stats(self.profile).stats.items():
+            totals[codeLabel(fileName, name)] += totalTime
+        return(totals)
+
+
+def makeProfiler(mode, interval=SAMPLE_INTERVAL):
+    if mode == "sample":
+        return(SamplingProfiler(interval))
+    if mode == "cprofile":
+        return(CProfileProfiler())
+    raise ValueError("profile must be one of " + ", ".join(PROFILE_MODES) + ", not " + repr(mode))
+
+
+# output - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def collapsedStacks(stacks):
+    # flame graph input, one "outer;inner weight" line per stack, the weight in microseconds
+
+    lines = []
+    for stack, seconds in sorted(stacks.items()):
+        microseconds = int(round(seconds * 1e6))
+        if microseconds > 0:
+            lines.append(";".join(label.replace(";", ":").replace(" ", "_") for label in stack) + " " + str(microseconds))
+    return("\n".join(lines) + "\n")
+
+
+def stackPhase(stack):
+    # the phase of a stack, by its innermost qlbes module
+
+    for label in reversed(stack):
+        phase = PROFILE_PHASES.get(label.partition(":")[0])
+        if phase is not None:
+            return(phase)
+    return("other")
+
+
+def hotFunctions(stacks, top=TOP_FUNCTIONS, totals=None):
+    # (function, own seconds, total seconds), the largest own time first, the totals from the stacks unless given
+
+    own = Counter()
+    total = Counter()
+    for stack, seconds in stacks.items():
+        own[stack[-1]] += seconds
+        if totals is None:
+            for function in set(stack):
+                total[function] += seconds
+    if totals is not None:
+        total = totals
+    return([(function, seconds, total[function]) for function, seconds in own.most_common(top)])
+
+
+def profileReport(stacks, runSeconds, title, top=TOP_FUNCTIONS, totals=None):
+    # the phase table and the top functions, for the .txt file and the display
+
+    profiled = sum(stacks.values())
+    profiled = profiled if profiled > 0.0 else 1e-9
+    lines = [title, "run seconds {:.3f}, profiled seconds {:.3f}".format(runSeconds, profiled), "",
+             "          phase |  seconds | percent"]
+
+    phases = Counter()
+    for stack, seconds in stacks.items():
+        phases[stackPhase(stack)] += seconds
+    for phase, seconds in phases.most_common():
+        lines.append("{:>15} | {:8.3f} | {:6.1f}%".format(phase, seconds, 100.0 * seconds / profiled))
+
+    lines.extend(["", "  own s |  own % | total s | total % | function"])
+    for function, ownSeconds, totalSeconds in hotFunctions(stacks, top, totals):
+        lines.append("{:7.3f} | {:5.1f}% | {:7.3f} | {:6.1f}% | {}".format(
+            ownSeconds, 100.0 * ownSeconds / profiled, totalSeconds, 100.0 * totalSeconds / profiled, function))
+    return("\n".join(lines) + "\n")
+
+
+def profileName(config):
+    return("profile-" + config.engine + "-" + config.fingerprint())
+
+
+def writeProfile(profiler, config, directory, mode, top=TOP_FUNCTIONS):
+    '''
+    Write the .collapsed and .txt files of a stopped profiler for a run of
+    config into directory. Returns the paths of both.
+    '''
+
+    from .cache import writeFileAtomic
+
+    stacks = profiler.weightedStacks()
+    title = "{} profile | engine {} | fingerprint {} | {!r}".format(mode, config.engine, config.fingerprint(), config)
+
+    base = os.path.join(directory, profileName(config))
+    writeFileAtomic(base + ".collapsed", collapsedStacks(stacks).encode('utf-8'))
+    report = profileReport(stacks, profiler.seconds, title, top, profiler.totalSeconds())
+    writeFileAtomic(base + ".txt", report.encode('utf-8'))
+    return(base + ".collapsed", base + ".txt")
+
+
+def profileRun(config, directory=".", mode="sample", interval=SAMPLE_INTERVAL, top=TOP_FUNCTIONS):
+    '''
+    One run of config under the profiler, its profile written to directory.
+    Returns the RunStatistics summary and the paths of the two files.
+    '''
+
+    from .orphans import orphanModel
+    from .simulator import simulateBlocks
+    from .statistics import RunStatistics
+
+    config.validate()
+    profiler = makeProfiler(mode, interval)
+    statistics = RunStatistics(orphanModel=orphanModel(config))
+
+    profiler.start()
+    try:
+        for record in simulateBlocks(config):
+            statistics.add(record)
+    finally:
+        profiler.stop()
+
+    return(statistics.summary(), writeProfile(profiler, config, directory, mode, top))
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+
+    settings = parseSettings(arguments)
+    mode = settings.pop("--mode", "sample")
+    directory = settings.pop("--output", ".")
+    top = settings.pop("--top", TOP_FUNCTIONS)
+    config = SimulationConfig(**settings)
+
+    os.makedirs(directory, exist_ok=True)
+    summary, paths = profileRun(config, directory, mode, top=top)
+    with open(paths[1], 'r') as inFile:
+        print(inFile.read(), end="")
+    print("ave secs {:.2f} | collisions {:,d} | written {}".format(summary["aveSeconds"], summary["collisionCount"],
+                                                                   ", ".join(paths)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
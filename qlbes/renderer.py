@@ -0,0 +1,101 @@
+'''
+Rate-limited, batched block-by-block console renderer.
+
+printBlockByBlock = True used to build every column by hand with "{:,d}" and
+a computed pad, then call print() once per block, which doubled the duration of
+a simulation. The renderer formats a whole row with one precompiled format
+spec, keeps the rows in a buffer and writes them to the console in batches.
+
+Rows are written once flushRows of them are waiting, or flushSeconds after
+the last write, checked on every block so a rare row in threshold mode shows
+up on time.
+
+Sampling keeps the console readable on long runs:
+
+    everyNthBlock     - render every Nth block of the run (1 = every block)
+    spacingThreshold  - if > 0, render only blocks with nActualSpacing at or
+                        above this many seconds (640 for the 5x blocks), and
+                        everyNthBlock is ignored
+
+Column key, numbers are right justified:
+
+        Block |  wallet |    weight   | true netwt |  new netwt | network wt |   target  |  difficulty | spacing
+            1 |       1 |         1.0 |  1,234,567 |  1,234,567 | 12,456,789 |   234,567 |  3,456,789.0 |     3.0
+'''
+
+import sys
+from time import perf_counter
+
+HEADER = "    Block |  wallet |    weight   | true netwt |  new netwt | network wt |   target  |  difficulty | spacing"
+
+HEADER_EVERY_ROWS = 20        # print the column labels every 20 rows, as before
+
+# one format spec per row, the network weight column is passed preformatted
+# since it reads "not yet" for the first nPoSInterval blocks
+
+ROW_FORMAT = "{:>9,d} | {:>7,d} | {:>11,.1f} | {:>10,d} | {:>10,d} | {:>10} | {:>9,d} | {:>10,.1f} | {:>7,.1f}".format
+
+NOT_YET = "   not yet"
+
+PRINT_TARGET_SCALE = 10000000000000000000000000000000000000000000000000000000  # target scaling for printing
+
+
+class BlockRenderer:
+
+    def __init__(self, everyNthBlock=1, spacingThreshold=0, flushRows=200, flushSeconds=0.5, stream=None):
+
+        if everyNthBlock < 1:
+            raise ValueError("everyNthBlock must be 1 or more, not " + repr(everyNthBlock))
+
+        self.everyNthBlock = everyNthBlock
+        self.spacingThreshold = spacingThreshold
+        self.flushRows = flushRows
+        self.flushSeconds = flushSeconds
+        self.stream = stream if stream is not None else sys.stdout
+
+        self.buffer = []
+        self.rowsRendered = 0
+        self.nextFlush = perf_counter() + flushSeconds
+
+    def wants(self, block, nActualSpacing):
+        # cheap test made before any formatting is done, also writes out waiting rows once
+        # flushSeconds have passed, the next row may be far off with a high spacingThreshold
+
+        if self.buffer and perf_counter() >= self.nextFlush:
+            self.flush()
+
+        if self.spacingThreshold > 0:
+            return(nActualSpacing >= self.spacingThreshold)
+
+        return(block % self.everyNthBlock == 0)
+
+    def row(self, block, walletWinner, weight, trueNetworkWeight, nNewNetworkWeight,
+            nNetworkWeightResultMillions, target, dDiff, nActualSpacing):
+        # nNetworkWeightResultMillions is None until nPoSInterval blocks have been seen
+
+        if self.rowsRendered % HEADER_EVERY_ROWS == 0:
+            self.buffer.append(HEADER)
+
+        if nNetworkWeightResultMillions is None:
+            networkWeight = NOT_YET
+        else:
+            networkWeight = "{:,d}".format(int(nNetworkWeightResultMillions))
+
+        self.buffer.append(ROW_FORMAT(int(block), int(walletWinner), weight, int(trueNetworkWeight),
+                                      int(nNewNetworkWeight), networkWeight, int(target / PRINT_TARGET_SCALE),
+                                      dDiff, nActualSpacing))
+        self.rowsRendered += 1
+
+        if len(self.buffer) >= self.flushRows or perf_counter() >= self.nextFlush:
+            self.flush()
+
+    def flush(self):
+        # also called at the end of each run, so the run summary lines up after the blocks
+
+        if self.buffer:
+            self.buffer.append("")
+            self.stream.write("\n".join(self.buffer))
+            self.stream.flush()
+            self.buffer = []
+
+        self.nextFlush = perf_counter() + self.flushSeconds
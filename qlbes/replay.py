@@ -0,0 +1,241 @@
+'''
+Replay of block spacing and difficulty ripped from the blockchain.
+
+The spacing difficulty file is the same one the simulator script reads with
+useSpacingDifficultyFile = True. Comment lines start with a "#", the first
+non-comment line gives the starting block number, then one block per line:
+
+    # blocks 35,700 - 35,913
+    # starting block:
+    35700
+    13,3412624.968
+    418,3417457.858
+
+The file is read as a stream, one line at a time, so replay files of any
+length can be used without loading them into lists first.
+
+Besides the full replay, the script can replay only the spacing (7777A) or
+only the difficulty (7777B), by commenting out the other one. Both are modes
+here, streaming pipelines from the file to one ReplayRow per block:
+
+    spacingReplay()       the recorded spacing through the retarget and the
+                          estimators, no wallets: the simulated difficulty
+                          next to the recorded one
+    difficultyReplay()    the simulated wallets mined at the recorded
+                          difficulties: the predicted spacing next to the
+                          recorded one
+
+replayBatches() folds the rows into batches of batchSize blocks, a day by
+default, each with the recorded and the simulated mean spacing, long blocks
+and mean difficulty, so a replay of a year is a few hundred lines.
+
+    python -m qlbes.replay spacing spacing_difficulty.txt targetMultiplier=25000 --output=batches.csv
+    python -m qlbes.replay difficulty spacing_difficulty.txt walletWeightDistribution=Mainnet engine=index
+'''
+
+import itertools
+import sys
+from collections import namedtuple
+
+from .consensus import EASIEST_DIFFICULTY, FIVE_X_STEPS, MAX_ACTUAL_SPACING, STEP_SECONDS, nPowTargetSpacing
+from .estimators import defaultEstimators
+
+REPLAY_MODES = ("spacing", "difficulty")
+
+REPLAY_BATCH_BLOCKS = 675           # a day of blocks
+
+'''
+One row per block of a partial replay, the recorded values next to the
+simulated ones; in a spacing replay spacing is the recorded spacing, in a
+difficulty replay difficulty is the recorded difficulty:
+
+    block               block number, from the file
+    recordedSpacing     spacing in the file, seconds
+    spacing             the spacing used, recorded or predicted
+    recordedDifficulty  difficulty in the file
+    difficulty          the difficulty the block was mined at, simulated or recorded
+    networkWeight       72 block nPoSInterval network weight over the replayed chain
+    newNetworkWeight    4 x 121 EMA network weight over the replayed chain
+'''
+
+ReplayRow = namedtuple("ReplayRow", ("block", "recordedSpacing", "spacing", "recordedDifficulty", "difficulty",
+                                     "networkWeight", "newNetworkWeight"))
+
+
+def readSpacingDifficultyFile(fileName):
+    '''
+    Generator of (block, spacing, difficulty) from a spacing difficulty file.
+    Raises ValueError for a line that cannot be read, naming the line.
+    '''
+
+    with open(fileName, 'r') as blockSpacingFile:
+
+        block = None
+
+        for lineNumber, line in enumerate(blockSpacingFile, 1):
+
+            data = line.strip()
+            if data == "" or data[0] == "#":          # skip comments and blank lines
+                continue
+
+            try:
+                if block is None:                     # get block number from first non-comment line
+                    block = int(data)
+                    continue
+
+                strSpacing, _, strDifficulty = data.partition(",")
+                spacing = int(strSpacing)
+                difficulty = float(strDifficulty)
+
+            except ValueError:
+                raise ValueError(fileName + " line " + str(lineNumber) + ": expected spacing,difficulty, got " + repr(data))
+
+            yield (block, spacing, difficulty)
+            block += 1
+
+
+def readChain(fileName):
+    # (dDiff, nActualSpacing, trueNetworkWeight) for evaluateEstimators(), the true weight is unknown
+
+    for block, spacing, difficulty in readSpacingDifficultyFile(fileName):
+        yield (difficulty, spacing, None)
+
+
+def countBlocks(fileName):
+    # the number of blocks in a spacing difficulty file, one streaming pass
+
+    count = 0
+    for row in readSpacingDifficultyFile(fileName):
+        count += 1
+    return(count)
+
+
+def retargetSpacing(nActualSpacing):
+    # the spacing the retarget uses, limited as in pow.cpp, line 82
+
+    if nActualSpacing < 0:
+        return(nPowTargetSpacing)
+    return(min(nActualSpacing, MAX_ACTUAL_SPACING))
+
+
+def spacingReplay(fileName, config):
+    '''
+    Generator of ReplayRow: the recorded spacing drives the retarget of
+    config, from the first recorded difficulty, and both estimators. Each
+    block's simulated difficulty is the one it would have been mined at.
+    '''
+
+    targetMultiplier = config.targetMultiplier
+    estimators = defaultEstimators(config.EMAScalingFactor)
+    target = None
+
+    for block, spacing, recordedDifficulty in readSpacingDifficultyFile(fileName):
+
+        if target is None:
+            target = EASIEST_DIFFICULTY / recordedDifficulty
+            for estimator in estimators:
+                estimator.reset(recordedDifficulty)
+
+        dDiff = EASIEST_DIFFICULTY / target
+        networkWeight, newNetworkWeight = [estimator.update(dDiff, spacing) for estimator in estimators]
+        yield ReplayRow(block, spacing, spacing, recordedDifficulty, dDiff, networkWeight, newNetworkWeight)
+
+        if config.useRetarget == True:                # pow.cpp line 92 - 93, as simulateBlocks()
+            nActualSpacing = retargetSpacing(spacing)
+            target *= targetMultiplier + nActualSpacing + nActualSpacing
+            target /= targetMultiplier + 256
+
+
+def difficultyReplay(fileName, config, population=None, rng=None, numBlocks=None):
+    '''
+    Generator of ReplayRow: the wallets of config (or population) mine every
+    block at its recorded difficulty, simulateBlocks() with difficulties, so
+    any engine, scenario or tie break works. numBlocks defaults to the whole
+    file, which costs one extra pass to count it.
+    '''
+
+    from .simulator import simulateBlocks
+
+    if numBlocks is None:
+        numBlocks = countBlocks(fileName)
+    rows = readSpacingDifficultyFile(fileName)
+    first = next(rows, None)
+    if first is None:
+        return
+    rows = itertools.chain([first], rows)
+
+    config = config.replace(startingBlock=first[0], numBlocks=max(1, numBlocks))
+    recorded, difficulties = itertools.tee(rows)        # the two stay one block apart
+
+    for record, (block, recordedSpacing, recordedDifficulty) in zip(
+            simulateBlocks(config, population, rng, difficulties=(row[2] for row in difficulties)), recorded):
+        yield ReplayRow(block, recordedSpacing, record.spacing, recordedDifficulty, record.difficulty,
+                        record.networkWeight, record.newNetworkWeight)
+
+
+def replayBatches(rows, batchSize=REPLAY_BATCH_BLOCKS):
+    '''
+    Generator of one dict per batchSize ReplayRow (the last one may be
+    shorter): the block range, the recorded and simulated mean spacing and
+    blocks of 640 seconds or more, the recorded and simulated mean
+    difficulty, the mean ratio of simulated to recorded difficulty, and the
+    network weights at the end of the batch.
+    '''
+
+    longSpacing = FIVE_X_STEPS * STEP_SECONDS
+    rows = iter(rows)
+
+    while True:
+        batch = list(itertools.islice(rows, batchSize))
+        if not batch:
+            return
+        count = len(batch)
+        yield {"firstBlock": batch[0].block, "lastBlock": batch[-1].block, "blocks": count,
+               "recordedSpacingMean": sum(row.recordedSpacing for row in batch) / count,
+               "spacingMean": sum(row.spacing for row in batch) / count,
+               "recordedLongBlocks": sum(1 for row in batch if row.recordedSpacing >= longSpacing),
+               "longBlocks": sum(1 for row in batch if row.spacing >= longSpacing),
+               "recordedDifficultyMean": sum(row.recordedDifficulty for row in batch) / count,
+               "difficultyMean": sum(row.difficulty for row in batch) / count,
+               "difficultyRatio": sum(row.difficulty / row.recordedDifficulty for row in batch) / count,
+               "networkWeight": batch[-1].networkWeight, "newNetworkWeight": batch[-1].newNetworkWeight}
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+
+    if len(arguments) < 2 or arguments[0] not in REPLAY_MODES:
+        print("usage: python -m qlbes.replay spacing|difficulty file [name=value ...] [--batch=675] [--output=batches.csv]")
+        return(2)
+
+    mode, fileName = arguments[:2]
+    settings = parseSettings(arguments[2:])
+    batchSize = settings.pop("--batch", REPLAY_BATCH_BLOCKS)
+    output = settings.pop("--output", None)
+    config = SimulationConfig(**settings).validate()
+
+    rows = spacingReplay(fileName, config) if mode == "spacing" else difficultyReplay(fileName, config)
+    batches = replayBatches(rows, batchSize)
+
+    if output is not None:
+        import csv
+        with open(output, 'w', newline='') as outFile:
+            writer = None
+            for batch in batches:
+                if writer is None:
+                    writer = csv.DictWriter(outFile, list(batch))
+                    writer.writeheader()
+                writer.writerow(batch)
+        return(0)
+
+    print(" first blk |  last blk | rec secs | sim secs | rec >=640 | sim >=640 |  rec difficulty |  sim difficulty | sim / rec")
+    for batch in batches:
+        print("{:>10,d} | {:>9,d} | {:>8.2f} | {:>8.2f} | {:>9,d} | {:>9,d} | {:>15,.0f} | {:>15,.0f} | {:>9.4f}".format(
+            batch["firstBlock"], batch["lastBlock"], batch["recordedSpacingMean"], batch["spacingMean"],
+            batch["recordedLongBlocks"], batch["longBlocks"], batch["recordedDifficultyMean"],
+            batch["difficultyMean"], batch["difficultyRatio"]))
+    return(0)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
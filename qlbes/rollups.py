@@ -0,0 +1,178 @@
+'''
+Year-scale runs with periodic rollups, in constant memory.
+
+A year is 246,375 blocks. Logging every block of a multi-year run gives giant
+logs, and the run summary gives one number per metric for the whole run. A
+RollupWriter instead keeps one RunStatistics per window, a day (675 blocks)
+and a week (4,725 blocks) by default, and when a window is full writes its
+summary to the trace store and starts the next one:
+
+    spacing             mean, stdev, quantiles, max
+    long blocks         fiveXSpacingBlocks, blocks over 640 seconds
+    collisions          collisionCount
+    estimator error     bias and stdev of both network weight estimates
+
+plus the block range, and the target, difficulty and true network weight at
+the end of the window, to follow retarget drift and wallet churn. Memory does
+not grow with the run, and every full window is on disk as soon as it is
+done, so a long run can be watched, or stopped, half way.
+
+The trace store is a JSON lines file: a header line with the settings and
+their fingerprint, then one line per window (readRollups() reads them back).
+
+    python -m qlbes.rollups years=2 engine=index scenarioFile=churn.json --output=trace.jsonl
+'''
+
+import json
+import sys
+import time
+
+from .statistics import RunStatistics
+
+BLOCKS_PER_DAY = 675
+BLOCKS_PER_WEEK = 7 * BLOCKS_PER_DAY
+BLOCKS_PER_YEAR = 365 * BLOCKS_PER_DAY
+
+ROLLUP_WINDOWS = (("day", BLOCKS_PER_DAY), ("week", BLOCKS_PER_WEEK))
+
+
+class TraceStore:
+    # the rollup lines of one run, appended and flushed one at a time
+
+    def __init__(self, fileName, config, windows=ROLLUP_WINDOWS):
+        self.fileName = fileName
+        self.outFile = open(fileName, 'w')
+        self.write({"type": "header", "fingerprint": config.fingerprint(), "settings": config.asDict(),
+                    "windows": dict(windows), "started": time.time()})
+
+    def write(self, record):
+        self.outFile.write(json.dumps(record, sort_keys=True, default=str) + "\n")
+        self.outFile.flush()
+
+    def close(self):
+        self.outFile.close()
+
+
+class WindowRollup:
+    # the statistics of the current window of one size
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.index = 0
+        self.start()
+
+    def start(self):
+        self.statistics = RunStatistics()
+        self.firstBlock = None
+
+    def add(self, record, orphans=None):
+        if self.firstBlock is None:
+            self.firstBlock = record.block
+        self.statistics.add(record)
+        if orphans is not None:
+            self.statistics.addOrphans(orphans)
+        return(self.statistics.numBlocks == self.size)
+
+    def rollup(self, record, partial=False):
+        # the line for the store, at the last block of the window, then start the next window
+
+        result = {"type": "rollup", "window": self.name, "index": self.index, "partial": partial,
+                  "firstBlock": self.firstBlock, "lastBlock": record.block,
+                  "target": record.target, "difficulty": record.difficulty,
+                  "trueNetworkWeight": record.trueNetworkWeight}
+        result.update(self.statistics.summary())
+        self.index += 1
+        self.start()
+        return(result)
+
+
+class RollupWriter:
+    '''
+    Feed with add(record) for every BlockRecord; every full window goes to the
+    store right away. close() writes the partial windows at the end of the
+    run and a last line with the summary of the whole run. With an
+    orphanModel (see orphans.py) the orphans of each block are drawn once
+    and counted in the run and in every window.
+    '''
+
+    def __init__(self, store, windows=ROLLUP_WINDOWS, orphanModel=None):
+        self.store = store
+        self.windows = [WindowRollup(name, size) for name, size in windows]
+        self.statistics = RunStatistics()
+        self.orphanModel = orphanModel
+        self.lastRecord = None
+
+    def add(self, record):
+        orphans = None
+        if self.orphanModel is not None:
+            orphans = self.orphanModel.orphans(len(record.solvers))
+            self.statistics.addOrphans(orphans)
+        self.statistics.add(record)
+        self.lastRecord = record
+        for window in self.windows:
+            if window.add(record, orphans) == True:
+                self.store.write(window.rollup(record))
+
+    def close(self):
+        if self.lastRecord is not None:
+            for window in self.windows:
+                if window.statistics.numBlocks > 0:
+                    self.store.write(window.rollup(self.lastRecord, partial=True))
+        self.store.write(dict({"type": "run"}, **self.statistics.summary()))
+        self.store.close()
+        return(self.statistics.summary())
+
+
+def runWithRollups(config, fileName, windows=ROLLUP_WINDOWS, population=None, rng=None, estimators=(), scenario=None):
+    # one run of config.numBlocks blocks with its rollups written to fileName, returns the run summary
+
+    from .orphans import orphanModel
+    from .simulator import simulateBlocks
+
+    config.validate()
+    writer = RollupWriter(TraceStore(fileName, config, windows), windows, orphanModel(config))
+    try:
+        for record in simulateBlocks(config, population, rng, estimators, scenario):
+            writer.add(record)
+    finally:
+        summary = writer.close()
+    return(summary)
+
+
+def readRollups(fileName, window=None):
+    # generator of the rollup lines of a trace store, of one window size or all
+
+    with open(fileName, 'r') as inFile:
+        for line in inFile:
+            record = json.loads(line)
+            if record["type"] == "rollup" and (window is None or record["window"] == window):
+                yield record
+
+
+def main(arguments):
+    from .config import SimulationConfig, parseSettings
+
+    settings = parseSettings(arguments)
+    fileName = settings.pop("--output", "qlbes_rollups.jsonl")
+    if "years" in settings:
+        settings["numBlocks"] = int(round(settings.pop("years") * BLOCKS_PER_YEAR))
+    config = SimulationConfig(**settings)
+
+    start = time.perf_counter()
+    summary = runWithRollups(config, fileName)
+    seconds = time.perf_counter() - start
+
+    print("{:,d} blocks in {:.1f} seconds, {:,.0f} blocks/s, rollups in {}".format(
+        config.numBlocks, seconds, config.numBlocks / seconds, fileName))
+    print("    week | ave secs | >=640 blks | collisns | 72 blk bias | EMA bias | true network weight")
+    for record in readRollups(fileName, "week"):
+        print("{:>8d} | {:>8.2f} | {:>10,d} | {:>8,d} | {:>11,.0f} | {:>8,.0f} | {:>19,.0f}".format(
+            record["index"], record["aveSeconds"], record["fiveXSpacingBlocks"], record["collisionCount"],
+            record["networkWeightBias"], record["newNetworkWeightBias"], record["trueNetworkWeight"]))
+    print("whole run: ave secs {:.2f}, >=640 blocks {:,d}, collisions {:,d}".format(
+        summary["aveSeconds"], summary["fiveXSpacingBlocks"], summary["collisionCount"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,292 @@
+'''
+Scripted population churn, a timeline of events applied to the wallets.
+
+useDynamicWeights "Once" and "Multi" and useWalletGrowth are three fixed
+scenarios. A scenario file describes any number of others, as JSON:
+
+    {"events": [
+        {"block": 1000, "type": "join", "wallets": 5, "weight": 500000, "label": "whales"},
+        {"block": 3000, "type": "leave", "wallets": "whales"},
+        {"block": 2000, "type": "stopStaking", "wallets": {"from": 0, "to": 10}},
+        {"block": 4000, "type": "ramp", "wallets": [10, 11, 12], "change": 200000, "overBlocks": 2000},
+        {"block": 0, "type": "churn", "untilBlock": 20000, "leaveRate": 0.0001, "joinRate": 0.2,
+         "weightRange": [100, 30000]}
+    ]}
+
+Event types:
+
+    join          add "wallets" new staking wallets of "weight" coins each
+                  (or "weightRange": [low, high]), "label" names them for later events
+    leave         the wallets leave, weight 0 and no longer staking
+    stopStaking   the wallets keep their coins but stop staking
+    startStaking  the wallets stake again
+    changeWeight  add "change" coins to each wallet, or "changePercent" of the true
+                  network weight spread over the wallets (the "Once" mode)
+    randomChange  as changeWeight with changePercent, a decrease with probability
+                  "decreaseChance" (the "Multi" mode)
+    ramp          add "change" coins to each wallet gradually over "overBlocks" blocks
+    churn         from "block" to "untilBlock" (needed), each staking wallet leaves
+                  with probability "leaveRate" per block, and "joinRate" new wallets
+                  join per block on average
+
+Wallets are given as a list of wallet numbers, {"from": a, "to": b} (b not
+included), or the label of a join. Any event may repeat with "every" blocks,
+"times" times (forever without "times").
+
+Events are kept in a heap by block, so a block without events costs one
+comparison, and an event costs time in proportion to the wallets it touches.
+Population keeps the true network weight up to date as the wallets change.
+Churn draws its leavers from a list of the staking wallets, made once and
+kept up to date by the events as wallets join, leave, stop and start staking,
+so a churn block costs time in proportion to the wallets leaving and joining,
+whatever other events run alongside it.
+'''
+
+import heapq
+import json
+
+from .selection import poisson
+
+EVENT_TYPES = ("join", "leave", "stopStaking", "startStaking", "changeWeight", "randomChange", "ramp", "churn")
+
+
+class Scenario:
+
+    def __init__(self, events, name="scenario"):
+
+        self.name = name
+        self.events = [dict(event) for event in events]
+
+        for number, event in enumerate(self.events):
+            if event.get("type") not in EVENT_TYPES:
+                raise ValueError("scenario event " + str(number) + ": type must be one of " + ", ".join(EVENT_TYPES) +
+                                 ", not " + repr(event.get("type")))
+            if not isinstance(event.get("block"), int) or event["block"] < 0:
+                raise ValueError("scenario event " + str(number) + ": needs a block number")
+            if "every" in event and event["every"] < 1:
+                raise ValueError("scenario event " + str(number) + ": every must be 1 or more")
+            if event["type"] == "churn" and (not isinstance(event.get("untilBlock"), int) or event["untilBlock"] <= event["block"]):
+                raise ValueError("scenario event " + str(number) + ": churn needs an untilBlock after its block")
+
+    @classmethod
+    def fromFile(cls, fileName):
+        with open(fileName, 'r') as inFile:
+            data = json.load(inFile)
+        if isinstance(data, list):
+            data = {"events": data}
+        return(cls(data["events"], data.get("name", fileName)))
+
+    def start(self, population, rng):
+        # a ScenarioRun to apply the events to this population, for one run
+        return(ScenarioRun(self, population, rng))
+
+
+def legacyScenario(config):
+    '''
+    The dynamic weights and wallet growth switches of the simulator as a Scenario,
+    events in the same order and with the same random draws as the block loop.
+    '''
+
+    events = []
+
+    if config.useDynamicWeights == "Once":                           # COMPLEXITY SETTING 6
+        events.append({"block": config.changeOnBlock, "type": "changeWeight", "wallets": {"from": 10, "to": 20},
+                       "changePercent": config.dynamicWeightChangeOnce})
+
+    elif config.useDynamicWeights == "Multi":
+        events.append({"block": config.changeAfterBlocks, "type": "randomChange", "wallets": {"from": 10, "to": 20},
+                       "changePercent": config.dynamicWeightChangeMulti, "every": config.changeAfterBlocks,
+                       "decreaseChance": "randrange(0, 99) <= 33"})
+
+    if config.useWalletGrowth == True and config.walletGrowthNumIncrements > 0:   # COMPLEXITY SETTING 10
+        events.append({"block": config.walletGrowthStartBlock, "type": "join", "wallets": config.walletGrowthNumWallets,
+                       "weight": config.walletGrowthWeight, "every": config.walletGrowthBlockIncrement,
+                       "times": config.walletGrowthNumIncrements})
+
+    return(Scenario(events, "legacy"))
+
+
+class ScenarioRun:
+
+    def __init__(self, scenario, population, rng):
+
+        self.population = population
+        self.rng = rng
+        self.labels = {}
+        self.active = []             # ramps and churn in progress, [event, state]
+        self.staking = None          # the staking wallets, for churn, made when churn first needs it
+        self.stakingIndex = None     # wallet: its position in self.staking
+        self.queue = []              # (block, sequence, event, times left)
+        self.applied = 0
+
+        for sequence, event in enumerate(scenario.events):
+            heapq.heappush(self.queue, (event["block"], sequence, event, event.get("times")))
+
+        self.nextBlock = self.queue[0][0] if self.queue else None
+
+    def apply(self, block):
+        # called at the top of every block, before the step loop
+
+        if self.nextBlock is not None and block >= self.nextBlock:
+            self.applyDue(block)
+
+        if self.active:
+            self.applyActive(block)
+
+    def applyDue(self, block):
+
+        queue = self.queue
+
+        while queue and queue[0][0] <= block:
+            eventBlock, sequence, event, timesLeft = heapq.heappop(queue)
+
+            if eventBlock == block:              # events before the starting block are skipped
+                self.applyEvent(event, block)
+                self.applied += 1
+
+            if "every" in event:
+                if timesLeft is not None:
+                    timesLeft -= 1
+                if timesLeft is None or timesLeft > 0:
+                    heapq.heappush(queue, (eventBlock + event["every"], sequence, event, timesLeft))
+
+        self.nextBlock = queue[0][0] if queue else None
+
+    def wallets(self, spec):
+        # list of wallet numbers for a wallet set
+
+        if isinstance(spec, str):
+            return(self.labels.get(spec, []))
+        if isinstance(spec, dict):
+            return(range(spec["from"], spec["to"]))
+        return(spec)
+
+    def applyEvent(self, event, block):
+
+        population = self.population
+        kind = event["type"]
+
+        if kind == "join":
+            first = population.numWallets
+            for i in range(event["wallets"]):
+                self.addStaking(population.addWallets(1, self.joinWeight(event)))
+            if "label" in event:
+                self.labels.setdefault(event["label"], []).extend(range(first, population.numWallets))
+
+        elif kind == "leave":
+            for wallet in self.wallets(event["wallets"]):
+                population.setStaking(wallet, False)
+                population.setWeight(wallet, 0)
+                self.removeStaking(wallet)
+
+        elif kind == "stopStaking":
+            for wallet in self.wallets(event["wallets"]):
+                population.setStaking(wallet, False)
+                self.removeStaking(wallet)
+
+        elif kind == "startStaking":
+            for wallet in self.wallets(event["wallets"]):
+                population.setStaking(wallet, True)
+                self.addStaking(wallet)
+
+        elif kind == "changeWeight" or kind == "randomChange":
+            wallets = self.wallets(event["wallets"])
+            if "changePercent" in event:
+                change = population.trueNetworkWeight * event["changePercent"] / 100 / len(wallets)
+            else:
+                change = event["change"]
+
+            if kind == "randomChange":
+                chance = event.get("decreaseChance", 0.5)
+                if chance == "randrange(0, 99) <= 33":      # exactly as the Multi mode of the script
+                    decrease = self.rng.randrange(0, 99) <= 33
+                else:
+                    decrease = self.rng.random() < chance
+                if decrease == True:
+                    change *= -1
+
+            for wallet in wallets:
+                population.addWeight(wallet, int(change))
+
+        elif kind == "ramp":
+            wallets = list(self.wallets(event["wallets"]))
+            overBlocks = max(1, event["overBlocks"])
+            self.active.append([event, {"wallets": wallets, "done": 0, "start": block, "overBlocks": overBlocks}])
+
+        elif kind == "churn":
+            self.active.append([event, {"start": block}])
+
+    def applyActive(self, block):
+
+        stillActive = []
+
+        for event, state in self.active:
+
+            if event["type"] == "ramp":
+                # add the whole change in integer coins, spread over overBlocks blocks
+                elapsed = block - state["start"] + 1
+                target = int(event["change"] * min(elapsed, state["overBlocks"]) / state["overBlocks"])
+                delta = target - state["done"]
+                if delta != 0:
+                    for wallet in state["wallets"]:
+                        self.population.addWeight(wallet, delta)
+                    state["done"] = target
+                if elapsed < state["overBlocks"]:
+                    stillActive.append([event, state])
+
+            else:                                                 # churn
+                if block > state["start"]:                        # the start block itself was the event
+                    self.churn(event)
+                if block + 1 < event["untilBlock"]:
+                    stillActive.append([event, state])
+
+        self.active = stillActive
+
+    def churn(self, event):
+
+        population = self.population
+        rng = self.rng
+
+        # the leavers are drawn from the staking wallets only, the list is made from the
+        # population once and kept up to date by the events after that
+
+        if self.staking is None:
+            isStaking = population.isStaking
+            self.staking = [wallet for wallet in range(population.numWallets) if isStaking(wallet)]
+            self.stakingIndex = {wallet: index for index, wallet in enumerate(self.staking)}
+        staking = self.staking
+
+        leaving = min(poisson(rng.random, event.get("leaveRate", 0.0) * len(staking)), len(staking))
+        for i in range(leaving):
+            wallet = staking[rng.randrange(len(staking))]
+            population.setStaking(wallet, False)
+            population.setWeight(wallet, 0)
+            self.removeStaking(wallet)
+
+        joining = poisson(rng.random, event.get("joinRate", 0.0))
+        for i in range(joining):
+            self.addStaking(population.addWallets(1, self.joinWeight(event)))
+
+    def addStaking(self, wallet):
+        # the wallet is staking now, nothing to do before churn has made the list
+
+        if self.staking is not None and wallet not in self.stakingIndex:
+            self.stakingIndex[wallet] = len(self.staking)
+            self.staking.append(wallet)
+
+    def removeStaking(self, wallet):
+        # the wallet stopped staking, swap the last wallet of the list into its place
+
+        if self.staking is not None:
+            index = self.stakingIndex.pop(wallet, None)
+            if index is not None:
+                last = self.staking.pop()
+                if last != wallet:
+                    self.staking[index] = last
+                    self.stakingIndex[last] = index
+
+    def joinWeight(self, event):
+        if "weightRange" in event:
+            low, high = event["weightRange"]
+            return(self.rng.randint(low, high))
+        return(event["weight"])
@@ -0,0 +1,187 @@
+'''
+Weighted selection of solvers and winners without scanning the wallets.
+
+WeightIndex is a Fenwick tree (binary indexed tree, Fenwick 1994) over the
+staking weight of every wallet, weight if staking else 0:
+
+    index.find(u)           the wallet whose share of the total holds u, O(log n)
+    index.add(wallet, d)    change one weight, O(log n)
+    index.append(weight)    a new wallet, O(log n)
+
+A population keeps its index up to date once it has one (population.weightIndex),
+the "index" engine (engines.py) builds it on first use.
+
+The "index" engine draws the solvers of a step as a thinned Poisson process.
+Give wallet i Poisson(lambda_i) hits with lambda_i = -log(1 - p_i), then it has
+at least one hit with probability exactly p_i, its chance of a solution. Since
+lambda_i / weight grows with the weight, c = lambda(maxWeight) / maxWeight
+bounds it, so draw Poisson(c * totalWeight) hits, give each to a wallet in
+proportion to its weight with find(), and keep a hit with probability
+lambda_i / (c * weight_i). The wallets with a hit left are the solvers.
+
+When several wallets solve in one step the tie-break rule picks the winner:
+
+    "last"      the last solver in wallet order, as the script does
+    "first"     the first solver in wallet order
+    "uniform"   any solver, with equal chances
+    "offset"    the solver with the earliest timestamp offset within the step,
+                offsets drawn as for useNormalDistributionForOffset
+'''
+
+import math
+from array import array
+
+TIE_BREAKS = ("last", "first", "uniform", "offset")
+
+MIN_OFFSET = 1.5          # offsets within the step are clamped as in the script
+MAX_OFFSET = 10.0
+
+
+class WeightIndex:
+
+    def __init__(self, weights=()):
+
+        # tree[i] holds the sum of the weights of wallets i - lowbit(i) .. i - 1, tree[0] is unused
+
+        self.tree = array('q', [0])
+        self.tree.extend(weights)
+        numWallets = len(self.tree) - 1
+        self.maxWeight = max(self.tree) if numWallets > 0 else 0
+
+        tree = self.tree
+        for i in range(1, numWallets + 1):
+            parent = i + (i & -i)
+            if parent <= numWallets:
+                tree[parent] += tree[i]
+
+        self.total = self.prefix(numWallets)
+
+    @classmethod
+    def fromPopulation(cls, population):
+        # staking weights of any population, weight if staking else 0
+
+        return(cls(population.weightOf(wallet) if population.isStaking(wallet) else 0
+                   for wallet in range(population.numWallets)))
+
+    @property
+    def numWallets(self):
+        return(len(self.tree) - 1)
+
+    def prefix(self, count):
+        # sum of the weights of wallets 0 .. count - 1
+
+        tree = self.tree
+        total = 0
+        while count > 0:
+            total += tree[count]
+            count -= count & -count
+        return(total)
+
+    def weight(self, wallet):
+        return(self.prefix(wallet + 1) - self.prefix(wallet))
+
+    def add(self, wallet, delta):
+
+        tree = self.tree
+        numWallets = len(tree) - 1
+        i = wallet + 1
+        while i <= numWallets:
+            tree[i] += delta
+            i += i & -i
+        self.total += delta
+        if delta > 0:
+            self.maxWeight = max(self.maxWeight, self.weight(wallet))   # an upper bound, never lowered
+
+    def set(self, wallet, weight):
+        self.add(wallet, weight - self.weight(wallet))
+
+    def append(self, weight):
+        # a new wallet after the others
+
+        i = len(self.tree)
+        self.tree.append(weight + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+        self.total += weight
+        self.maxWeight = max(self.maxWeight, weight)
+
+    def find(self, u):
+        '''
+        The wallet holding u, 0 <= u < total: the first wallet whose prefix sum
+        including itself is greater than u. Wallets of weight 0 are never found.
+        '''
+
+        tree = self.tree
+        numWallets = len(tree) - 1
+        position = 0
+        bit = 1 << numWallets.bit_length()
+        while bit > 0:
+            next = position + bit
+            if next <= numWallets and tree[next] <= u:
+                position = next
+                u -= tree[next]
+            bit >>= 1
+        return(min(position, numWallets - 1))
+
+
+def poisson(rand, mean):
+    # Poisson random number from a random() function, Knuth's method in pieces of mean 30 or less
+
+    if mean <= 0.0:
+        return(0)
+
+    count = 0
+    pieces = max(1, int(math.ceil(mean / 30.0)))
+    limit = math.exp(-mean / pieces)
+
+    for piece in range(pieces):
+        product = rand()
+        while product > limit:
+            count += 1
+            product *= rand()
+
+    return(count)
+
+
+def indexSolvers(index, scale, rand, weightOf):
+    '''
+    Solvers of one step, each wallet with probability scale * weight, in
+    wallet order, by thinning hits drawn from the index. Needs
+    scale * maxWeight < 1, the engine checks every wallet otherwise.
+    '''
+
+    maxWeight = index.maxWeight
+    total = index.total
+    if total <= 0:
+        return([])
+
+    c = -math.log1p(-scale * maxWeight) / maxWeight
+    solvers = set()
+
+    for hit in range(poisson(rand, c * total)):
+        wallet = index.find(rand() * total)
+        weight = weightOf(wallet)
+        if weight > 0 and rand() * c * weight < -math.log1p(-scale * weight):
+            solvers.add(wallet)
+
+    return(sorted(solvers))
+
+
+def solverOffsets(numSolvers, rng, config):
+    # timestamp offsets within the step, one per solver, as the normal distribution for offset
+
+    return([min(max(rng.normalvariate(config.offsetFromStartOfStep, config.standardDeviationWithinStep),
+                    MIN_OFFSET), MAX_OFFSET) for i in range(numSolvers)])
+
+
+def chooseWinner(solvers, tieBreak, rng, offsets=None):
+    # the block reward winner among the solvers of the winning step
+
+    if len(solvers) == 1 or tieBreak == "last":
+        return(solvers[-1])
+    if tieBreak == "first":
+        return(solvers[0])
+    if tieBreak == "uniform":
+        return(solvers[rng.randrange(len(solvers))])
+    if tieBreak == "offset":
+        return(solvers[offsets.index(min(offsets))])
+
+    raise ValueError("tieBreak must be one of " + ", ".join(TIE_BREAKS) + ", not " + repr(tieBreak))
@@ -0,0 +1,223 @@
+'''
+Local sensitivity of the run summary to the retarget parameters.
+
+Instead of bracketing a setting with separate sweeps, sensitivity() moves each
+parameter a step h down and up from the base config and runs both on common
+random numbers: the same wallets and, for each run number, the same random
+stream (sweep.runRng), so the two runs differ only through the parameter. The
+paired central difference
+
+    dF/dx = (F(x + h) - F(x - h)) / 2h
+
+per run, averaged over runs, gives the derivative and its standard error. With
+the "bernoulli" engine every wallet draws one uniform number per step against
+its chance, the same number in both runs, and the pairs stay close; the
+variance reduction over independent runs is reported as crnGain. For
+startingStep, a step number, h is one step, one-sided at step 1.
+
+    SENSITIVITY_PARAMETERS      targetMultiplier, targetScalingFactor, startingStep
+    SENSITIVITY_METRICS         ave secs, P(>=640 s), collision rate, per block
+
+Besides the derivative each parameter gets its elasticity, the relative change
+of the metric per relative change of the parameter, and its swing, F(x + h) -
+F(x - h). tornado() ranks the parameters of one metric by elasticity: the
+swings come from steps of different sizes in different units (10% of
+targetMultiplier, 0.01 of the scaling factor, one step), the elasticities do
+not depend on the step. Each run
+number costs 1 + 2 x parameters runs, 7 for the three parameters, where a grid
+over the same values costs 27. startingStep only matters with useTargetScaling
+on, targetScalingFactor only with compoundTargetScaling on as well.
+
+    python -m qlbes.sensitivity engine=bernoulli useTargetScaling=True compoundTargetScaling=True startingStep=6 --runs=8 --processes=4
+'''
+
+import math
+import sys
+
+from .config import SimulationConfig, parseSettings
+from .consensus import FIVE_X_STEPS, STEP_SECONDS
+from .sweep import runTasks
+
+SENSITIVITY_PARAMETERS = ("targetMultiplier", "targetScalingFactor", "startingStep")
+
+SENSITIVITY_METRICS = (
+    ("ave secs", lambda summary: summary["aveSeconds"]),
+    ("P(>=" + str(FIVE_X_STEPS * STEP_SECONDS) + " s)", lambda summary: summary["fiveXSpacingBlocks"] / summary["numBlocks"]),
+    ("collision rate", lambda summary: summary["collisionCount"] / summary["numBlocks"]),
+)
+
+
+def defaultStep(name, value):
+    # the step h of a parameter: 10% of targetMultiplier, 0.01 of the scaling factor, one step
+
+    if name == "startingStep":
+        return(1)
+    if name == "targetScalingFactor":
+        return(0.01)
+    if isinstance(value, int):
+        return(max(1, int(round(value * 0.1))))
+    return(value * 0.1)
+
+
+def stepValues(config, name, step):
+    # (low, high) around the base value, the low side clamped to 1 for step numbers
+
+    value = getattr(config, name)
+    low = value - step
+    if name == "startingStep":
+        low = max(1, low)
+    return(low, value + step)
+
+
+def meanAndError(values):
+    # mean and standard error of the mean, None with fewer than two values
+
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return(mean, None)
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return(mean, math.sqrt(variance / len(values)))
+
+
+def variance(values):
+    mean = sum(values) / len(values)
+    return(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+
+
+def crnGain(lows, highs):
+    '''
+    Variance of the difference of independent runs over the variance of the
+    paired difference: how many times fewer runs the pairing needs for the
+    same error. None with fewer than two runs, inf when the pairs never differ.
+    '''
+
+    if len(lows) < 2:
+        return(None)
+    paired = variance([high - low for low, high in zip(lows, highs)])
+    independent = variance(lows) + variance(highs)
+    if paired == 0.0:
+        return(math.inf if independent > 0.0 else None)
+    return(independent / paired)
+
+
+def sensitivity(config, parameters=SENSITIVITY_PARAMETERS, steps=None, runs=4, processes=1, population=None):
+    '''
+    Paired central differences of every metric in every parameter, runs runs
+    each. steps maps a parameter to its step h (see defaultStep()). Returns a
+    report dict: the base metrics and per parameter the low and high values
+    and per metric the derivative, its standard error, the elasticity, the
+    swing and the CRN gain.
+    '''
+
+    config.validate()
+    steps = dict(steps or {})
+    points = []
+    for name in parameters:
+        step = steps.get(name, defaultStep(name, getattr(config, name)))
+        low, high = stepValues(config, name, step)
+        config.replace(**{name: low}).validate()
+        config.replace(**{name: high}).validate()
+        points.append((name, low, high))
+
+    tasks = [(run, None, None) for run in range(runs)]
+    for name, low, high in points:
+        tasks.extend((run, name, value) for value in (low, high) for run in range(runs))
+    results = iter(runTasks(config, tasks, processes, population))
+
+    base = [next(results)["summary"] for run in range(runs)]
+    baseMetrics = {}
+    for metric, measure in SENSITIVITY_METRICS:
+        baseMetrics[metric] = meanAndError([measure(summary) for summary in base])
+
+    report = {"settings": config.asDict(), "runs": runs, "base": baseMetrics, "parameters": []}
+
+    for name, low, high in points:
+        lowSummaries = [next(results)["summary"] for run in range(runs)]
+        highSummaries = [next(results)["summary"] for run in range(runs)]
+        value = getattr(config, name)
+
+        metrics = {}
+        for metric, measure in SENSITIVITY_METRICS:
+            lows = [measure(summary) for summary in lowSummaries]
+            highs = [measure(summary) for summary in highSummaries]
+            derivative, error = meanAndError([(b - a) / (high - low) for a, b in zip(lows, highs)])
+            baseValue = baseMetrics[metric][0]
+            metrics[metric] = {
+                "low": sum(lows) / runs, "high": sum(highs) / runs,
+                "derivative": derivative, "error": error,
+                "elasticity": derivative * value / baseValue if baseValue != 0.0 else None,
+                "swing": (sum(highs) - sum(lows)) / runs,
+                "crnGain": crnGain(lows, highs)}
+
+        report["parameters"].append({"name": name, "value": value, "low": low, "high": high, "metrics": metrics})
+
+    return(report)
+
+
+def tornado(report, metric):
+    # (name, elasticity, swing) of every parameter, largest elasticity first, None (a base of 0) last
+
+    bars = [(parameter["name"], parameter["metrics"][metric]["elasticity"], parameter["metrics"][metric]["swing"])
+            for parameter in report["parameters"]]
+    return(sorted(bars, key=lambda bar: -abs(bar[1]) if bar[1] is not None else 1.0))
+
+
+def formatReport(report, width=30):
+    # the sensitivities as a table and a tornado chart per metric, for the display
+
+    lines = ["runs {:d} | base: ".format(report["runs"]) + ", ".join(
+        "{} {:.4g}".format(metric, report["base"][metric][0]) for metric, measure in SENSITIVITY_METRICS),
+        "          parameter |      value |    low |   high |         metric |  derivative | std error | elasticity | CRN gain"]
+
+    for parameter in report["parameters"]:
+        for index, (metric, measure) in enumerate(SENSITIVITY_METRICS):
+            result = parameter["metrics"][metric]
+            error = "n/a" if result["error"] is None else "{:.3e}".format(result["error"])
+            elasticity = "n/a" if result["elasticity"] is None else "{:.3f}".format(result["elasticity"])
+            gain = "n/a" if result["crnGain"] is None else "{:.1f}".format(result["crnGain"])
+            lines.append("{:>19} | {:>10} | {:>6} | {:>6} | {:>14} | {:>11.3e} | {:>9} | {:>10} | {:>8}".format(
+                parameter["name"] if index == 0 else "", str(parameter["value"]) if index == 0 else "",
+                str(parameter["low"]) if index == 0 else "", str(parameter["high"]) if index == 0 else "",
+                metric, result["derivative"], error, elasticity, gain))
+
+    for metric, measure in SENSITIVITY_METRICS:
+        bars = tornado(report, metric)
+        largest = max([abs(elasticity) for name, elasticity, swing in bars if elasticity is not None] + [0.0])
+        lines.append("")
+        lines.append("tornado, " + metric + ", by elasticity (% change of the metric per % change of the parameter)")
+        for name, elasticity, swing in bars:
+            if elasticity is None:
+                lines.append("{:>19} | {:<{width}} | n/a, swing {:+.4g}".format(name, "", swing, width=width))
+                continue
+            length = int(round(width * abs(elasticity) / largest)) if largest > 0.0 else 0
+            bar = ("-" if elasticity < 0.0 else "+") * length
+            lines.append("{:>19} | {:<{width}} | {:+.3f}, swing {:+.4g}".format(name, bar, elasticity, swing,
+                                                                                 width=width))
+
+    return("\n".join(lines))
+
+
+def main(arguments):
+
+    options = {"--runs": "4", "--processes": "1", "--parameters": ",".join(SENSITIVITY_PARAMETERS), "--steps": ""}
+    settingArguments = []
+    for argument in arguments:
+        name, equals, value = argument.partition("=")
+        if name in options:
+            options[name] = value
+        else:
+            settingArguments.append(argument)
+
+    steps = {}
+    for item in filter(None, options["--steps"].split(",")):
+        name, colon, text = item.partition(":")
+        steps[name] = parseSettings(["step=" + text])["step"]
+
+    config = SimulationConfig(**parseSettings(settingArguments))
+    report = sensitivity(config, options["--parameters"].split(","), steps, int(options["--runs"]),
+                         int(options["--processes"]))
+    print(formatReport(report))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
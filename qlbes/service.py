@@ -0,0 +1,427 @@
+'''
+A local job service, so several people can share one big machine.
+
+Instead of each running edited copies of the script, everyone submits jobs
+to one service, which runs them on a fixed number of warm worker processes:
+
+    python -m qlbes.service serve --workers=8                   # http://127.0.0.1:8642
+    python -m qlbes.service serve --socket=/tmp/qlbes.sock      # or a Unix socket
+
+    python -m qlbes.service submit numBlocks=5000 engine=bernoulli --wait
+    python -m qlbes.service submit engine=bernoulli --sweep=targetMultiplier:15000,20000,25000 --wait
+    python -m qlbes.service submit numBlocks=5000 --socket=/tmp/qlbes.sock --wait
+
+The HTTP interface, JSON in and out:
+
+    POST /jobs              {"settings": {...}} for one run, or
+                            {"settings": {...}, "name": "targetMultiplier", "values": [...]} for a sweep
+    GET  /jobs              every job and its status
+    GET  /jobs/<id>         status, progress, and the result once done
+    GET  /jobs/<id>/events  progress as it happens, one JSON object per line, until the job ends
+
+Settings are validated when the job is posted. A job is identified by its
+settings, so posting a job that is queued, running or done gives back the
+same job instead of running it again; a failed job runs again. The service
+keeps the last FINISHED_JOBS finished jobs and their results, older ones are
+forgotten (404), and posting one of them again runs it again.
+
+Jobs queue for the workers, at most one job per worker at a time. The workers
+live as long as the service and keep the base populations they built, keyed
+by the settings of the population, so only the first job on a population
+pays for building it. A run gives the same result as a one-value sweep with
+runSweep() (sweep.py), and a sweep the same results as runSweep().
+'''
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import DEFAULTS, SimulationConfig, parseSettings
+from .orphans import orphanModel
+from .population import POPULATION_SETTINGS, loadWallets
+from .simulator import makeRng, simulateBlocks
+from .statistics import RunStatistics
+from .sweep import runRng
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+
+PROGRESS_BLOCKS = 500           # a progress message every this many blocks
+CACHED_POPULATIONS = 4          # base populations each worker keeps
+FINISHED_JOBS = 200             # finished jobs the service keeps, with their results
+
+MAX_REQUEST_BYTES = 1 << 20
+
+
+# worker processes - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+workerQueue = None              # progress messages back to the service
+workerPopulations = {}          # population fingerprint -> PopulationSnapshot, oldest first
+
+
+def startWorker(queue):
+    global workerQueue
+    workerQueue = queue
+
+
+def basePopulation(config):
+    # the base population of config, built once per worker, as runSweep() builds it
+
+    key = config.fingerprint(POPULATION_SETTINGS)
+    snapshot = workerPopulations.pop(key, None)
+    if snapshot is None:
+        snapshot = loadWallets(config, makeRng(config)).snapshot()
+    workerPopulations[key] = snapshot
+    while len(workerPopulations) > CACHED_POPULATIONS:
+        del workerPopulations[next(iter(workerPopulations))]
+    return(snapshot)
+
+
+def runJob(jobId, settings, name, values):
+    '''
+    One job in a worker: a run when name is None, else a sweep over values.
+    The results are the dicts of runSweep(), one per run.
+    '''
+
+    config = SimulationConfig(**settings)
+    if name is None:
+        tasks = [(config, None)]
+    else:
+        tasks = [(config.replace(**{name: value}), value) for value in values]
+
+    workerQueue.put(("running", jobId, os.getpid()))
+    results = []
+
+    for run, (runConfig, value) in enumerate(tasks):
+        start = time.perf_counter()
+        snapshot = basePopulation(runConfig)           # a sweep of a population setting needs one per value
+        statistics = RunStatistics(orphanModel=orphanModel(runConfig, run))
+        for record in simulateBlocks(runConfig, snapshot.view(), runRng(runConfig, run)):
+            statistics.add(record)
+            if statistics.numBlocks % PROGRESS_BLOCKS == 0:
+                workerQueue.put(("progress", jobId, run, len(tasks), statistics.numBlocks, runConfig.numBlocks))
+        results.append({"run": run, "name": name, "value": value, "seconds": time.perf_counter() - start,
+                        "summary": statistics.summary()})
+        workerQueue.put(("progress", jobId, run, len(tasks), statistics.numBlocks, runConfig.numBlocks))
+
+    return(results)
+
+
+# the service - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def jobKey(settings, name, values):
+    # the identity of a job, the same for the same settings however they were written
+
+    text = json.dumps([SimulationConfig(**settings).asDict(), name, values], sort_keys=True, default=str)
+    return(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16])
+
+
+class Job:
+
+    def __init__(self, jobId, settings, name, values, loop):
+        self.id = jobId
+        self.settings = settings
+        self.name = name
+        self.values = values
+        self.status = "queued"
+        self.submitted = time.time()
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.events = [{"id": jobId, "status": "queued"}]
+        self.loop = loop
+        self.changed = loop.create_future()     # done on the next event, replaced after each
+
+    def addEvent(self, event):
+        event["id"] = self.id
+        self.events.append(event)
+        self.changed.set_result(None)
+        self.changed = self.loop.create_future()
+
+    def state(self, withResult=True):
+        state = {"id": self.id, "status": self.status, "kind": "run" if self.name is None else "sweep",
+                 "submitted": self.submitted, "progress": self.progress}
+        if withResult == True:
+            state.update({"settings": self.settings, "name": self.name, "values": self.values,
+                          "result": self.result, "error": self.error})
+        return(state)
+
+
+class JobService:
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.jobs = {}
+        self.finished = deque()         # finished jobs, oldest first
+        self.queue = multiprocessing.Queue()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=startWorker, initargs=(self.queue,))
+        self.loop = None
+        self.reader = None
+
+    # jobs
+
+    def submit(self, request):
+        # a new job, or the job already there for the same request; raises ValueError for a bad request
+
+        if not isinstance(request, dict):
+            raise ValueError('a job must be a JSON object, {"settings": {...}}')
+        settings = request.get("settings", {})
+        name = request.get("name")
+        values = request.get("values")
+        if not isinstance(settings, dict):
+            raise ValueError('"settings" must be an object of name: value')
+
+        config = SimulationConfig(**settings).validate()
+        if name is not None:
+            if name not in DEFAULTS:
+                raise ValueError("unknown simulation setting: " + repr(name))
+            if not isinstance(values, list) or not values:
+                raise ValueError('a sweep needs "values", a list of values for ' + name)
+            for value in values:
+                config.replace(**{name: value}).validate()
+
+        jobId = jobKey(settings, name, values)
+        job = self.jobs.get(jobId)
+        if job is not None and job.status != "failed":
+            return(job, True)
+
+        job = self.jobs[jobId] = Job(jobId, settings, name, values, self.loop)
+        future = self.loop.run_in_executor(self.pool, runJob, jobId, settings, name, values)
+        future.add_done_callback(lambda future: self.finish(job, future))
+        return(job, False)
+
+    def finish(self, job, future):
+        if future.exception() is not None:
+            job.status = "failed"
+            job.error = "{}: {}".format(type(future.exception()).__name__, future.exception())
+            job.addEvent({"status": "failed", "error": job.error})
+        else:
+            job.status = "done"
+            job.result = future.result()
+            job.addEvent({"status": "done"})
+
+        self.finished.append(job)
+        while len(self.finished) > FINISHED_JOBS:
+            oldest = self.finished.popleft()
+            if self.jobs.get(oldest.id) is oldest:      # not posted again since
+                del self.jobs[oldest.id]
+
+    def workerMessage(self, message):
+        # from the worker processes, through the reader thread
+
+        kind, jobId = message[:2]
+        job = self.jobs.get(jobId)
+        if job is None or job.status in ("done", "failed"):
+            return
+
+        if kind == "running":
+            job.status = "running"
+            job.addEvent({"status": "running", "worker": message[2]})
+        elif kind == "progress":
+            run, runs, blocks, numBlocks = message[2:]
+            job.progress = {"run": run, "runs": runs, "blocks": blocks, "numBlocks": numBlocks}
+            job.addEvent(dict(job.progress, status="running"))
+
+    def readQueue(self):
+        # a thread, the worker queue blocks
+
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self.workerMessage, message)
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await readRequest(reader)
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            await sendJson(writer, 400, {"error": "bad request"})
+            return
+
+        try:
+            parts = [part for part in path.split("?")[0].split("/") if part]
+
+            if method == "POST" and parts == ["jobs"]:
+                try:
+                    job, duplicate = self.submit(json.loads(body or b"{}"))
+                except (ValueError, TypeError) as error:
+                    await sendJson(writer, 400, {"error": str(error)})
+                    return
+                await sendJson(writer, 200 if duplicate else 202, dict(job.state(False), duplicate=duplicate))
+
+            elif method == "GET" and parts == ["jobs"]:
+                await sendJson(writer, 200, {"workers": self.workers,
+                                             "jobs": [job.state(False) for job in self.jobs.values()]})
+
+            elif method == "GET" and len(parts) == 2 and parts[0] == "jobs" and parts[1] in self.jobs:
+                await sendJson(writer, 200, self.jobs[parts[1]].state())
+
+            elif method == "GET" and len(parts) == 3 and parts[0] == "jobs" and parts[1] in self.jobs and parts[2] == "events":
+                await self.streamEvents(writer, self.jobs[parts[1]])
+
+            else:
+                await sendJson(writer, 404, {"error": "no such job or path: " + method + " " + path})
+
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def streamEvents(self, writer, job):
+        # newline delimited JSON, every event so far and then each as it comes, until the job ends
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            changed = job.changed
+            for event in job.events[sent:]:
+                writer.write(json.dumps(event).encode('utf-8') + b"\n")
+            sent = len(job.events)
+            await writer.drain()
+            if job.status in ("done", "failed"):
+                return
+            await changed
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socketPath=None):
+
+        self.loop = asyncio.get_running_loop()
+        self.reader = threading.Thread(target=self.readQueue, name="qlbes-progress", daemon=True)
+        self.reader.start()
+
+        if socketPath is not None:
+            server = await asyncio.start_unix_server(self.handle, socketPath)
+            where = socketPath
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = "http://{}:{}".format(host, port)
+
+        print("qlbes job service on {} with {} workers".format(where, self.workers), flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.queue.put(None)
+
+
+async def readRequest(reader):
+    # method, path and body of one HTTP/1.1 request
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    method, path, version = lines[0].split(" ")
+    length = 0
+    for line in lines[1:]:
+        field, _, value = line.partition(":")
+        if field.strip().lower() == "content-length":
+            length = int(value)
+    if length > MAX_REQUEST_BYTES:
+        raise ValueError("request too large")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return(method, path, body)
+
+
+async def sendJson(writer, status, content):
+    reasons = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found"}
+    body = json.dumps(content, default=str).encode('utf-8')
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+        status, reasons[status], len(body)).encode('latin-1') + body)
+    await writer.drain()
+
+
+# command line - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def submitJob(url, request, wait, socketPath=None):
+    # post a job, follow its events if asked, and print the job as JSON; to a Unix socket if socketPath is given
+
+    import http.client
+    import socket
+    from urllib.parse import urlsplit
+
+    location = urlsplit(url if "//" in url else "http://" + url)
+
+    def connect():
+        if socketPath is not None:
+            connection = http.client.HTTPConnection("localhost")
+            connection.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.sock.connect(socketPath)
+            return(connection)
+        return(http.client.HTTPConnection(location.hostname, location.port or DEFAULT_PORT))
+
+    connection = connect()
+    connection.request("POST", "/jobs", json.dumps(request), {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    job = json.loads(response.read())
+    if response.status >= 400:
+        print("error: " + job.get("error", str(response.status)))
+        return(1)
+    print("job {} {}{}".format(job["id"], job["status"], ", already submitted" if job["duplicate"] else ""))
+
+    if wait == True:
+        connection = connect()
+        connection.request("GET", "/jobs/" + job["id"] + "/events")
+        for line in connection.getresponse():
+            event = json.loads(line)
+            if "blocks" in event:
+                print("  run {} of {}: {:,d} of {:,d} blocks".format(event["run"] + 1, event["runs"], event["blocks"], event["numBlocks"]))
+
+    connection = connect()
+    connection.request("GET", "/jobs/" + job["id"])
+    job = json.loads(connection.getresponse().read())
+    print(json.dumps(job, indent=2))
+    return(1 if job["status"] == "failed" else 0)
+
+
+def main(arguments):
+
+    usage = ("usage: python -m qlbes.service serve [--workers=N] [--host=127.0.0.1] [--port=8642] [--socket=path]\n"
+             "       python -m qlbes.service submit [name=value ...] [--sweep=name:v1,v2,...] [--wait] [--url=127.0.0.1:8642]\n"
+             "                                      [--socket=path]")
+
+    if not arguments or arguments[0] not in ("serve", "submit"):
+        print(usage)
+        return(2)
+
+    options = {}
+    settingArguments = []
+    for argument in arguments[1:]:
+        if argument.startswith("--"):
+            name, _, value = argument.partition("=")
+            options[name] = value
+        else:
+            settingArguments.append(argument)
+
+    if arguments[0] == "serve":
+        service = JobService(int(options["--workers"]) if "--workers" in options else None)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)    # stop as on Ctrl-C, the workers with it
+        try:
+            asyncio.run(service.serve(options.get("--host", DEFAULT_HOST), int(options.get("--port", DEFAULT_PORT)),
+                                      options.get("--socket")))
+        except KeyboardInterrupt:
+            pass
+        return(0)
+
+    request = {"settings": parseSettings(settingArguments)}
+    if "--sweep" in options:
+        name, _, text = options["--sweep"].partition(":")
+        request["name"] = name
+        request["values"] = [parseSettings(["value=" + value])["value"] for value in text.split(",")]
+    return(submitJob(options.get("--url", "{}:{}".format(DEFAULT_HOST, DEFAULT_PORT)), request, "--wait" in options,
+                     options.get("--socket")))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,161 @@
+'''
+Wallet tables shared between processes.
+
+A sweep in worker processes would give every worker its own copy of the
+wallet weights, the staking flags and the weight classes of the "thinning"
+engine, and pickle them all at startup. Instead the parent publishes the base
+population once, as a table file memory-mapped by every worker:
+
+    with publishPopulation(population) as table:
+        ... start workers with table.path ...
+
+    snapshot = attachPopulation(path)       # in the worker, a few milliseconds
+    population = snapshot.view()            # per-run changes stay in the worker
+
+The pages of the table are the operating system's page cache, mapped read-only
+into each worker, so memory stays flat as workers are added: the "sha256" and
+"bernoulli" engines iterate the staking wallets from the mapped arrays
+(population.BufferStakingWallets), the "thinning" engine uses the mapped weight
+classes. A run that changes wallets keeps its own overlay, and the "index"
+engine builds its own Fenwick tree, one int64 per wallet, per run. The file goes in
+/dev/shm where there is one, so it never touches the disk. Layout, little
+endian, all offsets 8 byte aligned:
+
+    header          magic, version, numWallets, trueNetworkWeight, stakingWeight, numClasses
+    weights         int64 per wallet
+    staking         one byte per wallet
+    class index     (k, offset, count) per weight class
+    class wallets   uint32 wallet numbers, class after class
+'''
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from .large import WeightClasses
+from .population import PopulationSnapshot
+
+TABLE_MAGIC = b"QLBESTBL"
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct("<8sIQqqI")
+TABLE_HEADER_SIZE = 64
+CLASS_ENTRY = struct.Struct("<QQQ")
+
+SHARED_DIRECTORY = "/dev/shm"
+
+
+def aligned(offset):
+    return((offset + 7) // 8 * 8)
+
+
+def tableBytes(population, weightClasses=None):
+    # the table file for a Population, PopulationSnapshot or LargePopulation
+
+    numWallets = population.numWallets
+    if weightClasses is None:
+        weightClasses = WeightClasses(population.walletWeight)
+
+    staking = getattr(population, "walletStaking", None)
+    if staking is None:                       # LargePopulation, one bit per wallet
+        staking = bytes(1 if population.isStaking(wallet) else 0 for wallet in range(numWallets))
+
+    weights = array('q', population.walletWeight)
+    if sys.byteorder == "big":
+        weights.byteswap()
+
+    parts = [TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, numWallets, population.trueNetworkWeight,
+                               population.stakingWeight, len(weightClasses.classes)).ljust(TABLE_HEADER_SIZE, b'\0'),
+             weights.tobytes(),
+             bytes(staking).ljust(aligned(numWallets), b'\0')]
+
+    offset = TABLE_HEADER_SIZE + 8 * numWallets + aligned(numWallets) + CLASS_ENTRY.size * len(weightClasses.classes)
+    index = []
+    wallets = []
+    for k in weightClasses.classes:          # in the order the "thinning" engine draws them
+        classWallets = array('I', weightClasses.classes[k])
+        if sys.byteorder == "big":
+            classWallets.byteswap()
+        index.append(CLASS_ENTRY.pack(k, offset, len(classWallets)))
+        data = classWallets.tobytes()
+        wallets.append(data.ljust(aligned(len(data)), b'\0'))
+        offset += aligned(len(data))
+
+    return(b"".join(parts + index + wallets))
+
+
+class PopulationTable:
+    '''
+    A published population, the table file and its path. Close it (or leave
+    the with block) once the workers are done, that removes the file.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def publishPopulation(population, directory=None):
+    '''
+    Write population (a Population, PopulationSnapshot or LargePopulation) as a
+    table file for workers to attach to, in /dev/shm if there is one, else the
+    temp directory.
+    '''
+
+    if directory is None:
+        directory = SHARED_DIRECTORY if os.path.isdir(SHARED_DIRECTORY) else tempfile.gettempdir()
+
+    weightClasses = getattr(population, "weightClasses", None)
+    if not isinstance(weightClasses, WeightClasses) or weightClasses.moved:
+        weightClasses = None
+
+    handle, path = tempfile.mkstemp(prefix="qlbes-population-", suffix=".tbl", dir=directory)
+    with os.fdopen(handle, 'wb') as outFile:
+        outFile.write(tableBytes(population, weightClasses))
+    return(PopulationTable(path))
+
+
+def attachPopulation(path):
+    '''
+    PopulationSnapshot over the mapped table file, read-only, nothing copied.
+    Per-run changes go through snapshot.view().
+    '''
+
+    with open(path, 'rb') as inFile:
+        mapped = mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    buffer = memoryview(mapped)
+    magic, version, numWallets, trueNetworkWeight, stakingWeight, numClasses = TABLE_HEADER.unpack_from(buffer)
+    if magic != TABLE_MAGIC or version != TABLE_VERSION:
+        raise ValueError(path + ": not a version " + str(TABLE_VERSION) + " population table")
+    if sys.byteorder == "big":
+        raise ValueError("population tables are little endian, attach them on a little endian machine")
+
+    start = TABLE_HEADER_SIZE
+    weights = buffer[start:start + 8 * numWallets].cast('q')
+    start += 8 * numWallets
+    staking = buffer[start:start + numWallets]
+    start += aligned(numWallets)
+
+    classes = {}
+    for entry in range(numClasses):
+        k, offset, count = CLASS_ENTRY.unpack_from(buffer, start + entry * CLASS_ENTRY.size)
+        classes[k] = buffer[offset:offset + 4 * count].cast('I')
+
+    snapshot = PopulationSnapshot.fromBuffers(weights, staking, trueNetworkWeight, stakingWeight,
+                                              WeightClasses.fromClasses(classes))
+    snapshot.mapped = mapped                # keep the mapping open as long as the snapshot lives
+    return(snapshot)
@@ -0,0 +1,192 @@
+'''
+Library entry point for the simulator, a lazy generator of per-block records.
+
+    from qlbes.config import SimulationConfig
+    from qlbes.simulator import simulateBlocks
+
+    for record in simulateBlocks(SimulationConfig(numBlocks=500)):
+        print(record.block, record.spacing, record.newNetworkWeight)
+
+Nothing is simulated until the generator is iterated, and nothing is kept
+between blocks besides the simulation state, so a consumer may stop early,
+aggregate on the fly, or tee the records into loggers. One call is one run of
+the parameter loop, a sweep is one call per parameter value.
+
+The block loop is the same as the script: adjust wallets if desired, step
+until some wallet hashes below the target, retarget per pow.cpp, then update
+the 72 block nPoSInterval and the 4 x 121 EMA network weight estimates.
+'''
+
+import random
+from collections import namedtuple
+
+from .consensus import EASIEST_DIFFICULTY, STEP_SECONDS, MAX_ACTUAL_SPACING
+from .engines import makeEngine
+from .estimators import defaultEstimators
+from .population import PopulationSnapshot, loadWallets
+from .scenarios import Scenario, legacyScenario
+from .selection import chooseWinner, solverOffsets
+
+'''
+One record per block:
+
+    block               block number
+    winner              the block reward winner, by default the last solver in wallet order
+    weight              weight of the winning wallet
+    spacing             nActualSpacing in seconds, limited to 1280 for retargeting
+    steps               16 second steps to the solution
+    target              target for the next block, after retargeting
+    difficulty          dDiff, EASIEST_DIFFICULTY / target
+    networkWeight       72 block nPoSInterval network weight in coins, None for the first 72 blocks
+    newNetworkWeight    4 x 121 EMA network weight, rounded down to 250
+    trueNetworkWeight   the sum of the staking wallet weights, all wallets unless a scenario stopped some
+    solvers             wallets that found a solution in the winning step, in wallet order
+    secondBites         solutions from the second SHA-256 check
+    estimates           outputs of any extra estimators, in the order given
+'''
+
+BlockRecord = namedtuple("BlockRecord", ("block", "winner", "weight", "spacing", "steps", "target", "difficulty",
+                                         "networkWeight", "newNetworkWeight", "trueNetworkWeight", "solvers",
+                                         "secondBites", "estimates"))
+
+
+def makeRng(config):
+    # COMPLEXITY SWITCH 0, a private Random so runs do not disturb each other
+
+    if config.useFixedSeed == True:
+        return(random.Random(config.seed))      # for repeatability
+    return(random.Random())
+
+
+def startingTarget(trueNetworkWeight, config):
+    # calculate the starting target and difficulty from the true network weight
+
+    dDiff = trueNetworkWeight / config.startingDifficultySlope   # slope from chart of simulated results
+    return(EASIEST_DIFFICULTY / dDiff)
+
+
+def simulateBlocks(config, population=None, rng=None, estimators=(), scenario=None, difficulties=None):
+    '''
+    Generator of BlockRecord for one run of config.numBlocks blocks. The
+    population defaults to config.walletWeightDistribution; a population that
+    is passed in is changed in place by dynamic weights and wallet growth, pass
+    population.copy() to keep the original, or a PopulationSnapshot, which
+    each run reads through a copy-on-write view of its own. estimators are extra network
+    weight estimators (see estimators.py) run side by side with the two built
+    in ones, their outputs go to record.estimates. scenario is a Scenario of
+    population churn (see scenarios.py), by default config.scenarioFile or, with
+    no file, the dynamic weights and wallet growth settings. difficulties is
+    an iterable of recorded difficulties, one per block, to replay instead of
+    the retarget (see replay.py): each block is mined at its recorded
+    difficulty, which is also the record's difficulty, and the run ends early
+    if the difficulties do.
+    '''
+
+    config.validate()
+
+    if rng is None:
+        rng = makeRng(config)
+
+    if population is None:
+        population = loadWallets(config, rng)
+    if isinstance(population, PopulationSnapshot):
+        population = population.view()
+
+    startingBlock = config.startingBlock
+    targetMultiplier = config.targetMultiplier
+
+    target = startingTarget(population.stakingWeight, config)
+
+    # the 72 block nPoSInterval and the 4 x 121 EMA estimators, then any extras
+
+    startingDifficulty = EASIEST_DIFFICULTY / target
+    networkWeightEstimator, newNetworkWeightEstimator = defaultEstimators(config.EMAScalingFactor)
+    estimators = list(estimators)
+    for estimator in [networkWeightEstimator, newNetworkWeightEstimator] + estimators:
+        estimator.reset(startingDifficulty)
+
+    if scenario is None:
+        if config.scenarioFile is not None:
+            scenario = Scenario.fromFile(config.scenarioFile)
+        else:
+            scenario = legacyScenario(config)
+    scenarioRun = scenario.start(population, rng)
+
+    engine = makeEngine(config, rng)
+
+    if difficulties is not None:
+        difficulties = iter(difficulties)
+
+    try:
+        for block in range(startingBlock, startingBlock + config.numBlocks):
+
+            if difficulties is not None:              # the recorded difficulty, 7777B of the script
+                recordedDifficulty = next(difficulties, None)
+                if recordedDifficulty is None:
+                    break
+                target = EASIEST_DIFFICULTY / recordedDifficulty
+
+            # adjust wallet weight or number of wallets, if desired - - - - - - - - - - -
+
+            scenarioRun.apply(block)                  # COMPLEXITY SETTINGS 6 and 10, or a scenario file
+
+            # step loop - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+            step = 1
+            while True:
+
+                stepTarget = target
+                if config.useTargetScaling == True and step >= config.startingStep:   # COMPLEXITY SWITCH 8
+                    if config.compoundTargetScaling == True:
+                        stepTarget = target * config.targetScalingFactor ** (step - config.startingStep + 1)
+                    else:
+                        stepTarget = target * 2.0     # "add 100% target", as the script
+
+                secondBite = config.secondSHA256Check == True and step >= config.secondCheckStep
+
+                solvers, secondBites = engine.checkStep(population, stepTarget, secondBite)
+
+                if solvers:
+                    break
+                step += 1
+
+            offsets = None
+            if config.tieBreak == "offset":                   # the earliest timestamp wins
+                offsets = solverOffsets(len(solvers), rng, config)
+
+            walletWinner = chooseWinner(solvers, config.tieBreak, rng, offsets)   # by default the last one in this block
+
+            if config.useNormalDistributionForOffset == True:             # COMPLEXITY SWITCH 3
+                if offsets is not None:
+                    stepOffset = min(offsets)                 # the winner's offset
+                else:
+                    stepOffset = rng.normalvariate(config.offsetFromStartOfStep, config.standardDeviationWithinStep)
+                    stepOffset = min(max(stepOffset, 1.5), 10.0)     # lop off low and high ends
+                nActualSpacing = step * STEP_SECONDS + stepOffset
+            else:
+                nActualSpacing = step * STEP_SECONDS
+
+            if nActualSpacing > MAX_ACTUAL_SPACING:     # pow.cpp, line 82, limit adjustment step
+                nActualSpacing = MAX_ACTUAL_SPACING
+
+            # adjust the difficulty for the next block, pow.cpp line 92 - 93
+
+            if config.useRetarget == True and difficulties is None:       # COMPLEXITY SWITCH 2
+                target *= targetMultiplier + nActualSpacing + nActualSpacing
+                target /= targetMultiplier + 256
+
+            # network weight as a moving average of difficulty divided by a moving average
+            # of the total spacing for the last 72 blocks, and as four 121 block EMAs
+
+            dDiff = EASIEST_DIFFICULTY / target if difficulties is None else recordedDifficulty
+
+            networkWeight = networkWeightEstimator.update(dDiff, nActualSpacing)
+            nNewNetworkWeight = newNetworkWeightEstimator.update(dDiff, nActualSpacing)
+            estimates = tuple([estimator.update(dDiff, nActualSpacing) for estimator in estimators])
+
+            yield BlockRecord(block, walletWinner, population.weightOf(walletWinner), nActualSpacing, step,
+                              target, dDiff, networkWeight, nNewNetworkWeight, population.stakingWeight,
+                              tuple(solvers), secondBites, estimates)
+
+    finally:
+        engine.close()                            # stops the workers of a sharded engine
@@ -0,0 +1,181 @@
+'''
+Bulk loader for staking snapshots, wallet populations taken from the chain.
+
+loadMainnetWallets() is the 200 largest wallets of a 12/16/2017 scrape padded
+with synthetic ones. A snapshot is the real thing, one weight per address, as:
+
+    CSV      one address per line, the weight in coins in the last column,
+             "#" comments and a header line are skipped:
+
+                 address,weight
+                 QeZjXLEyHQmG9ByHKbPqPCBMzWsbPXRERq,1540561.25
+                 QNLKLJs8XCBUpu4pz1tdVyi7PKSD2ieP2x,1419648
+
+    binary   the weights as little endian 64 bit integers, nothing else, or
+             a population file written by writePopulationFile()
+
+The whole file is read at once and the weights go straight into the typed
+weight array. minWeight drops the dust, topN keeps the topN largest wallets,
+largest first like the Mainnet big guys; without topN the file order is kept.
+
+Parsing hundreds of thousands of lines takes a while, so loadSnapshot() keeps
+the parsed population in the cache directory as a population file, keyed by
+the snapshot file (name, size and time) and the filters. Later loads, and the
+per-run resets of the simulator script, read it back in a few milliseconds.
+
+    python -m qlbes.snapshots staking_snapshot.csv minWeight=100 topN=50000
+'''
+
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+
+from .cache import cachePath, writeFileAtomic
+from .population import Population
+
+# population file: header, numWallets int64 weights, numWallets staking flags
+
+POPULATION_MAGIC = b"QLBESPOP"
+POPULATION_VERSION = 1
+POPULATION_HEADER = struct.Struct("<8sIQ")        # magic, version, numWallets
+
+
+def writePopulationFile(path, population):
+    weights = array('q', population.walletWeight)
+    if sys.byteorder == "big":
+        weights.byteswap()
+    header = POPULATION_HEADER.pack(POPULATION_MAGIC, POPULATION_VERSION, population.numWallets)
+    writeFileAtomic(path, header + weights.tobytes() + bytes(population.walletStaking))
+
+
+def readPopulationFile(path):
+    with open(path, 'rb') as inFile:
+        data = inFile.read()
+    return(populationFromBytes(data, path))
+
+
+def populationFromBytes(data, name="population file"):
+
+    magic, version, numWallets = POPULATION_HEADER.unpack_from(data)
+    if magic != POPULATION_MAGIC or version != POPULATION_VERSION:
+        raise ValueError(name + ": not a version " + str(POPULATION_VERSION) + " population file")
+
+    start = POPULATION_HEADER.size
+    end = start + 8 * numWallets
+    if len(data) != end + numWallets:
+        raise ValueError(name + ": expected " + str(numWallets) + " wallets, the file is cut short or too long")
+
+    weights = array('q')
+    weights.frombytes(data[start:end])
+    if sys.byteorder == "big":
+        weights.byteswap()
+
+    return(Population(weights, data[end:]))
+
+
+def readSnapshotWeights(fileName, divisor=1):
+    '''
+    The weights of a snapshot file in file order, as an array of coins.
+    divisor converts other units, COIN for a snapshot in satoshis.
+    '''
+
+    with open(fileName, 'rb') as inFile:
+        data = inFile.read()
+
+    if data.startswith(POPULATION_MAGIC):
+        weights = populationFromBytes(data, fileName).walletWeight
+
+    elif fileName.endswith(".csv") or fileName.endswith(".txt"):
+        weights = array('q')
+        append = weights.append
+        header = True
+
+        for lineNumber, line in enumerate(data.decode('utf-8').splitlines(), 1):
+            line = line.strip()
+            if line == "" or line[0] == "#":
+                continue
+            text = line.rpartition(",")[2].strip()
+            try:
+                append(int(text) if text.isdigit() else int(float(text)))
+            except ValueError:
+                if header == True:                  # a header line, once, before the first weight
+                    header = False
+                    continue
+                raise ValueError(fileName + " line " + str(lineNumber) + ": expected address,weight, got " + repr(line))
+            header = False
+
+    else:
+        if len(data) % 8 != 0:
+            raise ValueError(fileName + ": a binary snapshot is 8 bytes per wallet, got " + str(len(data)) + " bytes")
+        weights = array('q')
+        weights.frombytes(data)
+        if sys.byteorder == "big":
+            weights.byteswap()
+
+    if divisor != 1:
+        weights = array('q', [weight // divisor for weight in weights])
+
+    return(weights)
+
+
+def filterWeights(weights, minWeight=0, topN=None):
+    # drop wallets under minWeight, keep the topN largest (largest first)
+
+    if minWeight > 0:
+        weights = array('q', [weight for weight in weights if weight >= minWeight])
+
+    if topN is not None:
+        weights = array('q', sorted(weights, reverse=True)[:topN])
+
+    return(weights)
+
+
+def snapshotCacheName(fileName, minWeight=0, topN=None, divisor=1):
+    # cache file name for a snapshot and its filters, changes when the snapshot file does
+
+    status = os.stat(fileName)
+    key = json.dumps([os.path.abspath(fileName), status.st_size, status.st_mtime_ns, minWeight, topN, divisor])
+    return("population-" + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16] + ".bin")
+
+
+def loadSnapshot(fileName, minWeight=0, topN=None, divisor=1, useCache=True):
+    '''
+    Population from a staking snapshot, all wallets staking, read from the
+    cache when the same snapshot was loaded with the same filters before.
+    '''
+
+    if useCache == True:
+        path = cachePath(snapshotCacheName(fileName, minWeight, topN, divisor))
+        try:
+            return(readPopulationFile(path))
+        except (OSError, ValueError, struct.error):
+            pass
+
+    population = Population(filterWeights(readSnapshotWeights(fileName, divisor), minWeight, topN))
+
+    if useCache == True:
+        writePopulationFile(path, population)
+
+    return(population)
+
+
+def main(arguments):
+    from .config import parseSettings
+
+    if len(arguments) < 1:
+        print("usage: python -m qlbes.snapshots snapshotFile [minWeight=0] [topN=N] [divisor=1]")
+        return
+
+    settings = parseSettings(arguments[1:])
+    population = loadSnapshot(arguments[0], **settings)
+
+    print("wallets {:,d} | true network weight {:,d} | largest {:,d} | smallest {:,d}".format(
+        population.numWallets, population.trueNetworkWeight,
+        max(population.walletWeight, default=0), min(population.walletWeight, default=0)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
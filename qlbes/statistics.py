@@ -0,0 +1,421 @@
+'''
+Constant-memory streaming statistics for a simulation run.
+
+The run summary in the script keeps stepTotal, maxSteps, fiveXSpacingBlocks and
+collisionCount. The accumulators here add the tails of the block spacing and
+the bias of the network weight estimators, one block at a time and in fixed
+memory, so a year-long run costs no more memory than a short one:
+
+    StepHistogram   exact count of blocks per step, 1 to the 80 step cap
+    P2Quantile      P-square quantile estimate, Jain and Chlamtac 1985, 5 markers
+    Welford         running mean and variance
+    RunStatistics   all of the above, fed with BlockRecord or plain values
+
+and two-sample tests, for telling whether two engines give the same
+distributions (see equivalence.py):
+
+    ksTwoSample          Kolmogorov-Smirnov, for steps and winner weights
+    chiSquareTwoSample   chi-square homogeneity over the values seen, for counts
+'''
+
+import math
+
+from .consensus import FIVE_X_STEPS, MAX_ACTUAL_SPACING, STEP_SECONDS
+
+MAX_HISTOGRAM_STEPS = MAX_ACTUAL_SPACING // STEP_SECONDS     # 80 steps, 1280 seconds
+
+SPACING_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Welford:
+    # running mean and variance, Welford 1962
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def variance(self):
+        if self.count < 2:
+            return(0.0)
+        return(self.m2 / (self.count - 1))
+
+    def stdev(self):
+        return(math.sqrt(self.variance()))
+
+
+class StepHistogram:
+    '''
+    Exact number of blocks for each step count 1 to maxSteps. Blocks over the
+    cap share the last bin, and the largest step count seen is kept as well.
+    '''
+
+    def __init__(self, maxSteps=MAX_HISTOGRAM_STEPS):
+        self.maxSteps = maxSteps
+        self.counts = [0] * (maxSteps + 1)     # index 0 is not used, steps start from 1
+        self.count = 0
+        self.largest = 0
+
+    def add(self, steps):
+        self.count += 1
+        if steps > self.largest:
+            self.largest = steps
+        if steps > self.maxSteps:
+            steps = self.maxSteps
+        self.counts[steps] += 1
+
+    def quantile(self, q):
+        # smallest step count with at least q of the blocks at or below it
+
+        if self.count == 0:
+            return(None)
+        needed = q * self.count
+        running = 0
+        for steps in range(1, self.maxSteps + 1):
+            running += self.counts[steps]
+            if running >= needed:
+                return(steps)
+        return(self.maxSteps)
+
+    def atLeast(self, steps):
+        # number of blocks with this many steps or more, steps <= maxSteps
+
+        return(sum(self.counts[steps:]))
+
+
+class P2Quantile:
+    '''
+    Streaming estimate of one quantile in five markers, the P-square algorithm.
+    Exact for the first five observations, then the markers move with parabolic
+    (or linear) interpolation.
+    '''
+
+    def __init__(self, q):
+        self.q = q
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 1.0 + 2.0 * q, 1.0 + 4.0 * q, 3.0 + 2.0 * q, 5.0]
+        self.increments = [0.0, q / 2.0, q, (1.0 + q) / 2.0, 1.0]
+
+    def add(self, x):
+
+        heights = self.heights
+
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        # find the cell k for x, adjusting the end markers if needed
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # adjust the three middle markers
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1.0 and positions[i + 1] - positions[i] > 1) or (d <= -1.0 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self.linear(i, d)
+                heights[i] = height
+                positions[i] += d
+
+    def parabolic(self, i, d):
+        n = self.positions
+        h = self.heights
+        return(h[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+                                                    (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])))
+
+    def linear(self, i, d):
+        n = self.positions
+        h = self.heights
+        return(h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i]))
+
+    def value(self):
+        heights = self.heights
+        if not heights:
+            return(None)
+        if len(heights) < 5:             # exact, from the sorted few
+            index = min(int(round(self.q * (len(heights) - 1))), len(heights) - 1)
+            return(heights[index])
+        return(heights[2])
+
+
+class RunStatistics:
+    '''
+    Everything the run summary reports, and more, in fixed memory. Feed it
+    with add(record) for BlockRecord from the library simulator, or with
+    addBlock() from the script block loop.
+    '''
+
+    def __init__(self, quantiles=SPACING_QUANTILES, orphanModel=None):
+        self.quantiles = quantiles
+        self.orphanModel = orphanModel           # see orphans.py, orphans are counted with a model
+        self.orphanCount = None if orphanModel is None else 0
+        self.numBlocks = 0
+        self.stepTotal = 0
+        self.maxSteps = 0
+        self.fiveXSpacingBlocks = 0
+        self.collisionCount = 0
+        self.steps = StepHistogram()
+        self.spacingQuantiles = [P2Quantile(q) for q in quantiles]
+        self.spacing = Welford()
+        self.spacingOnSteps = True                # spacing is steps x 16, no offset within the step
+        self.networkWeightError = Welford()       # 72 block nPoSInterval estimate - trueNetworkWeight
+        self.newNetworkWeightError = Welford()    # 4 x 121 EMA estimate - trueNetworkWeight
+        self.networkWeightRelativeError = Welford()
+        self.newNetworkWeightRelativeError = Welford()
+
+    def add(self, record):
+        self.addBlock(record.steps, record.spacing, len(record.solvers), record.networkWeight,
+                      record.newNetworkWeight, record.trueNetworkWeight)
+        if self.orphanModel is not None:
+            self.addOrphans(self.orphanModel.orphans(len(record.solvers)))
+
+    def addOrphans(self, orphans):
+        # orphans of one block, from an orphan model
+        self.orphanCount = (self.orphanCount or 0) + orphans
+
+    def addBlock(self, steps, spacing, solvers, networkWeight, newNetworkWeight, trueNetworkWeight):
+        # networkWeight is None for the first nPoSInterval blocks
+
+        self.numBlocks += 1
+        self.stepTotal += steps
+        if steps > self.maxSteps:
+            self.maxSteps = steps
+        if steps > FIVE_X_STEPS:       # as the script, had5xSteps is set by an unsolved step 40 or later
+            self.fiveXSpacingBlocks += 1
+        if solvers >= 2:
+            self.collisionCount += solvers - 1
+
+        self.steps.add(steps)
+        self.spacing.add(spacing)
+        if self.spacingOnSteps == True and spacing != min(steps * STEP_SECONDS, MAX_ACTUAL_SPACING):
+            self.spacingOnSteps = False
+        for quantile in self.spacingQuantiles:
+            quantile.add(spacing)
+
+        if networkWeight is not None:
+            self.networkWeightError.add(networkWeight - trueNetworkWeight)
+            self.networkWeightRelativeError.add((networkWeight - trueNetworkWeight) / trueNetworkWeight)
+        self.newNetworkWeightError.add(newNetworkWeight - trueNetworkWeight)
+        self.newNetworkWeightRelativeError.add((newNetworkWeight - trueNetworkWeight) / trueNetworkWeight)
+
+    def summary(self):
+        # a flat dict, ready for JSON or a log line
+
+        numBlocks = self.numBlocks if self.numBlocks > 0 else 1
+
+        result = {
+            "numBlocks": self.numBlocks,
+            "aveSeconds": STEP_SECONDS * self.stepTotal / numBlocks,      # as the script: 16 * stepTotal / numBlocks
+            "fiveXSpacingBlocks": self.fiveXSpacingBlocks,
+            "maxSeconds": self.maxSteps * STEP_SECONDS,
+            "collisionCount": self.collisionCount,
+            "orphanCount": self.orphanCount,
+            "orphanRate": None if self.orphanCount is None else self.orphanCount / numBlocks,
+            "spacingMean": self.spacing.mean,
+            "spacingStdev": self.spacing.stdev(),
+            "networkWeightBias": self.networkWeightError.mean,
+            "networkWeightErrorStdev": self.networkWeightError.stdev(),
+            "networkWeightRelativeBias": self.networkWeightRelativeError.mean,
+            "newNetworkWeightBias": self.newNetworkWeightError.mean,
+            "newNetworkWeightErrorStdev": self.newNetworkWeightError.stdev(),
+            "newNetworkWeightRelativeBias": self.newNetworkWeightRelativeError.mean,
+        }
+
+        # without an offset within the steps the step histogram gives the exact
+        # spacing quantiles, otherwise use the P-square estimates
+
+        for quantile in self.spacingQuantiles:
+            label = quantileLabel(quantile.q)
+            steps = self.steps.quantile(quantile.q)
+            result["stepsP" + label] = steps
+            if self.spacingOnSteps == True and steps is not None:
+                result["spacingP" + label] = min(steps * STEP_SECONDS, MAX_ACTUAL_SPACING)
+            else:
+                result["spacingP" + label] = quantile.value()
+
+        return(result)
+
+    def formatSummary(self):
+        # two lines for the display, after the run summary line
+
+        summary = self.summary()
+        spacing = " | ".join("P{} {:,.0f}".format(quantileLabel(q.q), summary["spacingP" + quantileLabel(q.q)] or 0)
+                             for q in self.spacingQuantiles)
+        lines = ["      spacing secs: mean {:,.2f} sd {:,.2f} | {}".format(summary["spacingMean"], summary["spacingStdev"], spacing),
+                 "      network weight bias: 72 block {:+,.0f} ({:+.2%}) | 4x121 EMA {:+,.0f} ({:+.2%})".format(
+                     summary["networkWeightBias"], summary["networkWeightRelativeBias"],
+                     summary["newNetworkWeightBias"], summary["newNetworkWeightRelativeBias"])]
+        return("\n".join(lines))
+
+
+def quantileLabel(q):
+    # 0.5 -> "50", 0.999 -> "99.9"
+
+    return("{:g}".format(q * 100))
+
+
+def summarizeRun(records):
+    # consume a stream of BlockRecord, return the RunStatistics
+
+    statistics = RunStatistics()
+    for record in records:
+        statistics.add(record)
+    return(statistics)
+
+
+# two-sample tests - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+def kolmogorovQ(x):
+    # P(K > x) for the Kolmogorov distribution, the asymptotic KS p-value
+
+    if x < 0.2:
+        return(1.0)
+    total = 0.0
+    for k in range(1, 101):
+        term = 2.0 * (-1) ** (k - 1) * math.exp(-2.0 * k * k * x * x)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return(min(max(total, 0.0), 1.0))
+
+
+def ksTwoSample(a, b):
+    '''
+    Two-sample Kolmogorov-Smirnov test, (D, p-value): D is the largest
+    difference between the two empirical distribution functions, the p-value
+    is asymptotic with Stephens' correction. Ties, as in step counts, are
+    handled by stepping over equal values together, which makes the test
+    conservative for discrete values.
+    '''
+
+    a = sorted(a)
+    b = sorted(b)
+    n = len(a)
+    m = len(b)
+    if n == 0 or m == 0:
+        raise ValueError("ksTwoSample needs values in both samples")
+
+    i = j = 0
+    d = 0.0
+    while i < n and j < m:
+        x = min(a[i], b[j])
+        while i < n and a[i] == x:
+            i += 1
+        while j < m and b[j] == x:
+            j += 1
+        d = max(d, abs(i / n - j / m))
+
+    en = math.sqrt(n * m / (n + m))
+    return(d, kolmogorovQ((en + 0.12 + 0.11 / en) * d))
+
+
+def gammaQ(a, x):
+    # regularized upper incomplete gamma function Q(a, x), series or continued fraction (Numerical Recipes 6.2)
+
+    if x <= 0.0:
+        return(1.0)
+
+    logFactor = a * math.log(x) - x - math.lgamma(a)
+
+    if x < a + 1.0:                 # series for P(a, x)
+        term = total = 1.0 / a
+        n = a
+        for i in range(1000):
+            n += 1.0
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return(max(0.0, 1.0 - total * math.exp(logFactor)))
+
+    tiny = 1e-300                   # continued fraction for Q(a, x), modified Lentz
+    b = x + 1.0 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2.0
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return(min(1.0, math.exp(logFactor) * h))
+
+
+def chiSquareTwoSample(a, b, minExpected=5.0):
+    '''
+    Chi-square test that two samples of discrete values (collisions per
+    block) come from one distribution, (statistic, p-value). Neighbouring
+    values are pooled until every cell expects at least minExpected counts.
+    '''
+
+    n = len(a)
+    m = len(b)
+    if n == 0 or m == 0:
+        raise ValueError("chiSquareTwoSample needs values in both samples")
+
+    countsA = {}
+    countsB = {}
+    for value in a:
+        countsA[value] = countsA.get(value, 0) + 1
+    for value in b:
+        countsB[value] = countsB.get(value, 0) + 1
+
+    smaller = min(n, m) / (n + m)
+    cells = []
+    cellA = cellB = 0
+    for value in sorted(set(countsA) | set(countsB)):
+        cellA += countsA.get(value, 0)
+        cellB += countsB.get(value, 0)
+        if (cellA + cellB) * smaller >= minExpected:
+            cells.append((cellA, cellB))
+            cellA = cellB = 0
+    if cellA + cellB > 0:           # the thin tail joins the last cell
+        if cells:
+            lastA, lastB = cells.pop()
+            cells.append((lastA + cellA, lastB + cellB))
+        else:
+            cells.append((cellA, cellB))
+
+    if len(cells) < 2:
+        return(0.0, 1.0)
+
+    statistic = 0.0
+    for cellA, cellB in cells:
+        expectedA = (cellA + cellB) * n / (n + m)
+        expectedB = (cellA + cellB) * m / (n + m)
+        statistic += (cellA - expectedA) ** 2 / expectedA + (cellB - expectedB) ** 2 / expectedB
+
+    return(statistic, gammaQ((len(cells) - 1) / 2.0, statistic / 2.0))
@@ -0,0 +1,159 @@
+'''
+Parameter sweeps in worker processes, the parameter loop of the script.
+
+The script runs runMax runs one after another, changing targetMultiplier by
+paramIncrement each time. runSweep() runs one simulation per value of any
+setting, spread over worker processes:
+
+    from qlbes.config import SimulationConfig
+    from qlbes.sweep import runSweep
+
+    config = SimulationConfig(engine="bernoulli", numBlocks=5000)
+    for result in runSweep(config, "targetMultiplier", [15000, 20000, 25000], processes=3):
+        print(result["value"], result["summary"]["aveSeconds"])
+
+The base population is loaded once and published as a shared table (see
+shared.py); each worker maps it on first use and runs every value on a
+copy-on-write view of it, so all runs start from the same wallets. A sweep of
+a population setting (numUniformDistbnWallets, walletWeightDistribution, ...)
+publishes one table per distinct population instead. With a
+fixed seed each run gets its own random stream, seeded from the seed and the
+run number, so the results do not depend on the number of processes.
+
+    python -m qlbes.sweep targetMultiplier 15000,20000,25000 numBlocks=5000 engine=bernoulli --processes=3
+'''
+
+import contextlib
+import os
+import random
+import sys
+import time
+
+from .config import SimulationConfig, parseSettings
+from .orphans import orphanModel
+from .population import POPULATION_SETTINGS, loadWallets
+from .shared import attachPopulation, publishPopulation
+from .simulator import makeRng, simulateBlocks
+from .statistics import RunStatistics
+
+workerSnapshots = {}            # table path: the shared population mapped by this worker process
+
+
+def runRng(config, run):
+    # the random stream of one run of a sweep
+
+    if config.useFixedSeed == True:
+        return(random.Random(str(config.seed) + " run " + str(run)))
+    return(random.Random())
+
+
+def runOne(config, snapshot, run, name, value):
+    # one run on a view of the base population, name None runs config as it is
+
+    if name is not None:
+        config = config.replace(**{name: value})
+    start = time.perf_counter()
+    statistics = RunStatistics(orphanModel=orphanModel(config, run))
+    for record in simulateBlocks(config, snapshot.view(), runRng(config, run)):
+        statistics.add(record)
+    return({"run": run, "name": name, "value": value, "seconds": time.perf_counter() - start,
+            "summary": statistics.summary()})
+
+
+def workerRun(task):
+    # one task in a worker, on the shared table at its path, attached on first use
+
+    settings, run, name, value, tablePath = task
+    snapshot = workerSnapshots.get(tablePath)
+    if snapshot is None:
+        snapshot = workerSnapshots[tablePath] = attachPopulation(tablePath)
+    return(runOne(SimulationConfig(**settings), snapshot, run, name, value))
+
+
+def runSweep(config, name, values, processes=None, population=None):
+    '''
+    One run per value of the setting name, in order, each a dict with the
+    run number, the value, the seconds it took and the RunStatistics summary.
+    With name None every run is of config as it is, repeats with their own
+    random streams.
+    processes defaults to one per CPU, 1 runs everything in this process.
+    '''
+
+    return(runTasks(config, [(run, name, value) for run, value in enumerate(values)], processes, population))
+
+
+def runTasks(config, tasks, processes=None, population=None):
+    '''
+    runSweep() over a list of (run, name, value). Tasks with the same run
+    number share a random stream, so the runs of different settings can be
+    paired, as sensitivity.py does. Each distinct population among the tasks
+    (the POPULATION_SETTINGS of their configs) is loaded and published once;
+    population, if given, stands for the population of config.
+    '''
+
+    config.validate()
+    baseKey = config.fingerprint(POPULATION_SETTINGS)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(tasks)))
+
+    with contextlib.ExitStack() as tables:
+
+        paths = {}                  # population fingerprint: path of its published table
+        work = []
+        for run, name, value in tasks:
+            runConfig = config if name is None else config.replace(**{name: value})
+            key = runConfig.fingerprint(POPULATION_SETTINGS)
+            if key not in paths:
+                if key == baseKey and population is not None:
+                    keyPopulation = population
+                else:
+                    keyPopulation = loadWallets(runConfig.validate(), makeRng(runConfig))
+                paths[key] = tables.enter_context(publishPopulation(keyPopulation)).path
+            work.append((config.asDict(), run, name, value, paths[key]))
+
+        if processes == 1:                        # this process is the only worker
+            try:
+                return([workerRun(task) for task in work])
+            finally:
+                for path in paths.values():
+                    workerSnapshots.pop(path, None)
+
+        import multiprocessing          # only for a pool, keeps importing the sweep cheap
+        with multiprocessing.Pool(processes) as pool:
+            return(pool.map(workerRun, work, chunksize=1))
+
+
+def main(arguments):
+
+    processes = None
+    settingArguments = []
+    for argument in arguments:
+        if argument.startswith("--processes="):
+            processes = int(argument.partition("=")[2])
+        else:
+            settingArguments.append(argument)
+
+    if len(settingArguments) < 2:
+        print("usage: python -m qlbes.sweep name value1,value2,... [name=value ...] [--processes=N]")
+        return
+
+    name = settingArguments[0]
+    values = [parseSettings(["value=" + text])["value"] for text in settingArguments[1].split(",")]
+    config = SimulationConfig(**parseSettings(settingArguments[2:]))
+
+    start = time.perf_counter()
+    results = runSweep(config, name, values, processes)
+
+    print("  Run | {:>16} | ave secs | >=640 blks | max secs | collisns | run secs".format(name))
+    for result in results:
+        summary = result["summary"]
+        print("{:>5d} | {:>16} | {:>8.2f} | {:>10,d} | {:>8,d} | {:>8,d} | {:>8.2f}".format(
+            result["run"], str(result["value"]), summary["aveSeconds"], summary["fiveXSpacingBlocks"],
+            summary["maxSeconds"], summary["collisionCount"], result["seconds"]))
+    print("Sweep duration in seconds: {:.2f}".format(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,135 @@
+'''
+Live progress and throughput telemetry for long simulation runs.
+
+Turn on with enableTelemetry = True in the simulator. Once per block the
+simulator calls blockDone(); that compares the clock with the next report time
+and returns right away until telemetryIntervalSeconds have passed, so the hot
+wallet loop is never touched.
+
+Each report carries the run, the current block / numBlocks, blocks per second,
+wallet checks per second, the ETA for the whole sweep, the current target and
+difficulty, both network weight estimates and the running >=640 count. Two
+output formats:
+
+    "jsonl"       - one line of JSON appended per report
+    "prometheus"  - a Prometheus textfile (node_exporter textfile collector),
+                    rewritten in place on each report
+'''
+
+import json
+import os
+from time import perf_counter, time
+
+TELEMETRY_FORMATS = ("jsonl", "prometheus")
+
+
+class TelemetryWriter:
+
+    def __init__(self, fileName, intervalSeconds=10.0, outputFormat="jsonl", runMax=1, numBlocks=0):
+
+        if outputFormat not in TELEMETRY_FORMATS:
+            raise ValueError("telemetry format must be one of " + ", ".join(TELEMETRY_FORMATS) + ", not " + repr(outputFormat))
+
+        self.fileName = fileName
+        self.intervalSeconds = intervalSeconds
+        self.outputFormat = outputFormat
+        self.runMax = runMax
+        self.numBlocks = numBlocks
+
+        self.sweepStart = perf_counter()
+        self.blocksDoneInSweep = 0         # blocks finished in earlier runs of the sweep
+        self.startRun(0, 0)
+
+    def startRun(self, run, startingBlock):
+        # called at the top of each run in the parameter loop
+
+        now = perf_counter()
+        self.run = run
+        self.startingBlock = startingBlock
+        self.runStart = now
+        self.nextReport = now + self.intervalSeconds
+        self.lastReport = now
+        self.lastBlock = startingBlock
+        self.lastSteps = 0
+
+    def endRun(self):
+        self.blocksDoneInSweep += self.numBlocks
+
+    def blockDone(self, block, stepTotal, numWallets, target, dDiff, nNewNetworkWeight,
+                  nNetworkWeight, trueNetworkWeight, fiveXSpacingBlocks):
+        '''
+        Called at the end of every block. stepTotal is the running count of 16 second
+        steps for the run, wallet checks are taken as steps x numWallets since every
+        wallet is checked on every step.
+        nNetworkWeight is the 72 block estimate in coins, nNewNetworkWeight the EMA one.
+        '''
+
+        now = perf_counter()
+        if now < self.nextReport:
+            return
+
+        self.nextReport = now + self.intervalSeconds
+
+        elapsed = now - self.lastReport
+        blocksPerSecond = (block + 1 - self.lastBlock) / elapsed
+        checksPerSecond = (stepTotal - self.lastSteps) * numWallets / elapsed
+
+        self.lastReport = now
+        self.lastBlock = block + 1
+        self.lastSteps = stepTotal
+
+        blocksDoneInRun = block + 1 - self.startingBlock
+        blocksDone = self.blocksDoneInSweep + blocksDoneInRun
+        blocksLeft = self.runMax * self.numBlocks - blocksDone
+        sweepRate = blocksDone / (now - self.sweepStart)
+
+        if sweepRate > 0.0:
+            etaSeconds = blocksLeft / sweepRate
+        else:
+            etaSeconds = None
+
+        record = {
+            "time": round(time(), 3),
+            "run": self.run,
+            "runMax": self.runMax,
+            "block": block,
+            "blockInRun": blocksDoneInRun,
+            "numBlocks": self.numBlocks,
+            "blocksPerSecond": round(blocksPerSecond, 3),
+            "walletChecksPerSecond": round(checksPerSecond, 1),
+            "etaSeconds": None if etaSeconds is None else round(etaSeconds, 1),
+            "target": target,
+            "difficulty": dDiff,
+            "newNetworkWeight": nNewNetworkWeight,
+            "networkWeight": nNetworkWeight,
+            "trueNetworkWeight": trueNetworkWeight,
+            "fiveXSpacingBlocks": fiveXSpacingBlocks,
+        }
+
+        if self.outputFormat == "jsonl":
+            self.writeJsonLine(record)
+        else:
+            self.writePrometheus(record)
+
+    def writeJsonLine(self, record):
+        with open(self.fileName, 'a') as outFile:
+            outFile.write(json.dumps(record, sort_keys=True))
+            outFile.write('\n')
+
+    def writePrometheus(self, record):
+        # write to a temporary file and rename, so a scrape never sees half a file
+
+        lines = []
+        for key in sorted(record):
+            value = record[key]
+            if value is None or key == "time":
+                continue
+            metric = "qlbes_" + key
+            lines.append("# TYPE " + metric + " gauge")
+            lines.append(metric + " " + repr(float(value)))
+
+        tempName = self.fileName + ".tmp"
+        with open(tempName, 'w') as outFile:
+            outFile.write("\n".join(lines))
+            outFile.write('\n')
+        os.replace(tempName, self.fileName)
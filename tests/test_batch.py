@@ -0,0 +1,50 @@
+'''
+Batch jobs: settings checked up front, one population per value of a population setting.
+'''
+
+import json
+import os
+import tempfile
+import unittest
+
+from qlbes.batch import BatchJob
+
+
+class BatchJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "result.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def job(self, **settings):
+        settings = dict({"walletWeightDistribution": "Uniform", "numBlocks": 150, "engine": "bernoulli",
+                         "output": self.output}, **settings)
+        return(BatchJob(settings))
+
+    def test_population_values(self):
+        # run 1 has the same random stream in both jobs, only the wallets differ
+
+        same = self.job(paramName="numUniformDistbnWallets", paramValues=[100, 100]).execute()
+        result = self.job(paramName="numUniformDistbnWallets", paramValues=[100, 5000]).execute()
+        self.assertEqual(result["runs"][0]["summary"], same["runs"][0]["summary"])
+        self.assertNotEqual(result["runs"][1]["summary"], same["runs"][1]["summary"])
+        with open(self.output, 'r') as inFile:
+            self.assertEqual(json.load(inFile)["status"], "ok")
+
+    def test_processes_agree(self):
+        serial = self.job(paramName="numUniformDistbnWallets", paramValues=[100, 5000]).execute()
+        pool = self.job(paramName="numUniformDistbnWallets", paramValues=[100, 5000], processes=2).execute()
+        self.assertEqual([run["summary"] for run in serial["runs"]], [run["summary"] for run in pool["runs"]])
+
+    def test_bad_settings(self):
+        with self.assertRaises(ValueError):
+            self.job(paramName="numUniformDistbnWallets", paramValues=[100, -5])
+        with self.assertRaises(ValueError):
+            self.job(noSuchSetting=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
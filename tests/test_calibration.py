@@ -0,0 +1,33 @@
+'''
+The calibration cache key changes with every setting of the population.
+'''
+
+import unittest
+
+from qlbes.calibration import CALIBRATION_SETTINGS, calibrationFingerprint
+from qlbes.config import SimulationConfig
+from qlbes.population import POPULATION_SETTINGS
+
+
+class CalibrationKeyTest(unittest.TestCase):
+
+    def test_population_settings_in_key(self):
+        self.assertTrue(set(POPULATION_SETTINGS) <= set(CALIBRATION_SETTINGS))
+
+    def test_library_populations_apart(self):
+        config = SimulationConfig(walletWeightDistribution="Library")
+        keys = {calibrationFingerprint(config),
+                calibrationFingerprint(config.replace(libraryGenerator="lognormal")),
+                calibrationFingerprint(config.replace(libraryWallets=3000)),
+                calibrationFingerprint(config.replace(libraryWeight=50000000)),
+                calibrationFingerprint(config.replace(libraryParameters={"alpha": 1.5})),
+                calibrationFingerprint(config.replace(seed="another seed"))}
+        self.assertEqual(len(keys), 6)
+
+    def test_engine_not_in_key(self):
+        config = SimulationConfig()
+        self.assertEqual(calibrationFingerprint(config), calibrationFingerprint(config.replace(engine="index")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+'''
+The two-sample tests of the engine equivalence check, and the check itself.
+'''
+
+import math
+import random
+import unittest
+from unittest import mock
+
+from qlbes import engines
+from qlbes.config import SimulationConfig
+from qlbes.equivalence import compareEngines
+from qlbes.statistics import chiSquareTwoSample, gammaQ, kolmogorovQ, ksTwoSample
+
+
+class KolmogorovSmirnovTest(unittest.TestCase):
+
+    def test_kolmogorov_q(self):
+        # the critical values of the Kolmogorov distribution at 5% and 1%
+
+        self.assertAlmostEqual(kolmogorovQ(1.358), 0.05, places=3)
+        self.assertAlmostEqual(kolmogorovQ(1.628), 0.01, places=3)
+        self.assertEqual(kolmogorovQ(0.1), 1.0)
+
+    def test_statistic(self):
+        self.assertEqual(ksTwoSample([1, 2, 3], [1, 2, 3]), (0.0, 1.0))
+        d, pValue = ksTwoSample([1, 2, 3, 4], [3, 4, 5, 6])
+        self.assertEqual(d, 0.5)
+        self.assertEqual(ksTwoSample([1, 1, 1], [2, 2])[0], 1.0)      # ties stepped over together
+
+    def test_same_and_shifted(self):
+        rng = random.Random(41)
+        a = [rng.random() for i in range(1000)]
+        b = [rng.random() for i in range(800)]
+        self.assertGreater(ksTwoSample(a, b)[1], 0.01)
+        self.assertLess(ksTwoSample(a, [value + 0.15 for value in b])[1], 1e-6)
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            ksTwoSample([], [1])
+
+
+class ChiSquareTest(unittest.TestCase):
+
+    def test_gamma_q(self):
+        for x in (0.1, 1.0, 3.0, 10.0):
+            self.assertAlmostEqual(gammaQ(1.0, x), math.exp(-x), places=12)               # 2 degrees of freedom
+            self.assertAlmostEqual(gammaQ(0.5, x), math.erfc(math.sqrt(x)), places=12)    # 1 degree of freedom
+        self.assertEqual(gammaQ(2.0, 0.0), 1.0)
+
+    def test_same_and_different(self):
+        rng = random.Random(41)
+        a = [min(3, int(rng.expovariate(2.0))) for i in range(2000)]
+        b = [min(3, int(rng.expovariate(2.0))) for i in range(2000)]
+        c = [min(3, int(rng.expovariate(1.0))) for i in range(2000)]
+        self.assertEqual(chiSquareTwoSample(a, a)[0], 0.0)
+        self.assertGreater(chiSquareTwoSample(a, b)[1], 0.01)
+        self.assertLess(chiSquareTwoSample(a, c)[1], 1e-6)
+
+    def test_one_cell(self):
+        self.assertEqual(chiSquareTwoSample([0] * 10, [0] * 12), (0.0, 1.0))
+
+
+class CompareEnginesTest(unittest.TestCase):
+
+    def test_bernoulli_passes(self):
+        config = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=200)
+        configurations = [("Uniform", {"walletWeightDistribution": "Uniform"}),
+                          ("fixed target", {"walletWeightDistribution": "Uniform", "useRetarget": False})]
+        report = compareEngines("bernoulli", config, numBlocks=300, configurations=configurations)
+        self.assertTrue(report["passed"])
+        self.assertEqual(report["threshold"], 0.01 / 6)
+        self.assertEqual(len(report["configurations"]), 2)
+
+    def test_biased_engine_fails(self):
+        # an engine that checks every step at twice the target solves about twice as fast
+
+        class BiasedEngine(engines.BernoulliEngine):
+
+            name = "biased"
+
+            def checkStep(self, population, stepTarget, secondBite):
+                return(engines.BernoulliEngine.checkStep(self, population, 2 * stepTarget, secondBite))
+
+        config = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=200)
+        configurations = [("fixed target", {"walletWeightDistribution": "Uniform", "useRetarget": False})]
+        with mock.patch.dict(engines.ENGINES, {BiasedEngine.name: BiasedEngine}):
+            report = compareEngines("biased", config, numBlocks=300, configurations=configurations)
+
+        self.assertFalse(report["passed"])
+        steps = report["configurations"][0]["tests"][0]
+        self.assertEqual(steps["metric"], "steps")
+        self.assertFalse(steps["passed"])
+        self.assertLess(steps["candidateMean"], steps["referenceMean"])
+        self.assertNotIn("biased", engines.ENGINES)
+
+
+if __name__ == "__main__":
+    unittest.main()
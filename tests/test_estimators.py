@@ -0,0 +1,75 @@
+'''
+Scoring estimators: lag is measured on step changes only, not on ramps and churn.
+'''
+
+import random
+import statistics
+import unittest
+
+from qlbes.estimators import EstimatorScore, MedianEstimator
+
+
+def follow(score, trueWeights, rate=0.1):
+    # an estimate that moves a fraction rate of the way to the true weight every block
+
+    estimate = trueWeights[0]
+    for trueNetworkWeight in trueWeights:
+        estimate += rate * (trueNetworkWeight - estimate)
+        score.add(estimate, trueNetworkWeight)
+    return(score.summary())
+
+
+class EstimatorScoreTest(unittest.TestCase):
+
+    def test_step_change(self):
+        # 1 - 0.9^10 = 65.1% is the first to pass 63.2%, the estimate moves on the block of the change
+
+        summary = follow(EstimatorScore("follow"), [20000000] * 100 + [25000000] * 100)
+        self.assertEqual(summary["stepChanges"], 1)
+        self.assertEqual(summary["lag"], 9)
+
+    def test_ramp_and_churn_are_not_steps(self):
+        rng = random.Random(31)
+        trueWeights = [20000000 + 5000 * block + rng.randint(-20000, 20000) for block in range(1000)]
+        summary = follow(EstimatorScore("follow"), trueWeights)
+        self.assertEqual(summary["stepChanges"], 0)
+        self.assertIsNone(summary["lag"])
+
+    def test_steps_on_a_ramp(self):
+        trueWeights = [20000000 + 5000 * block for block in range(600)]
+        for block in range(200, 600):
+            trueWeights[block] += 4000000
+        for block in range(400, 600):
+            trueWeights[block] -= 8000000
+        summary = follow(EstimatorScore("follow"), trueWeights)
+        self.assertEqual(summary["stepChanges"], 2)
+
+    def test_threshold(self):
+        trueWeights = [20000000] * 100 + [20400000] * 100        # 2%
+        self.assertEqual(follow(EstimatorScore("follow"), trueWeights)["stepChanges"], 0)
+        self.assertEqual(follow(EstimatorScore("follow", stepThreshold=0.01), trueWeights)["stepChanges"], 1)
+
+    def test_exact_estimate(self):
+        score = EstimatorScore("exact")
+        for trueNetworkWeight in [20000000] * 50 + [30000000] * 50:
+            score.add(trueNetworkWeight, trueNetworkWeight)
+        summary = score.summary()
+        self.assertEqual((summary["bias"], summary["rmse"], summary["noise"]), (0.0, 0.0, 0.0))
+        self.assertEqual(summary["lag"], 0)
+
+
+class MedianEstimatorTest(unittest.TestCase):
+
+    def test_median_of_window(self):
+        rng = random.Random(5)
+        estimator = MedianEstimator(window=21, scalingFactor=1.0)
+        estimator.reset(1000.0)
+        window = [1000.0] * 21
+        for block in range(300):
+            dDiff = rng.uniform(500.0, 5000.0)
+            window = window[1:] + [dDiff]
+            self.assertEqual(estimator.update(dDiff, 128), statistics.median(window))
+
+
+if __name__ == "__main__":
+    unittest.main()
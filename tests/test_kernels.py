@@ -0,0 +1,59 @@
+'''
+The whole-series kernels against the per-block estimators.
+'''
+
+import math
+import random
+import unittest
+from array import array
+
+from qlbes.estimators import CascadedEMAEstimator, PoSIntervalEstimator
+from qlbes.kernels import cascadedEMA, incrementalEstimates, kernelEstimates, windowSums
+
+
+def chain(numBlocks, seed=1):
+    # difficulties and spacings with offsets within the step, as with useNormalDistributionForOffset
+
+    rng = random.Random(seed)
+    difficulties = array('d', (3400000.0 * rng.lognormvariate(0.0, 0.3) for block in range(numBlocks)))
+    spacings = array('d', (16 * rng.randint(1, 40) + rng.random() for block in range(numBlocks)))
+    return(difficulties, spacings)
+
+
+class KernelTest(unittest.TestCase):
+
+    def test_ema_matches_exactly(self):
+        difficulties, spacings = chain(5000)
+        for depth, roundTo in [(4, 250), (4, 0), (1, 250), (6, 0), (8, 250)]:
+            estimator = CascadedEMAEstimator(121, depth, 5.59, roundTo, alpha=0.0164)
+            estimates = kernelEstimates(estimator, difficulties, spacings, difficulties[0])
+            self.assertEqual(list(estimates), incrementalEstimates(estimator, difficulties, spacings, difficulties[0]))
+
+    def test_pos_interval_within_tolerance(self):
+        difficulties, spacings = chain(50000)
+        estimator = PoSIntervalEstimator(72)
+        estimates = kernelEstimates(estimator, difficulties, spacings, difficulties[0])
+        incremental = incrementalEstimates(estimator, difficulties, spacings, difficulties[0])
+        self.assertEqual(len(estimates), len(incremental))
+        for estimate, expected in zip(estimates, incremental):
+            if expected is None:
+                self.assertTrue(math.isnan(estimate))
+            else:
+                self.assertLess(abs(estimate - expected) / expected, 1e-9)
+
+    def test_window_sums_exact(self):
+        values, spacings = chain(20000)
+        sums = windowSums(spacings, 72)
+        for start in range(0, len(spacings) - 72 + 1, 997):
+            self.assertEqual(sums[start], math.fsum(spacings[start:start + 72]))
+
+    def test_cascaded_ema_depths(self):
+        values, spacings = chain(1000)
+        for depth in range(0, 10):
+            estimator = CascadedEMAEstimator(121, depth, 1.0, 0, alpha=0.0164)
+            expected = incrementalEstimates(estimator, values, spacings, 3000000.0) if depth else list(values)
+            self.assertEqual(list(cascadedEMA(values, 0.0164, depth, 3000000.0)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
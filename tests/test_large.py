@@ -0,0 +1,81 @@
+'''
+Large populations keep the same books as Population, and the thinning draw
+gives every wallet its own chance of a solution.
+'''
+
+import random
+import unittest
+
+from qlbes.large import LargePopulation, WeightClasses
+from qlbes.population import Population
+
+
+class LargePopulationTest(unittest.TestCase):
+
+    def test_same_as_population(self):
+        weights = [(wallet * 37) % 500 + 1 for wallet in range(50)]
+        large = LargePopulation(weights)
+        small = Population(weights)
+
+        for population in (large, small):
+            population.addWeight(3, 1000)
+            population.setWeight(4, 0)
+            population.setStaking(5, False)
+            population.setStaking(6, False)
+            population.setStaking(6, True)
+            self.assertEqual(population.addWallets(13, 250), 50)
+
+        self.assertEqual(large.numWallets, 63)
+        self.assertEqual(large.trueNetworkWeight, small.trueNetworkWeight)
+        self.assertEqual(large.stakingWeight, small.stakingWeight)
+        for wallet in range(63):
+            self.assertEqual(large.weightOf(wallet), small.weightOf(wallet))
+            self.assertEqual(large.isStaking(wallet), small.isStaking(wallet), wallet)
+
+    def test_copy(self):
+        large = LargePopulation([10, 20, 30])
+        large.setStaking(1, False)
+        copy = large.copy()
+        copy.setStaking(0, False)
+        self.assertTrue(large.isStaking(0))
+        self.assertFalse(copy.isStaking(1))
+        self.assertEqual(copy.stakingWeight, 30)
+
+
+class ThinningTest(unittest.TestCase):
+
+    def test_certain_and_impossible(self):
+        # at scale 1/1000 a wallet of 1000 coins always solves, none of 0 coins or not staking
+
+        population = LargePopulation([1000, 0, 1000, 2000, 1000])
+        population.setStaking(2, False)
+        rand = random.Random(36).random
+        solvers = population.weightClasses.solvers(0.001, rand, population.weightOf, population.isStaking)
+        self.assertEqual(solvers, [0, 3, 4])
+
+    def test_moved_wallets(self):
+        population = LargePopulation([1000, 10, 1000])
+        population.setWeight(0, 0)           # out of its class, cannot solve
+        population.setWeight(1, 1000)        # into a new class, checked on its own
+        rand = random.Random(36).random
+        for i in range(20):
+            self.assertEqual(population.weightClasses.solvers(0.001, rand, population.weightOf, population.isStaking), [1, 2])
+
+    def test_solution_rate(self):
+        # 200 wallets of 100 coins at p = 0.01 and 200 of 1000 coins at p = 0.1
+
+        weights = [100, 1000] * 200
+        classes = WeightClasses(weights)
+        rand = random.Random(36).random
+        counts = [0, 0]
+        steps = 2000
+        for step in range(steps):
+            for wallet in classes.solvers(0.0001, rand, weights.__getitem__, lambda wallet: True):
+                counts[wallet % 2] += 1
+
+        self.assertAlmostEqual(counts[0] / (200 * 0.01 * steps), 1.0, delta=0.05)
+        self.assertAlmostEqual(counts[1] / (200 * 0.1 * steps), 1.0, delta=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
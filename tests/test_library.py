@@ -0,0 +1,78 @@
+'''
+Library populations: exact totals, the cache maps the same table again, bad
+parameters raise.
+'''
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from qlbes import library
+from qlbes.cache import CACHE_DIR_VARIABLE
+from qlbes.library import GENERATORS, generateWeights, libraryCacheName, libraryPopulation
+
+
+class GenerateTest(unittest.TestCase):
+
+    def test_exact_total(self):
+        for name in sorted(GENERATORS):
+            for numWallets, totalWeight in ((1, 1), (7, 7), (1000, 25000000), (333, 1000)):
+                weights = generateWeights(name, numWallets, totalWeight, 3)
+                self.assertEqual(len(weights), numWallets, name)
+                self.assertEqual(sum(weights), totalWeight, name)
+                self.assertGreaterEqual(min(weights), 1, name)
+
+    def test_same_seed_same_weights(self):
+        self.assertEqual(generateWeights("pareto", 500, 100000, 1), generateWeights("pareto", 500, 100000, 1))
+        self.assertNotEqual(generateWeights("pareto", 500, 100000, 1), generateWeights("pareto", 500, 100000, 2))
+
+    def test_bad_settings(self):
+        with self.assertRaises(ValueError):
+            generateWeights("pareto", 100, 1000, 0, {"beta": 2.0})
+        with self.assertRaises(ValueError):
+            generateWeights("zipf", 100, 1000, 0)
+        with self.assertRaises(ValueError):
+            generateWeights("uniform", 100, 99, 0)
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_VARIABLE: self.directory.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def test_second_load_maps_cached_table(self):
+        first = libraryPopulation("exchange", 2000, 5000000, seed=4)
+        path = os.path.join(self.directory.name, libraryCacheName("exchange", 2000, 5000000, 4))
+        modified = os.stat(path).st_mtime_ns
+
+        with mock.patch.object(library, "generateWeights", side_effect=AssertionError("generated again")):
+            second = libraryPopulation("exchange", 2000, 5000000, seed=4)
+        self.assertEqual(os.stat(path).st_mtime_ns, modified)
+        self.assertEqual(list(second.walletWeight), list(first.walletWeight))
+        self.assertEqual(list(second.walletWeight), list(generateWeights("exchange", 2000, 5000000, 4)))
+        self.assertEqual(second.trueNetworkWeight, 5000000)
+        self.assertEqual(list(second.stakingWallets()), list(first.stakingWallets()))
+
+    def test_parameters_in_cache_key(self):
+        self.assertNotEqual(libraryCacheName("pareto", 100, 1000, 0), libraryCacheName("pareto", 100, 1000, 0, {"alpha": 2.0}))
+        self.assertEqual(libraryCacheName("pareto", 100, 1000, 0), libraryCacheName("pareto", 100, 1000, 0, {"alpha": 1.16}))
+
+
+class MainTest(unittest.TestCase):
+
+    def test_usage_error(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(library.main([]), 2)
+        self.assertIn("usage", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+'''
+Aggregating the sample log shipped with the simulator.
+'''
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from qlbes import logs
+from qlbes.cache import CACHE_DIR_VARIABLE
+from qlbes.logs import SummaryTable, loadLogs, parseLog
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "1000 5000 45000 22 20 million QLBES_Log_13_Dec_2017.csv")
+
+
+def sampleSpacings():
+    # the spacing column of the block rows, read with the csv module
+
+    with open(SAMPLE_LOG, newline='') as inFile:
+        return([float(row[8]) for row in csv.reader(inFile) if row and row[0].isdigit() and row[8] != ""])
+
+
+class SampleLogTest(unittest.TestCase):
+
+    def test_parse(self):
+        sessions = parseLog(SAMPLE_LOG)
+        self.assertEqual(len(sessions), 1)
+        session = sessions[0]
+        self.assertEqual(session["notes"], [])
+
+        settings = session["settings"]
+        self.assertEqual(settings["wallets"], 1000)
+        self.assertEqual(settings["blocks"], 5000)
+        self.assertEqual(settings["distribution"], "Mainnet")
+        self.assertEqual(settings["randomNumbers"], "secrets")
+        self.assertEqual(settings["retarget"], True)
+        self.assertEqual(settings["targetScaling"], "1.05 from step 16")
+        self.assertEqual(settings["trueNetworkWeight"], 20026263)
+
+        run, = session["runs"]
+        self.assertEqual((run["run"], run["paramLabel"], run["aveSeconds"], run["fiveXSpacingBlocks"],
+                          run["maxSeconds"], run["collisions"]), (0, 22, 128.0608, 3, 736, 323))
+
+        spacings = sampleSpacings()
+        blocks = run["blockSection"]
+        self.assertEqual(blocks["rows"], len(spacings))
+        self.assertEqual((blocks["firstBlock"], blocks["lastBlock"]), (0, 4999))
+        self.assertAlmostEqual(blocks["spacingMean"], sum(spacings) / len(spacings))
+        self.assertAlmostEqual(blocks["spacingMean"], run["aveSeconds"])
+        self.assertEqual(blocks["fiveXSpacingBlocks"], sum(1 for spacing in spacings if spacing >= 640))
+        self.assertEqual(blocks["maxSpacing"], run["maxSeconds"])
+
+    def test_summary_table(self):
+        table = SummaryTable({SAMPLE_LOG: parseLog(SAMPLE_LOG)})
+        self.assertEqual(len(table.rows), 1)
+        row = table.rows[0]
+        self.assertEqual(row["file"], os.path.basename(SAMPLE_LOG))
+        self.assertEqual(row["blockRows"], 5000)
+        self.assertEqual(table.select(distribution="Mainnet", paramLabel=22), [row])
+        self.assertEqual(table.select(distribution="Uniform"), [])
+        with self.assertRaises(ValueError):
+            table.select(colour="red")
+
+    def test_cached_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with mock.patch.dict(os.environ, {CACHE_DIR_VARIABLE: directory}):
+            first = loadLogs([SAMPLE_LOG], processes=1)
+            with mock.patch.object(logs, "parseLog", side_effect=AssertionError("parsed again")):
+                second = loadLogs([SAMPLE_LOG], processes=1)
+        self.assertEqual(second, first)
+        self.assertEqual(first[SAMPLE_LOG][0]["runs"][0]["collisions"], 323)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+'''
+The orphan model: no orphans without a delay, every extra solver orphaned
+when blocks never arrive in time, and the chain the same with it on or off.
+'''
+
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.orphans import orphanModel
+from qlbes.simulator import makeRng, simulateBlocks
+from qlbes.statistics import RunStatistics
+
+CONFIG = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=100, numBlocks=200,
+                          engine="bernoulli", useOrphanModel=True)
+
+
+class OrphanModelTest(unittest.TestCase):
+
+    def test_off(self):
+        self.assertIsNone(orphanModel(CONFIG.replace(useOrphanModel=False)))
+
+    def test_no_delay_no_orphans(self):
+        # a fixed delay far below the spread of the offsets, the first block reaches every later solver
+
+        model = orphanModel(CONFIG.replace(propagationDelayMedian=1e-9, propagationDelaySigma=0.0))
+        self.assertEqual(model.orphanCounts([1, 2, 3, 5, 10] * 200), [0] * 1000)
+
+    def test_long_delay_all_orphans(self):
+        model = orphanModel(CONFIG.replace(propagationDelayMedian=1e6, propagationDelaySigma=0.0))
+        self.assertEqual(model.orphanCounts([0, 1, 2, 3, 5, 10]), [0, 0, 1, 2, 4, 9])
+
+    def test_same_seed_same_orphans(self):
+        counts = [2, 3, 4] * 100
+        self.assertEqual(orphanModel(CONFIG).orphanCounts(counts), orphanModel(CONFIG).orphanCounts(counts))
+        self.assertNotEqual(orphanModel(CONFIG).orphanCounts(counts), orphanModel(CONFIG, run=1).orphanCounts(counts))
+
+    def test_run_statistics(self):
+        config = CONFIG.replace(propagationDelayMedian=1e6, propagationDelaySigma=0.0)
+        statistics = RunStatistics(orphanModel=orphanModel(config))
+        records = list(simulateBlocks(config, rng=makeRng(config)))
+        for record in records:
+            statistics.add(record)
+        summary = statistics.summary()
+        self.assertGreater(summary["collisionCount"], 0)
+        self.assertEqual(summary["orphanCount"], summary["collisionCount"])
+
+        # the model has a random stream of its own, the chain does not change
+
+        plain = CONFIG.replace(useOrphanModel=False)
+        self.assertEqual(list(simulateBlocks(plain, rng=makeRng(plain))), records)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+'''
+Sharded runs give the same records in every shard mode, in this process and
+inside the worker of a multiprocessing pool (the workers of sweep.py).
+'''
+
+import multiprocessing
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.parallel import resolveShardMode
+from qlbes.simulator import simulateBlocks
+from qlbes.sweep import runTasks
+
+SHARDED = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=400, numBlocks=40,
+                           engine="bernoulli", numShards=4, shardWorkers=2)
+
+
+def shardedRecords(mode):
+    return(list(simulateBlocks(SHARDED.replace(shardMode=mode))))
+
+
+def poolMode(mode):
+    return(resolveShardMode(SHARDED.replace(shardMode=mode), 2))
+
+
+class ShardModeTest(unittest.TestCase):
+
+    def test_modes_match_serial(self):
+        serial = shardedRecords("serial")
+        for mode in ("threads", "processes", "auto"):
+            self.assertEqual(shardedRecords(mode), serial, mode)
+
+    def test_modes_match_serial_in_pool(self):
+        serial = shardedRecords("serial")
+        with multiprocessing.Pool(2) as pool:
+            for mode in ("serial", "threads", "processes", "auto"):
+                self.assertEqual(pool.apply(shardedRecords, (mode,)), serial, mode)
+
+    def test_pool_worker_uses_threads(self):
+        with multiprocessing.Pool(1) as pool:
+            self.assertEqual(pool.apply(poolMode, ("processes",)), "threads")
+            self.assertEqual(pool.apply(poolMode, ("auto",)), "threads")
+            self.assertEqual(pool.apply(poolMode, ("serial",)), "serial")
+
+    def test_sweep_of_shard_modes(self):
+        tasks = [(0, "shardMode", mode) for mode in ("serial", "threads", "processes", "auto")]   # one random stream
+        results = runTasks(SHARDED, tasks, processes=2)
+        summaries = [result["summary"] for result in results]
+        for summary in summaries[1:]:
+            self.assertEqual(summary, summaries[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+'''
+Runs start from a shared base population through views of their own, as the
+script and sweeps do: a fresh view restores the base weights and nothing a run
+changes leaks into the next.
+'''
+
+import unittest
+
+from qlbes.population import Population, PopulationSnapshot
+
+WEIGHTS = [round(25000000 / 200)] * 200
+
+
+def runChanges(population):
+    # the Multi mode and wallet growth of the script, wallets 10 to 19 change, 20 wallets added
+
+    for wallet in range(10, 20):
+        population.addWeight(wallet, -41250)
+    population.addWallets(20, 10000)
+
+
+class RunResetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = PopulationSnapshot(Population(WEIGHTS))
+
+    def test_reset_restores_base(self):
+        first = self.base.view()
+        runChanges(first)
+        self.assertEqual(first.weightOf(10), 125000 - 41250)
+        self.assertEqual(first.numWallets, 220)
+        self.assertEqual(len(first.stakingWallets()), 220)
+
+        second = self.base.view()
+        self.assertEqual([second.weightOf(wallet) for wallet in range(second.numWallets)], WEIGHTS)
+        self.assertEqual(second.trueNetworkWeight, sum(WEIGHTS))
+        self.assertIs(second.stakingWallets(), self.base.stakingWallets())      # shared, nothing copied
+
+    def test_no_leaks_between_runs(self):
+        first, second = self.base.view(), self.base.view()
+        runChanges(first)
+        runChanges(second)
+        self.assertEqual(second.stakingWallets(), first.stakingWallets())
+        self.assertEqual(second.trueNetworkWeight, sum(WEIGHTS) - 412500 + 200000)
+        self.assertEqual(list(self.base.walletWeight), WEIGHTS)
+        self.assertEqual(len(self.base.stakingWallets()), 200)
+
+    def test_changes_stay_in_overlay(self):
+        view = self.base.view()
+        runChanges(view)
+        self.assertEqual(sorted(view.overlayWeight), list(range(10, 20)))
+        self.assertEqual(len(view.newWeight), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
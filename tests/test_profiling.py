@@ -0,0 +1,50 @@
+'''
+The total column of the hot function table is inclusive time in both modes.
+'''
+
+import unittest
+
+from qlbes.profiling import hotFunctions, makeProfiler
+
+
+def inner():
+    total = 0
+    for i in range(20000):
+        total += i * i
+    return(total)
+
+
+def outer():
+    # some time of its own, so it has a row, and most of it in inner()
+
+    total = 0
+    for i in range(30):
+        total += inner()
+        for j in range(5000):
+            total += j
+    return(total)
+
+
+class HotFunctionsTest(unittest.TestCase):
+
+    def totals(self, mode):
+        profiler = makeProfiler(mode, 0.001)
+        profiler.start()
+        for i in range(5):
+            outer()
+        profiler.stop()
+        rows = hotFunctions(profiler.weightedStacks(), 1000, profiler.totalSeconds())
+        return({function.partition(":")[2]: total for function, own, total in rows}, profiler.seconds)
+
+    def test_cprofile_total_is_inclusive(self):
+        totals, seconds = self.totals("cprofile")
+        self.assertGreaterEqual(totals["outer"], totals["inner"])
+        self.assertGreater(totals["outer"], 0.9 * seconds)
+
+    def test_sample_total_is_inclusive(self):
+        totals, seconds = self.totals("sample")
+        self.assertGreaterEqual(totals["outer"], totals["inner"])
+
+
+if __name__ == "__main__":
+    unittest.main()
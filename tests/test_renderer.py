@@ -0,0 +1,46 @@
+'''
+Rows waiting in the renderer are written on time, even when no other row follows.
+'''
+
+import io
+import time
+import unittest
+
+from qlbes.renderer import BlockRenderer
+
+
+def addRow(renderer, block, spacing):
+    renderer.row(block, 3, 1000.0, 25000000, 25000000, None, 10 ** 60, 1.5, spacing)
+
+
+class FlushTest(unittest.TestCase):
+
+    def test_threshold_row_flushed_without_next_row(self):
+        stream = io.StringIO()
+        renderer = BlockRenderer(spacingThreshold=640, flushSeconds=0.05, stream=stream)
+        self.assertTrue(renderer.wants(1, 700))
+        addRow(renderer, 1, 700)
+        self.assertEqual(stream.getvalue(), "")
+
+        time.sleep(0.06)
+        self.assertFalse(renderer.wants(2, 128))
+        self.assertTrue(stream.getvalue().endswith("|   700.0\n"))
+        self.assertEqual(renderer.buffer, [])
+
+    def test_rows_batched(self):
+        stream = io.StringIO()
+        renderer = BlockRenderer(flushRows=5, flushSeconds=60, stream=stream)
+        for block in range(3):
+            if renderer.wants(block, 128):
+                addRow(renderer, block, 128)
+        self.assertEqual(stream.getvalue(), "")
+        addRow(renderer, 3, 128)                       # with the header, 5 lines waiting
+        self.assertEqual(stream.getvalue().count("|       3 |"), 4)
+
+    def test_every_nth_block(self):
+        renderer = BlockRenderer(everyNthBlock=10, stream=io.StringIO())
+        self.assertEqual([block for block in range(35) if renderer.wants(block, 128)], [0, 10, 20, 30])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+'''
+Spacing and difficulty replays of a short spacing difficulty file.
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from qlbes import replay
+from qlbes.config import SimulationConfig
+from qlbes.consensus import EASIEST_DIFFICULTY
+from qlbes.replay import difficultyReplay, readSpacingDifficultyFile, replayBatches, spacingReplay
+from qlbes.simulator import makeRng
+
+SPACINGS = [16, 128, 48, 704, 96, 32, 160, 1400, 64, 112]
+DIFFICULTIES = [3412624.968, 3417457.858, 3429582.953, 3439310.541, 3432030.293,
+                3434458.76, 3424772.291, 3441807.932, 3446682.151, 3444246.763]
+
+CONFIG = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=100, engine="bernoulli")
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.fileName = os.path.join(directory, "spacing_difficulty.txt")
+        with open(self.fileName, 'w') as outFile:
+            outFile.write("# blocks 35,700 - 35,709\n# starting block:\n35700\n")
+            for spacing, difficulty in zip(SPACINGS, DIFFICULTIES):
+                outFile.write("{},{}\n".format(spacing, difficulty))
+
+    def test_read(self):
+        rows = list(readSpacingDifficultyFile(self.fileName))
+        self.assertEqual(rows, [(35700 + i, SPACINGS[i], DIFFICULTIES[i]) for i in range(10)])
+
+        with open(self.fileName, 'a') as outFile:
+            outFile.write("16;3444246.763\n")
+        with self.assertRaises(ValueError):
+            list(readSpacingDifficultyFile(self.fileName))
+
+    def test_spacing_replay_without_retarget(self):
+        # the difficulty stays at the first recorded one, the spacing is the recorded spacing
+
+        rows = list(spacingReplay(self.fileName, CONFIG.replace(useRetarget=False)))
+        self.assertEqual([row.block for row in rows], list(range(35700, 35710)))
+        self.assertEqual([row.spacing for row in rows], SPACINGS)
+        self.assertEqual([row.recordedDifficulty for row in rows], DIFFICULTIES)
+        for row in rows:
+            self.assertAlmostEqual(row.difficulty, DIFFICULTIES[0], delta=1e-9 * DIFFICULTIES[0])
+
+    def test_spacing_replay_retarget(self):
+        # pow.cpp line 92 - 93 on the recorded spacing, capped at 1280 seconds
+
+        config = CONFIG.replace(targetMultiplier=25000)
+        rows = list(spacingReplay(self.fileName, config))
+        target = EASIEST_DIFFICULTY / DIFFICULTIES[0]
+        for row, spacing in zip(rows, SPACINGS):
+            self.assertAlmostEqual(row.difficulty / (EASIEST_DIFFICULTY / target), 1.0, places=12)
+            spacing = min(spacing, 1280)
+            target = target * (25000 + 2 * spacing) / (25000 + 256)
+
+    def test_difficulty_replay(self):
+        rows = list(difficultyReplay(self.fileName, CONFIG, rng=makeRng(CONFIG)))
+        self.assertEqual([row.block for row in rows], list(range(35700, 35710)))
+        self.assertEqual([row.difficulty for row in rows], DIFFICULTIES)
+        self.assertEqual([row.recordedSpacing for row in rows], SPACINGS)
+        self.assertTrue(all(row.spacing > 0 for row in rows))
+
+    def test_batches(self):
+        rows = list(spacingReplay(self.fileName, CONFIG))
+        batches = list(replayBatches(rows, 4))
+        self.assertEqual([batch["blocks"] for batch in batches], [4, 4, 2])
+        self.assertEqual([(batch["firstBlock"], batch["lastBlock"]) for batch in batches],
+                         [(35700, 35703), (35704, 35707), (35708, 35709)])
+        self.assertEqual(sum(batch["recordedLongBlocks"] for batch in batches), 2)
+        self.assertAlmostEqual(sum(batch["recordedSpacingMean"] * batch["blocks"] for batch in batches), sum(SPACINGS))
+
+    def test_usage_error(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(replay.main(["sideways", self.fileName]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+'''
+The day and week rollups of a run add up to the whole-run totals.
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.rollups import readRollups, runWithRollups
+from qlbes.simulator import makeRng
+
+CONFIG = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=100, numBlocks=260,
+                          engine="bernoulli", useOrphanModel=True)
+WINDOWS = (("day", 50), ("week", 120))
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.fileName = os.path.join(self.directory, "trace.jsonl")
+        self.summary = runWithRollups(CONFIG, self.fileName, WINDOWS, rng=makeRng(CONFIG))
+
+    def test_windows_add_up(self):
+        self.assertEqual(self.summary["numBlocks"], 260)
+
+        for name, size, count in (("day", 50, 6), ("week", 120, 3)):
+            rollups = list(readRollups(self.fileName, name))
+            self.assertEqual(len(rollups), count, name)
+            self.assertEqual([rollup["index"] for rollup in rollups], list(range(count)))
+            self.assertEqual([rollup["partial"] for rollup in rollups], [False] * (count - 1) + [True])
+            self.assertEqual([rollup["numBlocks"] for rollup in rollups[:-1]], [size] * (count - 1))
+            self.assertEqual(rollups[0]["firstBlock"], 0)
+            for previous, rollup in zip(rollups, rollups[1:]):
+                self.assertEqual(rollup["firstBlock"], previous["lastBlock"] + 1)
+
+            self.assertEqual(sum(rollup["numBlocks"] for rollup in rollups), self.summary["numBlocks"])
+            for total in ("fiveXSpacingBlocks", "collisionCount", "orphanCount"):
+                self.assertEqual(sum(rollup[total] for rollup in rollups), self.summary[total], name + " " + total)
+            self.assertAlmostEqual(sum(rollup["aveSeconds"] * rollup["numBlocks"] for rollup in rollups),
+                                   self.summary["aveSeconds"] * self.summary["numBlocks"])
+            self.assertEqual(max(rollup["maxSeconds"] for rollup in rollups), self.summary["maxSeconds"])
+
+    def test_store_lines(self):
+        with open(self.fileName) as inFile:
+            records = [json.loads(line) for line in inFile]
+        self.assertEqual(records[0]["type"], "header")
+        self.assertEqual(records[0]["fingerprint"], CONFIG.fingerprint())
+        self.assertEqual(records[-1], dict({"type": "run"}, **self.summary))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+'''
+Churn events: untilBlock is needed, the leave rate holds as churn builds up,
+and the staking list of churn follows the other events without being made again.
+'''
+
+import random
+import unittest
+
+from qlbes.population import Population
+from qlbes.scenarios import Scenario
+
+
+def stakingCount(population):
+    return(sum(1 for wallet in range(population.numWallets) if population.isStaking(wallet)))
+
+
+class ChurnTest(unittest.TestCase):
+
+    def test_churn_needs_until_block(self):
+        with self.assertRaises(ValueError):
+            Scenario([{"block": 0, "type": "churn", "leaveRate": 0.1}])
+        with self.assertRaises(ValueError):
+            Scenario([{"block": 50, "type": "churn", "untilBlock": 50, "leaveRate": 0.1}])
+
+    def test_leave_rate_of_staking_wallets(self):
+        # 2,000 churn blocks at 0.0005 leave 63% of the wallets, expected 7,356 of 20,000 staying
+
+        population = Population([1000] * 20000)
+        run = Scenario([{"block": 0, "type": "churn", "untilBlock": 2001, "leaveRate": 0.0005}]).start(
+            population, random.Random(1))
+        for block in range(2002):
+            run.apply(block)
+        expected = 20000 * (1 - 0.0005) ** 2000
+        self.assertLess(abs(stakingCount(population) - expected), 4 * expected ** 0.5)
+        self.assertEqual(population.stakingWeight, 1000 * stakingCount(population))
+
+    def test_joined_wallets_can_leave(self):
+        population = Population([1000] * 10)
+        run = Scenario([{"block": 0, "type": "churn", "untilBlock": 3001, "leaveRate": 0.01, "joinRate": 1.0,
+                         "weight": 500}]).start(population, random.Random(2))
+        for block in range(3002):
+            run.apply(block)
+        left = population.numWallets - stakingCount(population)
+        self.assertTrue(any(population.weightOf(wallet) == 0 for wallet in range(10, population.numWallets)))
+        self.assertGreater(left, 0)
+        self.assertEqual(population.stakingWeight, sum(population.walletWeight))
+
+
+class CountingPopulation(Population):
+    # counts isStaking calls, a remade staking list calls it once per wallet
+
+    calls = 0
+
+    def isStaking(self, wallet):
+        self.calls += 1
+        return(Population.isStaking(self, wallet))
+
+
+class CombinedEventsTest(unittest.TestCase):
+
+    def checkStakingList(self, run, population):
+        staking = [wallet for wallet in range(population.numWallets) if Population.isStaking(population, wallet)]
+        self.assertEqual(sorted(run.staking), staking)
+        self.assertEqual({wallet: index for index, wallet in enumerate(run.staking)}, run.stakingIndex)
+
+    def test_ramp_and_churn(self):
+        # the ramp changes weights every block, churn makes its list only once
+
+        population = CountingPopulation([1000] * 5000)
+        run = Scenario([{"block": 0, "type": "ramp", "wallets": {"from": 0, "to": 100}, "change": 5000,
+                         "overBlocks": 400},
+                        {"block": 0, "type": "churn", "untilBlock": 401, "leaveRate": 0.001, "joinRate": 0.5,
+                         "weight": 700}]).start(population, random.Random(3))
+        for block in range(402):
+            run.apply(block)
+        self.assertEqual(population.calls, 5000)
+        self.checkStakingList(run, population)
+        self.assertEqual(population.stakingWeight, sum(population.weightOf(wallet) for wallet in run.staking))
+
+    def test_events_during_churn(self):
+        population = Population([1000] * 300)
+        run = Scenario([{"block": 0, "type": "churn", "untilBlock": 600, "leaveRate": 0.002, "joinRate": 0.3,
+                         "weight": 500},
+                        {"block": 50, "type": "stopStaking", "wallets": {"from": 0, "to": 40}},
+                        {"block": 100, "type": "join", "wallets": 20, "weight": 9000, "label": "whales"},
+                        {"block": 200, "type": "startStaking", "wallets": {"from": 0, "to": 20}},
+                        {"block": 300, "type": "leave", "wallets": "whales"},
+                        {"block": 350, "type": "startStaking", "wallets": {"from": 0, "to": 20}, "every": 100}
+                        ]).start(population, random.Random(4))
+        for block in range(601):
+            run.apply(block)
+            if block % 50 == 1:
+                self.checkStakingList(run, population)
+        self.checkStakingList(run, population)
+        self.assertFalse(any(population.isStaking(wallet) for wallet in run.labels["whales"]))
+        self.assertEqual(population.stakingWeight,
+                         sum(population.weightOf(wallet) for wallet in run.staking))
+
+
+if __name__ == "__main__":
+    unittest.main()
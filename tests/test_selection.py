@@ -0,0 +1,137 @@
+'''
+WeightIndex against linear scans, the Poisson draws, and indexSolvers.
+'''
+
+import math
+import random
+import unittest
+
+from qlbes.population import Population
+from qlbes.selection import WeightIndex, indexSolvers, poisson
+
+
+def linearFind(weights, u):
+    # the first wallet whose prefix sum including itself is greater than u
+
+    total = 0
+    for wallet, weight in enumerate(weights):
+        total += weight
+        if total > u:
+            return(wallet)
+    return(len(weights) - 1)
+
+
+class WeightIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(38)
+        self.rng = rng
+        self.weights = [rng.choice((0, 0, 1, 7, rng.randint(1, 100000))) for wallet in range(1000)]
+        self.index = WeightIndex(self.weights)
+
+    def check(self):
+        index = self.index
+        weights = self.weights
+        self.assertEqual(index.numWallets, len(weights))
+        self.assertEqual(index.total, sum(weights))
+        self.assertGreaterEqual(index.maxWeight, max(weights))
+        total = 0
+        for wallet, weight in enumerate(weights):
+            self.assertEqual(index.prefix(wallet), total)
+            self.assertEqual(index.weight(wallet), weight)
+            total += weight
+        self.assertEqual(index.prefix(len(weights)), total)
+
+    def checkFind(self):
+        index = self.index
+        weights = self.weights
+        edges = [index.prefix(wallet) for wallet in range(len(weights) + 1)]
+        values = [u for edge in edges for u in (edge - 1, edge) if 0 <= u < index.total]
+        values.extend(self.rng.randrange(index.total) for i in range(2000))
+        for u in values:
+            wallet = index.find(u)
+            self.assertEqual(wallet, linearFind(weights, u), u)
+            self.assertGreater(weights[wallet], 0)
+
+    def test_prefix_sums(self):
+        self.check()
+
+    def test_find(self):
+        self.checkFind()
+        for u in (0.0, 0.5, self.index.total - 0.5):     # the engine draws float positions
+            self.assertEqual(self.index.find(u), linearFind(self.weights, u))
+
+    def test_changes(self):
+        rng = self.rng
+        for change in range(500):
+            wallet = rng.randrange(len(self.weights))
+            kind = rng.randrange(3)
+            if kind == 0:
+                delta = rng.randint(-self.weights[wallet], 5000)
+                self.index.add(wallet, delta)
+                self.weights[wallet] += delta
+            elif kind == 1:
+                weight = rng.choice((0, rng.randint(1, 200000)))
+                self.index.set(wallet, weight)
+                self.weights[wallet] = weight
+            else:
+                weight = rng.choice((0, rng.randint(1, 50000)))
+                self.index.append(weight)
+                self.weights.append(weight)
+        self.check()
+        self.checkFind()
+
+    def test_from_population(self):
+        population = Population([5, 10, 20, 40], [1, 0, 1, 1])
+        index = WeightIndex.fromPopulation(population)
+        self.assertEqual([index.weight(wallet) for wallet in range(4)], [5, 0, 20, 40])
+        self.assertEqual(index.total, population.stakingWeight)
+
+    def test_empty(self):
+        index = WeightIndex()
+        self.assertEqual(index.total, 0)
+        index.append(3)
+        self.assertEqual(index.find(2), 0)
+
+
+class PoissonTest(unittest.TestCase):
+
+    def test_mean_and_variance(self):
+        rng = random.Random(1994)
+        draws = 20000
+        for mean in (0.1, 1.0, 4.5, 30.0, 31.0, 250.0):
+            values = [poisson(rng.random, mean) for i in range(draws)]
+            sampleMean = sum(values) / draws
+            sampleVariance = sum((value - sampleMean) ** 2 for value in values) / (draws - 1)
+            self.assertLess(abs(sampleMean - mean), 5.0 * math.sqrt(mean / draws), mean)
+            self.assertLess(abs(sampleVariance - mean), 0.1 * mean, mean)
+
+    def test_zero_mean(self):
+        self.assertEqual(poisson(random.Random(0).random, 0.0), 0)
+        self.assertEqual(poisson(random.Random(0).random, -1.0), 0)
+
+
+class IndexSolversTest(unittest.TestCase):
+
+    def test_chance_per_wallet(self):
+        # each wallet solves with probability scale x weight, independent of the others
+
+        weights = [1000, 5000, 0, 20000, 60000]
+        index = WeightIndex(weights)
+        scale = 1.0 / 100000
+        rng = random.Random(7)
+        trials = 40000
+        counts = [0] * len(weights)
+        for trial in range(trials):
+            solvers = indexSolvers(index, scale, rng.random, weights.__getitem__)
+            self.assertEqual(solvers, sorted(set(solvers)))
+            for wallet in solvers:
+                counts[wallet] += 1
+        for wallet, weight in enumerate(weights):
+            chance = scale * weight
+            error = 5.0 * math.sqrt(chance * (1.0 - chance) / trials) + 1e-12
+            self.assertLess(abs(counts[wallet] / trials - chance), error, wallet)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+'''
+The tornado ranks parameters by elasticity, not by the swing of steps of different sizes.
+'''
+
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.sensitivity import formatReport, sensitivity, tornado
+
+
+def metrics(elasticity, swing):
+    return({"ave secs": {"low": 100.0, "high": 100.0 + swing, "derivative": 0.0, "error": None,
+                         "elasticity": elasticity, "swing": swing, "crnGain": None}})
+
+
+REPORT = {"runs": 2, "base": {"ave secs": (120.0, None)}, "parameters": [
+    {"name": "targetMultiplier", "value": 15000, "low": 13500, "high": 16500, "metrics": metrics(-0.2, -4.8)},
+    {"name": "targetScalingFactor", "value": 1.05, "low": 1.04, "high": 1.06, "metrics": metrics(-3.0, -0.7)},
+    {"name": "startingStep", "value": 16, "low": 15, "high": 17, "metrics": metrics(None, 2.0)}]}
+
+
+class TornadoTest(unittest.TestCase):
+
+    def test_ranked_by_elasticity(self):
+        self.assertEqual([name for name, elasticity, swing in tornado(REPORT, "ave secs")],
+                         ["targetScalingFactor", "targetMultiplier", "startingStep"])
+
+    def test_elasticity_of_a_run(self):
+        config = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=100, numBlocks=200,
+                                  engine="bernoulli")
+        report = sensitivity(config, ["targetMultiplier"], runs=2)
+        result = report["parameters"][0]["metrics"]["ave secs"]
+        self.assertAlmostEqual(result["elasticity"],
+                               result["derivative"] * config.targetMultiplier / report["base"]["ave secs"][0])
+        self.assertEqual(tornado(report, "ave secs")[0][1], result["elasticity"])
+        self.assertIn("by elasticity", formatReport(report))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+'''
+Job requests are checked before anything runs, and finished jobs are capped.
+'''
+
+import asyncio
+import contextlib
+import io
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import Future
+
+from qlbes import service
+from qlbes.service import Job, JobService, runJob, submitJob
+
+SWEEP_SETTINGS = {"walletWeightDistribution": "Uniform", "numBlocks": 150, "engine": "bernoulli"}
+
+
+class JobServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = JobService(workers=1)
+        self.service.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.service.pool.shutdown()
+        self.service.loop.close()
+
+    def test_request_not_object(self):
+        for request in ([1], "x", 3, None):
+            with self.assertRaises(ValueError):
+                self.service.submit(request)
+
+    def test_bad_settings(self):
+        with self.assertRaises(ValueError):
+            self.service.submit({"settings": [1]})
+        with self.assertRaises(ValueError):
+            self.service.submit({"settings": {}, "name": "noSuchSetting", "values": [1]})
+
+    def finishJob(self, jobId):
+        job = self.service.jobs[jobId] = Job(jobId, {}, None, None, self.service.loop)
+        future = Future()
+        future.set_result([])
+        self.service.finish(job, future)
+        return(job)
+
+    def test_finished_jobs_capped(self):
+        jobs = [self.finishJob("job" + str(index)) for index in range(service.FINISHED_JOBS + 5)]
+        self.assertEqual(len(self.service.jobs), service.FINISHED_JOBS)
+        self.assertNotIn(jobs[0].id, self.service.jobs)
+        self.assertIn(jobs[-1].id, self.service.jobs)
+
+    def test_job_posted_again_kept(self):
+        self.finishJob("again")
+        again = self.finishJob("again")             # failed, run again and finished again
+        for index in range(service.FINISHED_JOBS - 1):
+            self.finishJob("job" + str(index))
+        self.assertIs(self.service.jobs["again"], again)
+
+
+class RunJobTest(unittest.TestCase):
+
+    def setUp(self):
+        service.workerQueue = queue.Queue()
+
+    def test_population_sweep(self):
+        # run 1 has the same random stream in both jobs, only the wallets differ
+
+        same = runJob("same", SWEEP_SETTINGS, "numUniformDistbnWallets", [100, 100])
+        result = runJob("larger", SWEEP_SETTINGS, "numUniformDistbnWallets", [100, 5000])
+        self.assertEqual(result[0]["summary"], same[0]["summary"])
+        self.assertNotEqual(result[1]["summary"], same[1]["summary"])
+
+
+def processesWith(text, seconds=5.0):
+    # the processes with text in their command line, waiting up to seconds for them to go
+
+    deadline = time.monotonic() + seconds
+    while True:
+        found = []
+        for pid in os.listdir("/proc"):
+            try:
+                with open(os.path.join("/proc", pid, "cmdline"), 'rb') as inFile:
+                    if text.encode() in inFile.read():
+                        found.append(int(pid))
+            except (OSError, ValueError):
+                pass
+        if not found or time.monotonic() > deadline:
+            return(found)
+        time.sleep(0.1)
+
+
+@unittest.skipUnless(os.path.isdir("/proc"), "lists processes from /proc")
+class UnixSocketTest(unittest.TestCase):
+
+    def test_submit_over_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socketPath = os.path.join(directory, "qlbes.sock")
+            server = subprocess.Popen([sys.executable, "-m", "qlbes.service", "serve", "--workers=1",
+                                       "--socket=" + socketPath], stdout=subprocess.DEVNULL,
+                                      cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            try:
+                for attempt in range(100):
+                    if os.path.exists(socketPath):
+                        break
+                    time.sleep(0.05)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    status = submitJob("", {"settings": dict(SWEEP_SETTINGS, numBlocks=50)}, True, socketPath)
+                self.assertEqual(status, 0)
+                self.assertIn('"status": "done"', output.getvalue())
+            finally:
+                server.terminate()
+                server.wait(10)
+            self.assertEqual(processesWith(socketPath), [])      # the workers stopped with the server
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+'''
+A population attached from a shared table runs exactly as the population it
+was published from.
+'''
+
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.population import Population, PopulationSnapshot
+from qlbes.shared import attachPopulation, publishPopulation
+from qlbes.simulator import makeRng, simulateBlocks
+
+WEIGHTS = [(wallet * 37) % 500 + 1 for wallet in range(300)]
+STAKING = [wallet % 7 != 3 for wallet in range(300)]
+
+
+def records(config, population):
+    return(list(simulateBlocks(config, population, makeRng(config))))
+
+
+class SharedTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = PopulationSnapshot(Population(WEIGHTS, STAKING))
+        self.table = publishPopulation(self.snapshot)
+        self.attached = attachPopulation(self.table.path)
+
+    def tearDown(self):
+        self.table.close()
+
+    def test_staking_wallets(self):
+        staking = self.attached.stakingWallets()
+        self.assertEqual(list(staking), self.snapshot.stakingWallets())
+        self.assertEqual(len(staking), len(self.snapshot.stakingWallets()))
+        self.assertEqual(staking[10:50], self.snapshot.stakingWallets()[10:50])
+
+    def test_all_staking(self):
+        snapshot = PopulationSnapshot(Population(WEIGHTS))
+        with publishPopulation(snapshot) as table:
+            self.assertEqual(list(attachPopulation(table.path).stakingWallets()), snapshot.stakingWallets())
+
+    def test_view_adds_wallets(self):
+        view, expected = self.attached.view(), self.snapshot.view()
+        for population in (view, expected):
+            population.addWallets(3, 1000)
+            population.setStaking(4, False)
+        self.assertEqual(view.stakingWallets(), expected.stakingWallets())
+
+    def test_engines_agree(self):
+        for engine in ("sha256", "bernoulli", "thinning", "index"):
+            config = SimulationConfig(numBlocks=150, engine=engine, useFixedSeed=True)
+            self.assertEqual(records(config, self.attached.view()), records(config, self.snapshot.view()), engine)
+
+    def test_shards_agree(self):
+        config = SimulationConfig(numBlocks=150, engine="bernoulli", numShards=4, shardMode="threads",
+                                  useFixedSeed=True)
+        self.assertEqual(records(config, self.attached.view()), records(config, self.snapshot.view()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Target scaling of the block loop against the step loop of the script.
+'''
+
+import hashlib
+import random
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.consensus import COIN
+from qlbes.population import Population
+from qlbes.simulator import simulateBlocks, startingTarget
+
+WEIGHTS = [(wallet * 53) % 2000 + 100 for wallet in range(60)]
+
+
+def scriptBlocks(config, numBlocks, seed):
+    # (step, solvers) per block, the step and wallet loops of the script with useTargetScaling = True,
+    # the retarget off, startingStep as paramValue
+
+    rng = random.Random(seed)
+    target = startingTarget(sum(WEIGHTS), config)
+    blocks = []
+    for block in range(numBlocks):
+        step = 1
+        while True:
+            solvers = []
+            for wallet in range(len(WEIGHTS)):
+                temp = str(rng.getrandbits(256)).encode('utf-8')
+                hashProofOfStake = int(hashlib.sha256(temp).hexdigest(), 16)
+                if step >= config.startingStep:
+                    if hashProofOfStake < (target * 2.0) * WEIGHTS[wallet] * COIN:
+                        solvers.append(wallet)
+                elif hashProofOfStake < target * WEIGHTS[wallet] * COIN:
+                    solvers.append(wallet)
+            if solvers:
+                break
+            step += 1
+        blocks.append((step, solvers))
+    return(blocks)
+
+
+class TargetScalingTest(unittest.TestCase):
+
+    config = SimulationConfig(engine="sha256", numBlocks=80, useRetarget=False, useTargetScaling=True,
+                              startingStep=3, startingDifficultySlope=0.5)
+
+    def simulatorBlocks(self, config):
+        return([(record.steps, list(record.solvers))
+                for record in simulateBlocks(config, Population(WEIGHTS), random.Random(9))])
+
+    def test_same_as_script(self):
+        blocks = self.simulatorBlocks(self.config)
+        self.assertEqual(blocks, scriptBlocks(self.config, 80, 9))
+        self.assertTrue(any(step >= 3 for step, solvers in blocks))
+
+    def test_compound_scaling(self):
+        # a factor of 1.0 compounds to the unscaled target, 2.0 goes past the doubling of the script
+
+        unscaled = self.simulatorBlocks(self.config.replace(useTargetScaling=False))
+        compound = self.config.replace(compoundTargetScaling=True, targetScalingFactor=1.0)
+        self.assertEqual(self.simulatorBlocks(compound), unscaled)
+        self.assertNotEqual(self.simulatorBlocks(compound.replace(targetScalingFactor=2.0)),
+                            self.simulatorBlocks(self.config))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+'''
+Staking snapshots: the CSV, binary and population file formats, the filters,
+and the cache of the parsed population.
+'''
+
+import os
+import struct
+import tempfile
+import unittest
+from array import array
+from unittest import mock
+
+from qlbes import snapshots
+from qlbes.cache import CACHE_DIR_VARIABLE
+from qlbes.population import Population
+from qlbes.snapshots import (filterWeights, loadSnapshot, populationFromBytes, readPopulationFile,
+                             readSnapshotWeights, snapshotCacheName, writePopulationFile)
+
+SNAPSHOT_CSV = '''# staking snapshot
+address,weight
+QeZjXLEyHQmG9ByHKbPqPCBMzWsbPXRERq,1540561.25
+QNLKLJs8XCBUpu4pz1tdVyi7PKSD2ieP2x,1419648
+
+Qaddress3,12
+Qaddress4,700
+'''
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {CACHE_DIR_VARIABLE: os.path.join(self.directory.name, "cache")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def writeFile(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as outFile:
+            outFile.write(data)
+        return(path)
+
+    def test_csv(self):
+        path = self.writeFile("snapshot.csv", SNAPSHOT_CSV.encode('utf-8'))
+        self.assertEqual(list(readSnapshotWeights(path)), [1540561, 1419648, 12, 700])
+        self.assertEqual(list(readSnapshotWeights(path, divisor=100)), [15405, 14196, 0, 7])
+
+    def test_csv_bad_line(self):
+        path = self.writeFile("snapshot.csv", (SNAPSHOT_CSV + "Qaddress5,lots\n").encode('utf-8'))
+        with self.assertRaises(ValueError):
+            readSnapshotWeights(path)
+
+    def test_binary(self):
+        path = self.writeFile("snapshot.bin", struct.pack("<3q", 5, 10, 15))
+        self.assertEqual(list(readSnapshotWeights(path)), [5, 10, 15])
+        shortPath = self.writeFile("short.bin", struct.pack("<3q", 5, 10, 15)[:-1])
+        with self.assertRaises(ValueError):
+            readSnapshotWeights(shortPath)
+
+    def test_filters(self):
+        weights = array('q', [5, 500, 50, 5000, 1])
+        self.assertEqual(list(filterWeights(weights, minWeight=50)), [500, 50, 5000])
+        self.assertEqual(list(filterWeights(weights, topN=2)), [5000, 500])
+        self.assertEqual(list(filterWeights(weights, minWeight=10, topN=5)), [5000, 500, 50])
+
+    def test_population_file_round_trip(self):
+        population = Population([3, 1, 4, 1, 5], bytearray([1, 0, 1, 1, 0]))
+        path = os.path.join(self.directory.name, "population.bin")
+        writePopulationFile(path, population)
+
+        again = readPopulationFile(path)
+        self.assertEqual(list(again.walletWeight), [3, 1, 4, 1, 5])
+        self.assertEqual(list(again.walletStaking), [1, 0, 1, 1, 0])
+        self.assertEqual(list(readSnapshotWeights(path)), [3, 1, 4, 1, 5])
+
+        with open(path, 'rb') as inFile:
+            data = inFile.read()
+        with self.assertRaises(ValueError):
+            populationFromBytes(data[:-1])
+
+    def test_cached_load(self):
+        path = self.writeFile("snapshot.csv", SNAPSHOT_CSV.encode('utf-8'))
+        first = loadSnapshot(path, minWeight=100)
+        self.assertEqual(list(first.walletWeight), [1540561, 1419648, 700])
+
+        with mock.patch.object(snapshots, "readSnapshotWeights", side_effect=AssertionError("parsed again")):
+            second = loadSnapshot(path, minWeight=100)
+        self.assertEqual(list(second.walletWeight), list(first.walletWeight))
+        self.assertEqual(second.trueNetworkWeight, first.trueNetworkWeight)
+
+        # the filters and the snapshot file itself are in the cache key
+
+        self.assertEqual(list(loadSnapshot(path, topN=1).walletWeight), [1540561])
+        oldName = snapshotCacheName(path, minWeight=100)
+        self.writeFile("snapshot.csv", (SNAPSHOT_CSV + "Qaddress5,900\n").encode('utf-8'))
+        os.utime(path, ns=(0, 1))
+        self.assertNotEqual(snapshotCacheName(path, minWeight=100), oldName)
+        self.assertEqual(list(loadSnapshot(path, minWeight=100).walletWeight), [1540561, 1419648, 700, 900])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''
+The streaming statistics of a run against the same figures from sorted values.
+'''
+
+import math
+import random
+import statistics
+import unittest
+
+from qlbes.statistics import P2Quantile, RunStatistics, StepHistogram, Welford
+
+
+def sortedQuantile(values, q):
+    # smallest value with at least q of the values at or below it
+
+    values = sorted(values)
+    index = max(math.ceil(q * len(values)) - 1, 0)
+    return(values[index])
+
+
+class P2QuantileTest(unittest.TestCase):
+
+    def test_exact_for_few(self):
+        quantile = P2Quantile(0.5)
+        self.assertIsNone(quantile.value())
+        for x in (7.0, 3.0, 5.0):
+            quantile.add(x)
+        self.assertEqual(quantile.value(), 5.0)
+
+    def test_against_sorted(self):
+        rng = random.Random(30)
+        values = [rng.expovariate(1.0 / 128.0) for i in range(20000)]
+        for q in (0.5, 0.9, 0.99):
+            quantile = P2Quantile(q)
+            for x in values:
+                quantile.add(x)
+            expected = sortedQuantile(values, q)
+            self.assertAlmostEqual(quantile.value(), expected, delta=0.03 * expected)
+
+
+class StepHistogramTest(unittest.TestCase):
+
+    def test_quantiles_exact(self):
+        rng = random.Random(31)
+        steps = [min(int(rng.expovariate(1.0 / 8.0)) + 1, 100) for i in range(5000)]
+        histogram = StepHistogram()
+        for s in steps:
+            histogram.add(s)
+        capped = [min(s, histogram.maxSteps) for s in steps]
+        for q in (0.5, 0.9, 0.99, 0.999):
+            self.assertEqual(histogram.quantile(q), sortedQuantile(capped, q))
+        self.assertEqual(histogram.largest, max(steps))
+        self.assertEqual(histogram.atLeast(40), sum(1 for s in capped if s >= 40))
+
+
+class RunStatisticsTest(unittest.TestCase):
+
+    def test_welford(self):
+        rng = random.Random(32)
+        values = [rng.gauss(0.0, 3.0) for i in range(1000)]
+        welford = Welford()
+        for x in values:
+            welford.add(x)
+        self.assertAlmostEqual(welford.mean, statistics.mean(values), places=9)
+        self.assertAlmostEqual(welford.variance(), statistics.variance(values), places=9)
+
+    def test_summary(self):
+        rng = random.Random(33)
+        run = RunStatistics()
+        steps = [int(rng.expovariate(1.0 / 8.0)) + 1 for i in range(2000)]
+        for s in steps:
+            run.addBlock(s, min(s * 16, 1280), 1, 25000000, 26000000, 25000000)
+
+        summary = run.summary()
+        self.assertEqual(summary["numBlocks"], 2000)
+        self.assertEqual(summary["aveSeconds"], 16 * sum(steps) / 2000)
+        self.assertEqual(summary["stepsP50"], sortedQuantile(steps, 0.5))
+        self.assertEqual(summary["spacingP90"], min(16 * sortedQuantile(steps, 0.9), 1280))
+        self.assertEqual(summary["fiveXSpacingBlocks"], sum(1 for s in steps if s > 40))
+        self.assertEqual(summary["networkWeightBias"], 0.0)
+        self.assertAlmostEqual(summary["newNetworkWeightRelativeBias"], 0.04)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+'''
+Sweeps over a population setting run every value on its own population.
+'''
+
+import unittest
+
+from qlbes.config import SimulationConfig
+from qlbes.sweep import runSweep, runTasks
+
+BASE = SimulationConfig(walletWeightDistribution="Uniform", numUniformDistbnWallets=100, numBlocks=150,
+                        engine="bernoulli")
+
+
+def summaries(results):
+    return([result["summary"] for result in results])
+
+
+class PopulationSweepTest(unittest.TestCase):
+
+    def test_population_setting_changes_runs(self):
+        # the same run number, so the same random stream, only the wallets differ
+
+        tasks = [(0, None, None), (0, "numUniformDistbnWallets", 100), (0, "numUniformDistbnWallets", 5000)]
+        base, same, larger = summaries(runTasks(BASE, tasks, processes=1))
+        self.assertEqual(base, same)
+        self.assertNotEqual(base, larger)
+
+    def test_distribution_sweep(self):
+        tasks = [(0, "walletWeightDistribution", value) for value in ("Uniform", "Mainnet")]
+        uniform, mainnet = summaries(runTasks(BASE, tasks, processes=1))
+        self.assertNotEqual(uniform, mainnet)
+
+    def test_processes_agree(self):
+        values = [100, 5000, 100]
+        self.assertEqual(summaries(runSweep(BASE, "numUniformDistbnWallets", values, processes=1)),
+                         summaries(runSweep(BASE, "numUniformDistbnWallets", values, processes=2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+'''
+Telemetry reports: one JSON line or one Prometheus textfile per report.
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from qlbes.telemetry import TelemetryWriter
+
+
+def report(writer, block, stepTotal):
+    writer.blockDone(block, stepTotal, 100, 1000.0, 1.5, 25000000, 24000000, 25000000, 2)
+
+
+class TelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_jsonl_line_per_report(self):
+        fileName = os.path.join(self.tempDir, "telemetry.jsonl")
+        writer = TelemetryWriter(fileName, intervalSeconds=0.0, runMax=2, numBlocks=10)
+        for block in range(10):
+            report(writer, block, 4 * (block + 1))
+        writer.endRun()
+        writer.startRun(1, 0)
+        report(writer, 0, 4)
+
+        with open(fileName) as inFile:
+            records = [json.loads(line) for line in inFile]
+        self.assertEqual(len(records), 11)
+        self.assertEqual([r["block"] for r in records[:10]], list(range(10)))
+        self.assertEqual(records[9]["blockInRun"], 10)
+        self.assertEqual(records[10]["run"], 1)
+        self.assertEqual(records[10]["blockInRun"], 1)
+        self.assertEqual(records[10]["networkWeight"], 24000000)
+        self.assertGreaterEqual(records[10]["etaSeconds"], 0.0)
+        self.assertGreater(records[10]["walletChecksPerSecond"], 0.0)
+
+    def test_no_report_before_interval(self):
+        fileName = os.path.join(self.tempDir, "telemetry.jsonl")
+        writer = TelemetryWriter(fileName, intervalSeconds=3600.0, numBlocks=10)
+        for block in range(10):
+            report(writer, block, 4 * (block + 1))
+        self.assertFalse(os.path.exists(fileName))
+
+    def test_prometheus_rewritten(self):
+        fileName = os.path.join(self.tempDir, "qlbes.prom")
+        writer = TelemetryWriter(fileName, intervalSeconds=0.0, outputFormat="prometheus", numBlocks=10)
+        report(writer, 0, 4)
+        report(writer, 1, 8)
+
+        with open(fileName) as inFile:
+            lines = inFile.read().splitlines()
+        self.assertIn("qlbes_block 1.0", lines)
+        self.assertIn("qlbes_networkWeight 24000000.0", lines)
+        self.assertFalse(any(line.startswith("qlbes_time") for line in lines))
+        self.assertFalse(os.path.exists(fileName + ".tmp"))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            TelemetryWriter(os.path.join(self.tempDir, "x"), outputFormat="csv")
+
+
+if __name__ == '__main__':
+    unittest.main()